@@ -0,0 +1,33 @@
+from django.contrib import admin
+
+from .models import CourseRollup, DailyActivity, ModuleRollup
+
+
+@admin.register(CourseRollup)
+class CourseRollupAdmin(admin.ModelAdmin):
+    list_display = ('course', 'enrollments', 'learners_started', 'learners_completed', 'average_quiz_score',
+                    'active_learners_7d', 'refreshed_at')
+    search_fields = ('course__title',)
+    list_select_related = ('course',)
+    readonly_fields = ('course', 'enrollments', 'learners_started', 'learners_completed', 'quiz_attempts',
+                       'average_quiz_score', 'active_learners_7d', 'refreshed_at')
+
+
+@admin.register(ModuleRollup)
+class ModuleRollupAdmin(admin.ModelAdmin):
+    list_display = ('module', 'course', 'position', 'learners_started', 'learners_finished_lessons',
+                    'learners_passed_quiz', 'refreshed_at')
+    list_filter = ('course',)
+    list_select_related = ('module', 'course')
+    ordering = ('course', 'position')
+    readonly_fields = ('module', 'course', 'position', 'learners_started', 'learners_finished_lessons',
+                       'learners_passed_quiz', 'refreshed_at')
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ('course', 'day', 'active_learners')
+    list_filter = ('course',)
+    list_select_related = ('course',)
+    ordering = ('-day',)
+    readonly_fields = ('course', 'day', 'active_learners')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import refresh_analytics
+
+
+class Command(BaseCommand):
+    help = "Update the instructor dashboard's course rollups. Run it with --full nightly and without it in between."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true', help="Recompute every course instead of those changed since the last run.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = refresh_analytics(full=options['full'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Course analytics refreshed in {elapsed:.2f}s ({written['courses']} course(s), "
+            f"{written['modules']} module(s), {written['days']} day(s) of activity)."
+        ))
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('courses', '0021_enrollment_courses_enrollment_recent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('learners_started', models.PositiveIntegerField(default=0)),
+                ('learners_completed', models.PositiveIntegerField(default=0)),
+                ('quiz_attempts', models.PositiveIntegerField(default=0)),
+                ('average_quiz_score', models.FloatField(blank=True, null=True)),
+                ('active_learners_7d', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup', to='courses.course')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ModuleRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('learners_started', models.PositiveIntegerField(default=0)),
+                ('learners_finished_lessons', models.PositiveIntegerField(default=0)),
+                ('learners_passed_quiz', models.PositiveIntegerField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='module_rollups', to='courses.course')),
+                ('module', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup', to='courses.module')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'position'], name='analytics_module_funnel')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('active_learners', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='courses.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='analytics_d_day_ae1758_idx')],
+                'unique_together': {('course', 'day')},
+            },
+        ),
+    ]
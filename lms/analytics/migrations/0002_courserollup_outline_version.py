@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courserollup',
+            name='outline_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
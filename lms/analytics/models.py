@@ -0,0 +1,62 @@
+from django.db import models
+
+from courses.models import Course, Module
+
+
+class CourseRollup(models.Model):
+    """
+    Per-course totals for the instructor dashboard (see analytics.rollups).
+    Rebuilt by ``manage.py refresh_course_analytics``; never edited in place.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='rollup')
+    enrollments = models.PositiveIntegerField(default=0)
+    learners_started = models.PositiveIntegerField(default=0)  # Read at least one lesson
+    learners_completed = models.PositiveIntegerField(default=0)  # Hold the course badge
+    quiz_attempts = models.PositiveIntegerField(default=0)
+    average_quiz_score = models.FloatField(null=True, blank=True)
+    active_learners_7d = models.PositiveIntegerField(default=0)
+    # Course.outline_version the rollup was computed at
+    outline_version = models.PositiveBigIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Rollup of {self.course_id}: {self.enrollments} enrolled"
+
+    @property
+    def completion_rate(self):
+        return self.learners_completed * 100.0 / self.enrollments if self.enrollments else 0.0
+
+
+class ModuleRollup(models.Model):
+    """One step of a course's completion funnel: how many learners got through this module."""
+    module = models.OneToOneField(Module, on_delete=models.CASCADE, related_name='rollup')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='module_rollups')
+    position = models.PositiveIntegerField()  # 1-based, in course order
+    learners_started = models.PositiveIntegerField(default=0)
+    learners_finished_lessons = models.PositiveIntegerField(default=0)
+    learners_passed_quiz = models.PositiveIntegerField(null=True, blank=True)  # None if the module has no quiz
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'position'], name='analytics_module_funnel'),
+        ]
+
+    def __str__(self):
+        return f"Rollup of module {self.module_id}"
+
+
+class DailyActivity(models.Model):
+    """Distinct learners who read a lesson or took a quiz in the course on ``day``."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_activity')
+    day = models.DateField()
+    active_learners = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('course', 'day')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} on {self.day}: {self.active_learners}"
@@ -0,0 +1,234 @@
+"""
+Course analytics rollups for the instructor dashboard.
+
+Counting enrollments, lesson reads and quiz attempts live for every course on
+each dashboard view would scan the largest tables in the site, so the
+numbers are pre-aggregated:
+
+- CourseRollup: one row per course (enrollments, learners who started and
+  completed it, quiz attempts and average score, learners active in the
+  last 7 days).
+- ModuleRollup: one row per module, the course's completion funnel: learners
+  who started the module, read all its lessons and passed its quiz.
+- DailyActivity: distinct learners per course and day who read a lesson
+  (its points award) or took a quiz.
+
+refresh_analytics() (``manage.py refresh_course_analytics``) rebuilds them.
+Run it with ``--full`` nightly: every course is recomputed and the last
+ACTIVITY_DAYS days of activity are recounted. An incremental run in between
+only recomputes the courses with enrollments, lesson reads, quiz attempts or
+completions awarded or revoked since the previous run, those whose outline
+(modules, lessons, quizzes) changed and those whose 7-day count has a day to
+drop, recounting their activity from the day of that run; deletions
+(unenrolling, progress resets) and badges edited in the admin show after the
+next full run. Either way the queries
+are grouped per course, not issued per course, and the dashboard reads
+O(courses) rows.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CourseRollup, DailyActivity, ModuleRollup
+
+# Days of daily activity recounted by a full run
+ACTIVITY_DAYS = getattr(settings, 'ANALYTICS_ACTIVITY_DAYS', 30)
+ACTIVE_WINDOW_DAYS = 7
+BATCH_SIZE = 2000
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def activity(since, course_ids=None):
+    """
+    {(course_id, day): {user_id}} of learners who read a lesson or took a
+    quiz from ``since`` (a datetime) on, in ``course_ids`` (default: all).
+    """
+    from courses.models import Lesson  # Avoid circular import
+    from quiz.models import QuizAttempt
+    from users.models import PointsEvent
+
+    reads = PointsEvent.objects.filter(
+        source=PointsEvent.SOURCE_LESSON, points__gt=0, created_at__gte=since,
+    ).annotate(
+        course_id=Subquery(Lesson.objects.filter(pk=OuterRef('object_id')).values('module__course_id')[:1]),
+        day=TruncDate('created_at'),
+    ).exclude(course_id=None)
+    attempts = QuizAttempt.objects.filter(date_taken__gte=since).annotate(
+        course_id=F('quiz__module__course_id'), day=TruncDate('date_taken'),
+    )
+    if course_ids is not None:
+        reads = reads.filter(course_id__in=course_ids)
+        attempts = attempts.filter(course_id__in=course_ids)
+
+    active = defaultdict(set)
+    for rows in (
+        reads.order_by().values_list('course_id', 'day', 'user_id').distinct(),
+        attempts.order_by().values_list('course_id', 'day', 'student_id').distinct(),
+    ):
+        for course_id, day, user_id in rows.iterator(chunk_size=BATCH_SIZE):
+            active[course_id, day].add(user_id)
+    return active
+
+
+def changed_courses(since):
+    """Ids of courses whose rollups may be out of date after ``since``."""
+    from courses.models import Course, Enrollment  # Avoid circular import
+    from users.models import PointsEvent
+
+    today = _start_of(timezone.localdate())
+    changed = set(Course.objects.filter(rollup__isnull=True).values_list('pk', flat=True))
+    # Modules, lessons or quizzes added, moved or removed
+    changed.update(Course.objects.exclude(outline_version=F('rollup__outline_version')).values_list('pk', flat=True))
+    changed.update(Enrollment.objects.filter(created_at__gte=since).values_list('course_id', flat=True).distinct())
+    changed.update(course_id for course_id, _ in activity(since))
+    # Badges awarded or revoked by completion checks, through their points
+    changed.update(Course.objects.filter(pk__in=PointsEvent.objects.filter(
+        source=PointsEvent.SOURCE_COURSE, created_at__gte=since,
+    ).values('object_id')).values_list('pk', flat=True))
+    # Their 7-day count changes as days pass, even without new activity
+    changed.update(CourseRollup.objects.filter(
+        active_learners_7d__gt=0, refreshed_at__lt=today,
+    ).values_list('course_id', flat=True))
+    return changed
+
+
+def _count_by(queryset, key, **aggregates):
+    return {row.pop(key): row for row in queryset.order_by().values(key).annotate(**aggregates)}
+
+
+def course_rollups(course_ids, active, refreshed_at):
+    """Unsaved CourseRollup rows for ``course_ids``; ``active`` covers at least the last 7 days."""
+    from courses.models import Course, Enrollment, Lesson  # Avoid circular import
+    from quiz.models import QuizRecord
+    from users.models import Profile
+
+    outline_versions = dict(Course.objects.filter(pk__in=course_ids).values_list('pk', 'outline_version'))
+    enrollments = _count_by(Enrollment.objects.filter(course_id__in=course_ids), 'course_id', n=Count('pk'))
+    started = _count_by(
+        Lesson.read_by_users.through.objects.filter(lesson__module__course_id__in=course_ids),
+        'lesson__module__course_id', n=Count('user_id', distinct=True),
+    )
+    completed = _count_by(
+        Profile.earned_badges.through.objects.filter(course_id__in=course_ids), 'course_id', n=Count('pk'),
+    )
+    quizzes = _count_by(
+        QuizRecord.objects.filter(quiz__module__course_id__in=course_ids), 'quiz__module__course_id',
+        attempts=Sum('attempts'), score_total=Sum('score_total'),
+    )
+
+    window_start = timezone.localdate() - timedelta(days=ACTIVE_WINDOW_DAYS - 1)
+    recent = defaultdict(set)
+    for (course_id, day), users in active.items():
+        if day >= window_start:
+            recent[course_id] |= users
+
+    rollups = []
+    for course_id in course_ids:
+        quiz = quizzes.get(course_id, {})
+        attempts = quiz.get('attempts') or 0
+        rollups.append(CourseRollup(
+            course_id=course_id,
+            enrollments=enrollments.get(course_id, {}).get('n', 0),
+            learners_started=started.get(course_id, {}).get('n', 0),
+            learners_completed=completed.get(course_id, {}).get('n', 0),
+            quiz_attempts=attempts,
+            average_quiz_score=quiz['score_total'] / attempts if attempts else None,
+            active_learners_7d=len(recent[course_id]),
+            outline_version=outline_versions.get(course_id, 0),
+            refreshed_at=refreshed_at,
+        ))
+    return rollups
+
+
+def module_rollups(course_ids, refreshed_at):
+    """Unsaved ModuleRollup rows for every module of ``course_ids``, numbered in course order."""
+    from courses.models import Lesson, Module  # Avoid circular import
+    from courses.outline import QUIZ_PASS_MARK
+    from quiz.models import Quiz, QuizRecord
+
+    modules = list(
+        Module.objects.filter(course_id__in=course_ids).annotate(lesson_count=Count('lessons'))
+        .order_by('course_id', 'created_at', 'pk').values_list('pk', 'course_id', 'lesson_count')
+    )
+    # Views use the first quiz of each module, as the course outline does
+    quiz_of = dict(
+        Quiz.objects.filter(module__course_id__in=course_ids).order_by().values('module_id')
+        .annotate(first=Min('pk')).values_list('module_id', 'first')
+    )
+    passed = dict(
+        QuizRecord.objects.filter(quiz_id__in=list(quiz_of.values()), best_score__gte=QUIZ_PASS_MARK).order_by()
+        .values('quiz_id').annotate(n=Count('pk')).values_list('quiz_id', 'n')
+    )
+
+    # Lessons read per (module, learner), streamed; only the counts per module are kept
+    lesson_counts = {pk: lesson_count for pk, _, lesson_count in modules}
+    started, finished = defaultdict(int), defaultdict(int)
+    reads = Lesson.read_by_users.through.objects.filter(lesson__module__course_id__in=course_ids).order_by().values(
+        'lesson__module_id', 'user_id',
+    ).annotate(n=Count('lesson_id')).values_list('lesson__module_id', 'n')
+    for module_id, read in reads.iterator(chunk_size=BATCH_SIZE):
+        started[module_id] += 1
+        if read >= lesson_counts.get(module_id, 0):
+            finished[module_id] += 1
+
+    rollups = []
+    position = course = None
+    for pk, course_id, _ in modules:
+        position = position + 1 if course_id == course else 1
+        course = course_id
+        quiz_id = quiz_of.get(pk)
+        rollups.append(ModuleRollup(
+            module_id=pk, course_id=course_id, position=position,
+            learners_started=started[pk], learners_finished_lessons=finished[pk],
+            learners_passed_quiz=passed.get(quiz_id, 0) if quiz_id else None,
+            refreshed_at=refreshed_at,
+        ))
+    return rollups
+
+
+def daily_rows(active):
+    """Unsaved DailyActivity rows for ``active``."""
+    return [
+        DailyActivity(course_id=course_id, day=day, active_learners=len(users))
+        for (course_id, day), users in sorted(active.items())
+    ]
+
+
+def refresh_analytics(full=False):
+    """
+    Bring the rollups up to date: every course with ``full``, otherwise the
+    courses changed since the last run. Returns {'courses', 'modules',
+    'days'}: rows written.
+    """
+    from courses.models import Course  # Avoid circular import
+
+    refreshed_at = timezone.now()
+    today = timezone.localdate()
+    last_run = None if full else CourseRollup.objects.aggregate(last=Max('refreshed_at'))['last']
+    if last_run is None:
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        first_day = today - timedelta(days=ACTIVITY_DAYS - 1)
+    else:
+        course_ids = sorted(changed_courses(last_run))
+        first_day = min(timezone.localtime(last_run).date(), today - timedelta(days=ACTIVE_WINDOW_DAYS - 1))
+
+    active = activity(_start_of(first_day), course_ids)
+    courses = course_rollups(course_ids, active, refreshed_at)
+    modules = module_rollups(course_ids, refreshed_at)
+    days = daily_rows(active)
+    with transaction.atomic():
+        CourseRollup.objects.filter(course_id__in=course_ids).delete()
+        ModuleRollup.objects.filter(course_id__in=course_ids).delete()
+        DailyActivity.objects.filter(course_id__in=course_ids, day__gte=first_day).delete()
+        CourseRollup.objects.bulk_create(courses, batch_size=BATCH_SIZE)
+        ModuleRollup.objects.bulk_create(modules, batch_size=BATCH_SIZE)
+        DailyActivity.objects.bulk_create(days, batch_size=BATCH_SIZE)
+    return {'courses': len(courses), 'modules': len(modules), 'days': len(days)}
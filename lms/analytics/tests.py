@@ -0,0 +1,129 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analytics.models import CourseRollup, DailyActivity, ModuleRollup
+from analytics.rollups import refresh_analytics
+from courses.models import Course, Module, Lesson, Enrollment
+from instructor.views import InstructorView
+from quiz.history import record_attempt
+from quiz.models import Quiz
+from users.models import PointsEvent, User, Profile
+from users.points import award_points
+
+
+class CourseAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.course = Course.objects.create(title="Course", created_by=cls.instructor)
+        cls.modules = [Module.objects.create(course=cls.course, title=f"Module {i}") for i in range(2)]
+        cls.lessons = [[Lesson.objects.create(module=m, title=f"Lesson {i}") for i in range(2)] for m in cls.modules]
+        cls.quiz = Quiz.objects.create(module=cls.modules[0], title="Quiz", created_by=cls.instructor)
+        cls.learners = [User.objects.create_user(email=f"l{i}@example.com", password="pw") for i in range(3)]
+        for learner in cls.learners:
+            Enrollment.objects.create(user=learner, course=cls.course)
+
+    def setUp(self):
+        cache.clear()
+
+    def read(self, learner, lesson):
+        lesson.read_by_users.add(learner)
+        award_points([(learner.pk, PointsEvent.SOURCE_LESSON, lesson.pk)], 10)
+
+    def dashboard(self):
+        request = RequestFactory().get(reverse('instructor_dashboard'))
+        request.user = self.instructor
+        view = InstructorView()
+        view.setup(request)
+        return view.get_context_data()['course_analytics']
+
+    def test_rollups_and_funnel(self):
+        first, second, third = self.learners
+        for lesson in self.lessons[0]:
+            self.read(first, lesson)
+        self.read(second, self.lessons[0][0])
+        record_attempt(first, self.quiz, 80)
+        record_attempt(second, self.quiz, 40)
+        Profile.objects.create(user=first, first_name="Fi", last_name="Rst", image=None).earned_badges.add(self.course)
+
+        call_command('refresh_course_analytics', '--full', stdout=StringIO())
+
+        rollup = CourseRollup.objects.get(course=self.course)
+        self.assertEqual(
+            (rollup.enrollments, rollup.learners_started, rollup.learners_completed, rollup.quiz_attempts),
+            (3, 2, 1, 2),
+        )
+        self.assertEqual((rollup.average_quiz_score, rollup.active_learners_7d), (60, 2))
+        funnel = [
+            (m.position, m.learners_started, m.learners_finished_lessons, m.learners_passed_quiz)
+            for m in ModuleRollup.objects.order_by('position')
+        ]
+        self.assertEqual(funnel, [(1, 2, 1, 1), (2, 0, 0, None)])
+        self.assertEqual(
+            list(DailyActivity.objects.values_list('day', 'active_learners')), [(timezone.localdate(), 2)],
+        )
+
+        row, = self.dashboard()
+        self.assertEqual(row['rollup'], rollup)
+        self.assertAlmostEqual(row['funnel'][0]['finished_percent'], 100 / 3)
+        self.assertEqual([day['learners'] for day in row['daily_active']][-2:], [0, 2])
+
+    def test_incremental_run_only_recomputes_changed_courses(self):
+        other = Course.objects.create(title="Other", created_by=self.instructor)
+        self.assertEqual(refresh_analytics()['courses'], 2)
+        self.assertEqual(refresh_analytics(), {'courses': 0, 'modules': 0, 'days': 0})
+
+        # Last run was yesterday; a read today and a new enrollment since then
+        CourseRollup.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        self.read(self.learners[2], self.lessons[1][0])
+        Enrollment.objects.create(user=self.instructor, course=other)
+        self.assertEqual(refresh_analytics()['courses'], 2)
+        self.assertEqual(CourseRollup.objects.get(course=other).enrollments, 1)
+        self.assertEqual(ModuleRollup.objects.get(module=self.modules[1]).learners_started, 1)
+
+        # Past the 7-day window the active count drops without new activity
+        PointsEvent.objects.update(created_at=timezone.now() - timedelta(days=10))
+        Enrollment.objects.update(created_at=timezone.now() - timedelta(days=10))
+        CourseRollup.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(refresh_analytics()['courses'], 1)
+        self.assertEqual(CourseRollup.objects.get(course=self.course).active_learners_7d, 0)
+
+    def test_incremental_run_picks_up_outline_changes_and_completions(self):
+        Enrollment.objects.update(created_at=timezone.now() - timedelta(days=10))
+        refresh_analytics()
+        CourseRollup.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(refresh_analytics()['courses'], 0)
+
+        Module.objects.create(course=self.course, title="Module 2")
+        self.assertEqual(refresh_analytics()['modules'], 3)
+        self.assertEqual(refresh_analytics()['courses'], 0)
+
+        # A completion awarded without new reads or attempts since the last run
+        CourseRollup.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        Profile.objects.create(user=self.learners[0]).earned_badges.add(self.course)
+        award_points([(self.learners[0].pk, PointsEvent.SOURCE_COURSE, self.course.pk)], 50)
+        self.assertEqual(refresh_analytics()['courses'], 1)
+        self.assertEqual(CourseRollup.objects.get(course=self.course).learners_completed, 1)
+
+    def test_dashboard_queries_do_not_grow_with_courses(self):
+        refresh_analytics()
+        with CaptureQueriesContext(connection) as one:
+            self.dashboard()
+        for i in range(3):
+            course = Course.objects.create(title=f"Course {i}", created_by=self.instructor)
+            Module.objects.create(course=course, title="Module")
+        with CaptureQueriesContext(connection) as refresh:
+            refresh_analytics(full=True)
+        with CaptureQueriesContext(connection) as four:
+            rows = self.dashboard()
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len(one.captured_queries), len(four.captured_queries))
+        self.assertLess(len(refresh.captured_queries), 20)
@@ -2,10 +2,20 @@ from django.contrib import admin
 from django.db.models import Count
 from .models import (
     Course, Module, Lesson, Enrollment, Video, AdditionalMaterial, 
-    Note, Ebook, EbookCategory, Certificate
+    Note, Ebook, EbookCategory, Certificate, CourseProgress, CertificateJob
 )
 # The forms are assumed to be correctly set up for TinyMCE
 from .forms import CourseForm, ModuleForm, LessonForm 
+from .progress import reset_progress
+
+
+def reset_summary(deleted):
+    """Admin message for the counts returned by reset_progress()."""
+    return (
+        f"Progress reset: {deleted['read_lessons']} lesson read(s), {deleted['quiz_attempts']} quiz attempt(s), "
+        f"{deleted['certificates']} certificate(s) and {deleted['badges']} badge(s) removed, "
+        f"{deleted['points']} point(s) revoked."
+    )
 
 # Inlines (one level only; Django does not support nested inlines)
 # No changes needed to inlines
@@ -93,6 +103,13 @@ class CourseAdmin(admin.ModelAdmin):
         return getattr(obj, '_enrolled_count', 0)
     enrolled_count.short_description = 'Enrolled'
 
+    actions = ['reset_cohort_progress']
+
+    @admin.action(description='Reset progress of everyone enrolled')
+    def reset_cohort_progress(self, request, queryset):
+        deleted = reset_progress(Enrollment.objects.filter(course__in=queryset.values('pk')))
+        self.message_user(request, reset_summary(deleted))
+
 # Module admin
 @admin.register(Module)
 class ModuleAdmin(admin.ModelAdmin):
@@ -212,6 +229,27 @@ class EnrollmentAdmin(admin.ModelAdmin):
     # NEW: Make auto-generated dates readonly
     readonly_fields = ['date_enrolled', 'created_at']
     fields = ('user', 'course', 'date_enrolled', 'created_at')
+    actions = ['reset_selected_progress', 'reset_and_unenroll']
+
+    @admin.action(description='Reset progress of selected enrollments')
+    def reset_selected_progress(self, request, queryset):
+        self.message_user(request, reset_summary(reset_progress(queryset)))
+
+    @admin.action(description='Reset progress and unenroll')
+    def reset_and_unenroll(self, request, queryset):
+        deleted = reset_progress(queryset, unenroll=True)
+        self.message_user(request, f"{deleted['enrollments']} enrollment(s) removed. {reset_summary(deleted)}")
+
+
+@admin.register(CourseProgress)
+class CourseProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'course', 'lessons_read', 'quizzes_passed', 'percentage', 'last_activity')
+    search_fields = ('user__email', 'course__title')
+    list_filter = ('course',)
+    date_hierarchy = 'last_activity'
+    autocomplete_fields = ('user', 'course')
+    list_select_related = ('user', 'course')
+    readonly_fields = ('lessons_read', 'quizzes_passed', 'percentage', 'last_activity')
 
 
 @admin.register(Note)
@@ -291,4 +329,20 @@ class CertificateAdmin(admin.ModelAdmin):
     def has_file(self, obj):
         return bool(obj.certificate_file)
     has_file.boolean = True
-    has_file.short_description = 'File'
\ No newline at end of file
+    has_file.short_description = 'File'
+
+
+@admin.register(CertificateJob)
+class CertificateJobAdmin(admin.ModelAdmin):
+    list_display = ('certificate', 'status', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('certificate__user__email', 'certificate__course__title')
+    list_select_related = ('certificate__user', 'certificate__course')
+    readonly_fields = ('certificate', 'attempts', 'error', 'started_at', 'finished_at', 'created_at', 'updated_at')
+    actions = ['requeue']
+
+    @admin.action(description='Re-queue selected jobs')
+    def requeue(self, request, queryset):
+        for job in queryset.select_related('certificate'):
+            CertificateJob.enqueue(job.certificate)
+        self.message_user(request, f"{queryset.count()} job(s) re-queued.")
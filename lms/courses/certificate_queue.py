@@ -0,0 +1,128 @@
+"""
+DB-backed certificate rendering queue.
+
+Course completion (courses.completion) creates CertificateJob rows inside
+its transaction, and enqueue_certificate() does the same for one
+certificate; the `run_certificate_worker` command claims pending CertificateJob rows and runs
+run_job() in a thread or process pool.
+
+Model imports are kept inside the functions so this module can be imported
+by freshly spawned worker processes before Django is set up.
+"""
+from datetime import timedelta
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+STALE_AFTER_SECONDS = 600
+
+
+def enqueue_certificate(user, course):
+    """Create the (file-less) certificate for user/course and queue its rendering."""
+    from .models import Certificate, CertificateJob
+
+    certificate, _ = Certificate.objects.get_or_create(user=user, course=course)
+    if not certificate.certificate_file:
+        CertificateJob.enqueue(certificate)
+    return certificate
+
+
+def claim_jobs(limit, stale_after=STALE_AFTER_SECONDS):
+    """
+    Atomically move up to ``limit`` due jobs from pending to running and
+    return their ids. Uses a conditional UPDATE per job, so concurrent
+    workers never claim the same job (works on SQLite and PostgreSQL).
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import CertificateJob
+
+    now = timezone.now()
+    # Jobs left running by a crashed worker go back to the queue
+    CertificateJob.objects.filter(
+        status=CertificateJob.STATUS_RUNNING, started_at__lt=now - timedelta(seconds=stale_after)
+    ).update(status=CertificateJob.STATUS_PENDING)
+
+    candidate_ids = list(
+        CertificateJob.objects.filter(status=CertificateJob.STATUS_PENDING, run_after__lte=now)
+        .order_by('run_after')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    for pk in candidate_ids:
+        updated = CertificateJob.objects.filter(pk=pk, status=CertificateJob.STATUS_PENDING).update(
+            status=CertificateJob.STATUS_RUNNING,
+            attempts=F('attempts') + 1,
+            started_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def run_job(job_id, max_attempts=MAX_ATTEMPTS):
+    """
+    Render and store the certificate for a claimed job. Returns True on
+    success, False on failure (the job is retried with backoff until
+    ``max_attempts`` is reached) and None if the job no longer exists.
+    """
+    from django.db import close_old_connections
+
+    close_old_connections()
+    try:
+        return _run_job(job_id, max_attempts)
+    finally:
+        close_old_connections()
+
+
+def _run_job(job_id, max_attempts):
+    from django.utils import timezone
+    from .models import CertificateJob
+
+    try:
+        job = CertificateJob.objects.select_related(
+            'certificate__user__profile', 'certificate__course'
+        ).get(pk=job_id)
+    except CertificateJob.DoesNotExist:
+        return None
+
+    try:
+        job.certificate.render_and_save()
+    except Exception as e:
+        now = timezone.now()
+        if job.attempts < max_attempts:
+            CertificateJob.objects.filter(pk=job_id).update(
+                status=CertificateJob.STATUS_PENDING,
+                error=str(e),
+                run_after=now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)),
+            )
+        else:
+            CertificateJob.objects.filter(pk=job_id).update(
+                status=CertificateJob.STATUS_FAILED, error=str(e), finished_at=now,
+            )
+        return False
+
+    CertificateJob.objects.filter(pk=job_id).update(
+        status=CertificateJob.STATUS_DONE, error='', finished_at=timezone.now(),
+    )
+    return True
+
+
+def render_certificate_job(job):
+    """
+    Process-pool entry point for bulk rendering. Takes plain values
+    (certificate_id, student_name, course_title, awarded_on) and returns
+    (certificate_id, pdf_bytes or None, error message or None).
+    """
+    from .utility import render_certificate_pdf
+
+    certificate_id, student_name, course_title, awarded_on = job
+    try:
+        return certificate_id, render_certificate_pdf(student_name, course_title, awarded_on), None
+    except Exception as e:
+        return certificate_id, None, str(e)
+
+
+def setup_worker_process():
+    """ProcessPoolExecutor initializer for spawned worker processes."""
+    import django
+    django.setup()
@@ -0,0 +1,246 @@
+"""
+Course completion, evaluated in the background.
+
+A course with lessons is complete for a learner once they have read all of
+them and passed the quiz of its last module, if it has one. Completing it
+awards the course badge, POINTS_PER_COURSE and a certificate; a completed
+course that stops being complete (a lesson marked unread) loses them
+again. A quiz counts as passed if the learner's best attempt passed
+(QuizRecord), so a failed retake doesn't undo a pass.
+
+Lesson and quiz requests only call enqueue_completion_check(), which
+inserts a CompletionCheck due a few seconds later; a pair that is already
+waiting is not queued again, so a burst of events for the same learner and
+course is evaluated once. The `run_completion_worker` command claims due
+checks and evaluate_completions() settles the whole batch with a fixed
+number of set-based queries, however many learners and courses are in it.
+`reconcile_completions` runs the same evaluation over every enrollment and
+badge.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+COALESCE_SECONDS = getattr(settings, 'COMPLETION_COALESCE_SECONDS', 5)
+BATCH_SIZE = getattr(settings, 'COMPLETION_BATCH_SIZE', 200)
+PASS_MARK = 75
+# Pairs per OR-ed filter; SQLite limits expression depth
+PAIRS_PER_QUERY = 100
+
+
+def enqueue_completion_check(user_id, course_id, delay=None):
+    """Queue (user, course) for evaluation; visible to the worker when the surrounding transaction commits."""
+    from .models import CompletionCheck
+
+    delay = COALESCE_SECONDS if delay is None else delay
+    CompletionCheck.objects.bulk_create(
+        [CompletionCheck(user_id=user_id, course_id=course_id, due_at=timezone.now() + timedelta(seconds=delay))],
+        ignore_conflicts=True,
+    )
+
+
+def _final_quizzes(course_ids):
+    """{course_id: id of the first quiz of the course's last module}, for courses that have one."""
+    from quiz.models import Quiz  # Avoid circular import
+    from .models import Module
+
+    last_module = {}
+    for course_id, module_id in Module.objects.filter(course_id__in=course_ids).order_by(
+        'course_id', 'created_at', 'pk',
+    ).values_list('course_id', 'pk'):
+        last_module[course_id] = module_id
+    course_by_module = {module_id: course_id for course_id, module_id in last_module.items()}
+
+    final_quiz = {}
+    for module_id, quiz_id in Quiz.objects.filter(module_id__in=course_by_module).order_by(
+        'module_id', '-pk',
+    ).values_list('module_id', 'pk'):
+        final_quiz[course_by_module[module_id]] = quiz_id
+    return final_quiz
+
+
+def _pairs_q(pairs, user_field, course_field):
+    """Q objects matching (user, course) ``pairs``, PAIRS_PER_QUERY at a time."""
+    pairs = sorted(pairs)
+    for start in range(0, len(pairs), PAIRS_PER_QUERY):
+        q = Q()
+        for user_id, course_id in pairs[start:start + PAIRS_PER_QUERY]:
+            q |= Q(**{user_field: user_id, course_field: course_id})
+        yield q
+
+
+def _award(pairs):
+    from home.views import POINTS_PER_COURSE  # Avoid circular import
+    from users.models import PointsEvent, Profile
+    from users.points import award_points
+
+    user_ids = {user_id for user_id, _ in pairs}
+    profile_ids = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'pk'))
+    missing = user_ids - profile_ids.keys()
+    if missing:
+        Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in missing])
+        profile_ids = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'pk'))
+
+    Badge = Profile.earned_badges.through
+    Badge.objects.bulk_create(
+        [Badge(profile_id=profile_ids[user_id], course_id=course_id) for user_id, course_id in pairs],
+        ignore_conflicts=True,
+    )
+    award_points([(user_id, PointsEvent.SOURCE_COURSE, course_id) for user_id, course_id in pairs], POINTS_PER_COURSE)
+
+
+def _revoke(pairs):
+    from users.models import PointsEvent, Profile  # Avoid circular import
+    from users.points import revoke_points
+    from .models import Certificate
+
+    for q in _pairs_q(pairs, 'profile__user_id', 'course_id'):
+        Profile.earned_badges.through.objects.filter(q).delete()
+    for q in _pairs_q(pairs, 'user_id', 'course_id'):
+        Certificate.objects.filter(q).delete()
+    revoke_points([(user_id, PointsEvent.SOURCE_COURSE, course_id) for user_id, course_id in pairs])
+
+
+def _issue_certificates(pairs):
+    """Create the missing certificates for ``pairs`` and queue rendering of any without a file."""
+    from .models import Certificate, CertificateJob
+
+    Certificate.objects.bulk_create(
+        [Certificate(user_id=user_id, course_id=course_id) for user_id, course_id in pairs],
+        ignore_conflicts=True,
+    )
+    certificate_ids = [
+        pk for q in _pairs_q(pairs, 'user_id', 'course_id')
+        for pk in Certificate.objects.filter(q).filter(
+            Q(certificate_file__isnull=True) | Q(certificate_file=''),
+        ).values_list('pk', flat=True)
+    ]
+    if not certificate_ids:
+        return
+    CertificateJob.objects.bulk_create(
+        [CertificateJob(certificate_id=pk) for pk in certificate_ids], ignore_conflicts=True,
+    )
+    # As CertificateJob.enqueue: finished or failed jobs go back to the queue
+    CertificateJob.objects.filter(certificate_id__in=certificate_ids).exclude(
+        status=CertificateJob.STATUS_RUNNING,
+    ).update(
+        status=CertificateJob.STATUS_PENDING, attempts=0, error='',
+        run_after=timezone.now(), started_at=None, finished_at=None,
+    )
+
+
+@transaction.atomic
+def evaluate_completions(pairs):
+    """
+    Award or revoke completion for each (user_id, course_id) in ``pairs``.
+    Returns (completed, revoked): the sets of pairs whose state changed.
+    """
+    from quiz.models import QuizRecord  # Avoid circular import
+    from users.models import Profile
+    from .models import Certificate, Lesson
+
+    pairs = set(pairs)
+    if not pairs:
+        return set(), set()
+    user_ids = {user_id for user_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    total_lessons = dict(
+        Lesson.objects.filter(module__course_id__in=course_ids).order_by()
+        .values('module__course_id').annotate(n=Count('pk')).values_list('module__course_id', 'n')
+    )
+    lessons_read = {
+        (user_id, course_id): n for user_id, course_id, n in
+        Lesson.read_by_users.through.objects.filter(
+            user_id__in=user_ids, lesson__module__course_id__in=course_ids,
+        ).order_by().values('user_id', 'lesson__module__course_id').annotate(n=Count('pk')).values_list(
+            'user_id', 'lesson__module__course_id', 'n',
+        )
+    }
+    final_quiz = _final_quizzes(course_ids)
+    passed = set(
+        QuizRecord.objects.filter(
+            student_id__in=user_ids, quiz_id__in=final_quiz.values(), best_score__gte=PASS_MARK,
+        ).values_list('student_id', 'quiz_id')
+    )
+    badges = set(
+        Profile.earned_badges.through.objects.filter(
+            profile__user_id__in=user_ids, course_id__in=course_ids,
+        ).values_list('profile__user_id', 'course_id')
+    )
+    certified = set(
+        Certificate.objects.filter(user_id__in=user_ids, course_id__in=course_ids).values_list('user_id', 'course_id')
+    )
+
+    completed, revoked, certify = set(), set(), set()
+    for pair in pairs:
+        user_id, course_id = pair
+        total = total_lessons.get(course_id, 0)
+        if not total:
+            continue
+        quiz_id = final_quiz.get(course_id)
+        complete = lessons_read.get(pair, 0) >= total and (quiz_id is None or (user_id, quiz_id) in passed)
+        if complete and pair not in badges:
+            completed.add(pair)
+            certify.add(pair)
+        elif complete and pair not in certified:
+            certify.add(pair)
+        elif not complete and pair in badges:
+            revoked.add(pair)
+
+    if completed:
+        _award(completed)
+    if revoked:
+        _revoke(revoked)
+    if certify:
+        _issue_certificates(certify)
+    return completed, revoked
+
+
+def run_due_checks(limit=BATCH_SIZE, due_by=None):
+    """
+    Claim up to ``limit`` checks due by ``due_by`` (default: now) and
+    evaluate them in the same transaction, so a failed batch stays queued.
+    Returns (checks processed, completed, revoked).
+    """
+    from .models import CompletionCheck
+
+    with transaction.atomic():
+        rows = list(
+            CompletionCheck.objects.select_for_update(skip_locked=True)
+            .filter(due_at__lte=due_by or timezone.now()).order_by('due_at')
+            .values_list('pk', 'user_id', 'course_id')[:limit]
+        )
+        if not rows:
+            return 0, set(), set()
+        CompletionCheck.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        completed, revoked = evaluate_completions((user_id, course_id) for _, user_id, course_id in rows)
+    return len(rows), completed, revoked
+
+
+def reconcile_completions(batch_size=BATCH_SIZE):
+    """
+    Evaluate every enrolled or badge-holding (user, course), ``batch_size``
+    learners at a time. Returns (pairs evaluated, completed, revoked) counts.
+    """
+    from users.models import Profile  # Avoid circular import
+    from .models import Enrollment
+
+    Badge = Profile.earned_badges.through
+    user_ids = sorted(
+        set(Enrollment.objects.values_list('user_id', flat=True).distinct())
+        | set(Badge.objects.filter(profile__user__isnull=False).values_list('profile__user_id', flat=True).distinct())
+    )
+    evaluated = completed = revoked = 0
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        pairs = set(Enrollment.objects.filter(user_id__in=chunk).values_list('user_id', 'course_id'))
+        pairs |= set(Badge.objects.filter(profile__user_id__in=chunk).values_list('profile__user_id', 'course_id'))
+        batch_completed, batch_revoked = evaluate_completions(pairs)
+        evaluated += len(pairs)
+        completed += len(batch_completed)
+        revoked += len(batch_revoked)
+    return evaluated, completed, revoked
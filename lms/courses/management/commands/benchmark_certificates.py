@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.utility import generate_certificate_pdf, clear_certificate_template_cache
+from users.models import User
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = "Render certificates for N synthetic users (nothing is saved) and report throughput and peak RSS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help="Number of certificates to render.")
+        parser.add_argument('--cold', action='store_true', help="Clear the template cache before every render.")
+
+    def handle(self, *args, **options):
+        count = max(1, options['count'])
+        course = Course(title="Benchmark Course in Community Health")
+        users = [User(email=f"benchmark.user{i}@example.com") for i in range(count)]
+
+        clear_certificate_template_cache()
+        total_bytes = failures = 0
+        started = time.perf_counter()
+        for user in users:
+            if options['cold']:
+                clear_certificate_template_cache()
+            pdf_bytes = generate_certificate_pdf(user, course)
+            if pdf_bytes:
+                total_bytes += len(pdf_bytes)
+            else:
+                failures += 1
+        elapsed = time.perf_counter() - started
+
+        rendered = count - failures
+        rss = peak_rss_mb()
+        self.stdout.write(f"Rendered {rendered}/{count} certificates in {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {rendered / elapsed:.1f} certificates/sec")
+        self.stdout.write(f"Average size: {total_bytes / rendered / 1024:.1f} KiB" if rendered else "Average size: n/a")
+        self.stdout.write(f"Peak RSS: {rss:.1f} MiB" if rss is not None else "Peak RSS: n/a")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.progress import REBUILD_BATCH_SIZE, rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized CourseProgress table from enrollments, read lessons and quiz records."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help="Only rebuild progress for this course ID.")
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE, help="Rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        written = rebuild_progress(options.get('course'), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt progress for {written} enrollment(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.completion import BATCH_SIZE, reconcile_completions
+
+
+class Command(BaseCommand):
+    help = "Re-evaluate course completion (badges, course points, certificates) for every enrolled learner."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Learners evaluated per batch.")
+
+    def handle(self, *args, **options):
+        evaluated, completed, revoked = reconcile_completions(max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {evaluated} enrollments: {completed} completed, {revoked} revoked."
+        ))
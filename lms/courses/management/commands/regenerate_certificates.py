@@ -0,0 +1,138 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from courses.certificate_queue import render_certificate_job
+from courses.models import Certificate
+from courses.utility import get_student_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render existing certificates (e.g. after the template or text coordinates change). "
+        "Rendering runs in a process pool, uploads in bounded-concurrency batches, and progress "
+        "is checkpointed so an interrupted run can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help="Only regenerate certificates for this course ID.")
+        parser.add_argument('--since', help="Only certificates issued on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Rendering processes.")
+        parser.add_argument('--upload-concurrency', type=int, default=4, help="Concurrent storage uploads.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Certificates fetched and checkpointed per batch.")
+        parser.add_argument('--checkpoint', default='regenerate_certificates.checkpoint.json', help="Checkpoint file path.")
+        parser.add_argument('--restart', action='store_true', help="Ignore any existing checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        queryset = Certificate.objects.select_related('user__profile', 'course').order_by('pk')
+        if options['course']:
+            queryset = queryset.filter(course_id=options['course'])
+        if since:
+            queryset = queryset.filter(issued_at__gte=since)
+
+        scope = {'course': options['course'], 'since': options['since']}
+        last_pk = 0 if options['restart'] else self.read_checkpoint(options['checkpoint'], scope)
+        if last_pk:
+            self.stdout.write(f"Resuming after certificate {last_pk}.")
+
+        storage = Certificate._meta.get_field('certificate_file').storage
+        regenerated = failed = 0
+        render_pool = ProcessPoolExecutor(
+            max_workers=max(1, options['workers']),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+        upload_pool = ThreadPoolExecutor(max_workers=max(1, options['upload_concurrency']))
+        with render_pool, upload_pool:
+            while True:
+                # Keyset pagination: constant cost per batch however far into the table we are
+                batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                by_pk = {certificate.pk: certificate for certificate in batch}
+
+                jobs = [
+                    (c.pk, get_student_name(c.user), c.course.title, timezone.localdate(c.issued_at))
+                    for c in batch
+                ]
+                uploads = []
+                for certificate_id, pdf_bytes, error in render_pool.map(render_certificate_job, jobs):
+                    if not pdf_bytes:
+                        failed += 1
+                        self.stderr.write(f"Certificate {certificate_id}: render failed {error or ''}".rstrip())
+                        continue
+                    uploads.append(upload_pool.submit(self.upload, storage, by_pk[certificate_id], pdf_bytes))
+
+                # Wait for the whole batch so in-flight uploads (and memory) stay bounded
+                updated, stale_files = [], []
+                for future in uploads:
+                    try:
+                        certificate, old_name = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Upload failed: {e}")
+                        continue
+                    updated.append(certificate)
+                    if old_name:
+                        stale_files.append(old_name)
+
+                Certificate.objects.bulk_update(updated, ['certificate_file'])
+                for name in stale_files:
+                    try:
+                        storage.delete(name)
+                    except Exception as e:
+                        self.stderr.write(f"Could not delete old file {name}: {e}")
+
+                regenerated += len(updated)
+                last_pk = batch[-1].pk
+                self.write_checkpoint(options['checkpoint'], scope, last_pk)
+                self.stdout.write(f"Regenerated {regenerated} certificate(s) so far (last id {last_pk}).")
+
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(f"Done. Regenerated: {regenerated}, failed: {failed}."))
+
+    @staticmethod
+    def upload(storage, certificate, pdf_bytes):
+        """Save the new PDF under a fresh name; returns the certificate and its previous file name."""
+        old_name = certificate.certificate_file.name or None
+        field = certificate.certificate_file.field
+        filename = f"certificate_{certificate.user_id}_{certificate.course_id}_{certificate.unique_id}.pdf"
+        certificate.certificate_file.name = storage.save(
+            field.generate_filename(certificate, filename), ContentFile(pdf_bytes)
+        )
+        if old_name == certificate.certificate_file.name:
+            old_name = None
+        return certificate, old_name
+
+    @staticmethod
+    def read_checkpoint(path, scope):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get('scope') != scope:
+            raise CommandError(
+                f"Checkpoint {path} was written for {data.get('scope')}; use --restart or a different --checkpoint."
+            )
+        return data.get('last_pk', 0)
+
+    @staticmethod
+    def write_checkpoint(path, scope, last_pk):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'scope': scope, 'last_pk': last_pk}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,71 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses.certificate_queue import (
+    MAX_ATTEMPTS, STALE_AFTER_SECONDS, claim_jobs, run_job, setup_worker_process,
+)
+
+
+class Command(BaseCommand):
+    help = "Process queued certificate renders (CertificateJob rows) with a thread or process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'CERTIFICATE_WORKER_CONCURRENCY', 2),
+            help="Number of certificates rendered concurrently.",
+        )
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default=getattr(settings, 'CERTIFICATE_WORKER_POOL', 'thread'),
+            help="Use threads (I/O bound uploads) or processes (CPU bound rendering).",
+        )
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help="Attempts before a job is marked failed.")
+        parser.add_argument('--stale-after', type=int, default=STALE_AFTER_SECONDS, help="Seconds before a running job is considered abandoned.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        if options['pool'] == 'process':
+            # Spawned (not forked) children never share the parent's DB connections
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=setup_worker_process,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.stdout.write(f"Certificate worker started ({workers} {options['pool']} worker(s)).")
+        done = failed = 0
+        try:
+            with executor:
+                while True:
+                    job_ids = claim_jobs(limit=workers, stale_after=options['stale_after'])
+                    if not job_ids:
+                        if options['once']:
+                            break
+                        connections.close_all()
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                    futures = [executor.submit(run_job, pk, options['max_attempts']) for pk in job_ids]
+                    for job_id, future in zip(job_ids, futures):
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = False
+                            self.stderr.write(f"Job {job_id} crashed: {e}")
+                        if result:
+                            done += 1
+                        elif result is False:
+                            failed += 1
+                            self.stderr.write(f"Job {job_id} failed.")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping certificate worker.")
+
+        self.stdout.write(self.style.SUCCESS(f"Certificates generated: {done}, failed attempts: {failed}."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses.completion import BATCH_SIZE, run_due_checks
+
+
+class Command(BaseCommand):
+    help = "Evaluate queued course completion checks (CompletionCheck rows) in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Checks evaluated per batch.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--once', action='store_true', help="Evaluate what is due and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        self.stdout.write("Completion worker started.")
+        checked = completed = revoked = 0
+        try:
+            while True:
+                count, batch_completed, batch_revoked = run_due_checks(batch_size)
+                checked += count
+                completed += len(batch_completed)
+                revoked += len(batch_revoked)
+                if count < batch_size:
+                    if options['once']:
+                        break
+                    connections.close_all()
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping completion worker.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checks evaluated: {checked}, courses completed: {completed}, completions revoked: {revoked}."
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.19 on 2026-10-17 00:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0017_alter_course_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons_read', models.PositiveIntegerField(default=0)),
+                ('quizzes_passed', models.PositiveIntegerField(default=0)),
+                ('percentage', models.FloatField(default=0)),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_records', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_activity'],
+                'indexes': [models.Index(fields=['user', '-last_activity'], name='courses_cou_user_id_8b9e4c_idx')],
+                'unique_together': {('user', 'course')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_completioncheck'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['created_at'], name='courses_enrollment_recent'),
+        ),
+    ]
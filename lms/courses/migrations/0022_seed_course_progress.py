@@ -0,0 +1,73 @@
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+# courses.outline.QUIZ_PASS_MARK when this migration was written
+QUIZ_PASS_MARK = 75
+
+
+def seed_progress(apps, schema_editor):
+    """
+    Fill CourseProgress for existing enrollments, so nobody shows 0% until
+    the table is rebuilt by hand. A frozen copy of
+    courses.progress.rebuild_progress() against the historical models.
+    """
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    Quiz = apps.get_model('quiz', 'Quiz')
+    QuizRecord = apps.get_model('quiz', 'QuizRecord')
+
+    lesson_totals = dict(
+        Lesson.objects.order_by().values('module__course').annotate(n=Count('pk')).values_list('module__course', 'n')
+    )
+    quiz_totals = dict(
+        Quiz.objects.order_by().values('module__course').annotate(n=Count('pk')).values_list('module__course', 'n')
+    )
+    read_counts = {
+        (row['user_id'], row['lesson__module__course']): row['n']
+        for row in Lesson.read_by_users.through.objects.order_by().values(
+            'user_id', 'lesson__module__course',
+        ).annotate(n=Count('lesson_id'))
+    }
+    passed_counts = {
+        (row['student_id'], row['quiz__module__course']): row['n']
+        for row in QuizRecord.objects.filter(best_score__gte=QUIZ_PASS_MARK).order_by().values(
+            'student_id', 'quiz__module__course',
+        ).annotate(n=Count('quiz_id', distinct=True))
+    }
+
+    now = timezone.now()
+    last_activity = {
+        (user_id, course_id): ts
+        for user_id, course_id, ts in CourseProgress.objects.values_list('user_id', 'course_id', 'last_activity')
+    }
+    CourseProgress.objects.all().delete()
+
+    rows = []
+    for user_id, course_id in Enrollment.objects.values_list('user_id', 'course_id').iterator():
+        key = (user_id, course_id)
+        lessons_read = read_counts.get(key, 0)
+        quizzes_passed = passed_counts.get(key, 0)
+        total_steps = lesson_totals.get(course_id, 0) + quiz_totals.get(course_id, 0)
+        rows.append(CourseProgress(
+            user_id=user_id,
+            course_id=course_id,
+            lessons_read=lessons_read,
+            quizzes_passed=quizzes_passed,
+            percentage=(lessons_read + quizzes_passed) * 100.0 / total_steps if total_steps else 0.0,
+            last_activity=last_activity.get(key, now),
+        ))
+    CourseProgress.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_enrollment_courses_enrollment_recent'),
+        ('quiz', '0008_seed_quiz_records'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_seed_course_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='outline_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -30,6 +30,8 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to='course_images/', null=True, blank=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='community_health')
+    # Moved by courses.outline.invalidate_course_outline(); cached outlines are keyed on it
+    outline_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -37,20 +39,25 @@ class Course(models.Model):
     class Meta:
         ordering = ['created_at']
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # A copy loaded before the outline changed must not write its old version back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'outline_version'
+            ]
+        super().save(*args, **kwargs)
+
     def default_image(self):
         return self.image.url if self.image else '/static/images/default.jpg'
 
     def progress(self, user):
-        total_lessons = self.modules.all().prefetch_related('lessons').count()
-        completed_lessons = self.modules.all().prefetch_related('lessons').filter(
-            lessons__read=True, lessons__enrollment__user=user).count()
-        lesson_progress = (completed_lessons / total_lessons) * 100 if total_lessons > 0 else 0
-
-        total_quizzes = self.quizzes.count()
-        completed_quizzes = self.quizzes.filter(attempts__student=user, attempts__completed=True).distinct().count()
-        quiz_progress = (completed_quizzes / total_quizzes) * 100 if total_quizzes > 0 else 0
-
-        return (lesson_progress + quiz_progress) / 2 
+        """
+        Percentage of the course completed by ``user``, read from the
+        denormalized CourseProgress table (0 when no progress is recorded).
+        """
+        record = self.progress_records.filter(user=user).only('percentage').first()
+        return record.percentage if record else 0
 
 class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
@@ -132,6 +139,9 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ('user', 'course')
+        indexes = [
+            models.Index(fields=['created_at'], name='courses_enrollment_recent'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} enrolled in {self.course.title}"
@@ -151,6 +161,65 @@ class Note(models.Model):
     def __str__(self):
         return f"Note for {self.user.email} on {self.lesson.title}"
 
+
+class CourseProgress(models.Model):
+    """
+    Denormalized per-user progress for a course. Kept up to date by the lesson
+    and quiz views (see CourseProgress.refresh) so dashboards can read progress
+    for many courses in a single indexed query.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_progress')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress_records')
+    lessons_read = models.PositiveIntegerField(default=0)
+    quizzes_passed = models.PositiveIntegerField(default=0)
+    percentage = models.FloatField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('user', 'course')
+        ordering = ['-last_activity']
+        indexes = [
+            models.Index(fields=['user', '-last_activity']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.course.title}: {self.percentage:.0f}%"
+
+    @staticmethod
+    def compute_percentage(lessons_read, total_lessons, quizzes_passed, total_quizzes):
+        """Lessons and passed quizzes each count as one step towards completion."""
+        total_steps = total_lessons + total_quizzes
+        if total_steps == 0:
+            return 0.0
+        return (lessons_read + quizzes_passed) * 100.0 / total_steps
+
+    @classmethod
+    def refresh(cls, user, course):
+        """
+        Recompute and persist the progress row for (user, course).
+        Call inside the same transaction as the change that affected progress.
+        """
+        from quiz.models import Quiz, QuizRecord  # Avoid circular import
+        from .outline import QUIZ_PASS_MARK
+
+        total_lessons = Lesson.objects.filter(module__course=course).count()
+        lessons_read = Lesson.objects.filter(module__course=course, read_by_users=user).count()
+        total_quizzes = Quiz.objects.filter(module__course=course).count()
+        quizzes_passed = QuizRecord.objects.filter(
+            student=user, quiz__module__course=course, best_score__gte=QUIZ_PASS_MARK
+        ).count()
+
+        progress, _ = cls.objects.update_or_create(
+            user=user, course=course,
+            defaults={
+                'lessons_read': lessons_read,
+                'quizzes_passed': quizzes_passed,
+                'percentage': cls.compute_percentage(lessons_read, total_lessons, quizzes_passed, total_quizzes),
+                'last_activity': timezone.now(),
+            }
+        )
+        return progress
+
 # Ebooks
 class EbookCategory(models.Model):
     """
@@ -224,19 +293,107 @@ class Certificate(models.Model):
     def __str__(self):
         return f"Certificate for {self.user.email} - {self.course.title}"
 
-    def generate_and_save_certificate(self):
-        # Placeholder for the actual generation logic using the utility function
-        # This method will call the utility, get the PDF bytes, and save it to certificate_file
+    def render_and_save(self):
+        """
+        Render the PDF and store it in certificate_file. Raises on failure so
+        callers (e.g. the certificate worker) can record the error.
+        """
         from .utility import generate_certificate_pdf # Avoid circular import
 
+        pdf_bytes = generate_certificate_pdf(self.user, self.course, awarded_on=timezone.localdate(self.issued_at))
+        if not pdf_bytes:
+            raise RuntimeError("Certificate PDF could not be generated.")
+        # Use unique_id in filename to ensure uniqueness
+        filename = f"certificate_{self.user.id}_{self.course.id}_{self.unique_id}.pdf"
+        self.certificate_file.save(filename, ContentFile(pdf_bytes), save=False)
+        # update_fields makes this fail instead of re-inserting a certificate revoked meanwhile
+        self.save(update_fields=['certificate_file'])
+
+    def generate_and_save_certificate(self):
         try:
-            pdf_bytes = generate_certificate_pdf(self.user, self.course)
-            if pdf_bytes:
-                # Use unique_id in filename to ensure uniqueness
-                filename = f"certificate_{self.user.id}_{self.course.id}_{self.unique_id}.pdf"
-                self.certificate_file.save(filename, ContentFile(pdf_bytes), save=True)
-                return True
+            self.render_and_save()
+            return True
         except Exception as e:
             print(f"Error generating certificate for user {self.user.id}, course {self.course.id}: {e}")
             # Consider logging the error properly
-        return False
\ No newline at end of file
+        return False
+
+
+class CertificateJob(models.Model):
+    """
+    Queued certificate render, processed by `manage.py run_certificate_worker`
+    so lesson and quiz requests never render or upload PDFs inline.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    certificate = models.OneToOneField(Certificate, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Certificate job {self.pk} ({self.status}) for certificate {self.certificate_id}"
+
+    @property
+    def is_pending(self):
+        return self.status in (self.STATUS_PENDING, self.STATUS_RUNNING)
+
+    @classmethod
+    def enqueue(cls, certificate):
+        """
+        Queue (or re-queue) rendering for ``certificate``. The row becomes
+        visible to the worker when the surrounding transaction commits.
+        """
+        job, _ = cls.objects.update_or_create(
+            certificate=certificate,
+            defaults={
+                'status': cls.STATUS_PENDING,
+                'attempts': 0,
+                'error': '',
+                'run_after': timezone.now(),
+                'started_at': None,
+                'finished_at': None,
+            }
+        )
+        return job
+
+
+class CompletionCheck(models.Model):
+    """
+    A (user, course) whose completion needs evaluating, queued by lesson and
+    quiz requests and processed by `manage.py run_completion_worker` (see
+    courses.completion). There is one row per pair, so events for a pair
+    that is already waiting are absorbed by it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    due_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'course')
+        indexes = [
+            models.Index(fields=['due_at']),
+        ]
+
+    def __str__(self):
+        return f"Completion check for user {self.user_id}, course {self.course_id} due {self.due_at}"
@@ -0,0 +1,283 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef
+
+from .models import Course, Module, Lesson, Video
+
+# Score (percentage) a learner needs on a module quiz to move past that module
+QUIZ_PASS_MARK = 75
+
+# Bump when the cached structure changes shape so old pickles are never read
+OUTLINE_FORMAT = 1
+OUTLINE_CACHE_TIMEOUT = getattr(settings, 'COURSE_OUTLINE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Local hit/miss counts are pushed to the shared cache every N lookups
+STATS_FLUSH_EVERY = 100
+STATS_HITS_KEY = 'course_outline:stats:hits'
+STATS_MISSES_KEY = 'course_outline:stats:misses'
+
+
+class OutlineLesson:
+    """A lesson as it appears in the course outline (no heavy HTML fields)."""
+    __slots__ = ('pk', 'title', 'module_id', 'lesson_type')
+
+    def __init__(self, pk, title, module_id, lesson_type):
+        self.pk = pk
+        self.title = title
+        self.module_id = module_id
+        self.lesson_type = lesson_type
+
+    @property
+    def id(self):
+        return self.pk
+
+
+class OutlineModule:
+    """A module in the course outline with its ordered lessons and quiz (if any)."""
+    __slots__ = ('pk', 'title', 'quiz_id', 'lessons')
+
+    def __init__(self, pk, title, quiz_id, lessons):
+        self.pk = pk
+        self.title = title
+        self.quiz_id = quiz_id
+        self.lessons = lessons
+
+    @property
+    def id(self):
+        return self.pk
+
+
+class CourseOutline:
+    """
+    Immutable tree of a course's modules, lessons and quizzes.
+
+    Built with a fixed number of queries regardless of course size and cached
+    per course (see get_course_outline), so views can answer gating, prev/next
+    and progress questions without per-row queries.
+    """
+    __slots__ = ('course_id', 'modules', 'lessons', '_lesson_index', '_module_index')
+
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        self.modules = tuple(modules)
+        self.lessons = tuple(lesson for module in self.modules for lesson in module.lessons)
+        self._lesson_index = {lesson.pk: idx for idx, lesson in enumerate(self.lessons)}
+        self._module_index = {module.pk: idx for idx, module in enumerate(self.modules)}
+
+    def __getstate__(self):
+        return self.course_id, self.modules
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @classmethod
+    def for_course(cls, course):
+        """Load the outline for ``course`` (instance or pk) in three queries."""
+        from quiz.models import Quiz  # Avoid circular import
+
+        course_id = getattr(course, 'pk', course)
+
+        # Views use the first quiz of each module (module.quizzes.first())
+        quiz_by_module = {}
+        for quiz_id, module_id in Quiz.objects.filter(module__course_id=course_id).order_by('-pk').values_list('pk', 'module_id'):
+            quiz_by_module[module_id] = quiz_id
+
+        lessons_by_module = {}
+        lessons = (
+            Lesson.objects.filter(module__course_id=course_id)
+            .order_by('created_at')
+            .annotate(has_video=Exists(Video.objects.filter(lesson=OuterRef('pk'))))
+            .values_list('pk', 'title', 'module_id', 'pdf_file', 'has_video')
+        )
+        for pk, title, module_id, pdf_file, has_video in lessons:
+            if has_video:
+                lesson_type = 'video'
+            elif pdf_file:
+                lesson_type = 'pdf'
+            else:
+                lesson_type = 'text'
+            lessons_by_module.setdefault(module_id, []).append(OutlineLesson(pk, title, module_id, lesson_type))
+
+        modules = [
+            OutlineModule(pk, title, quiz_by_module.get(pk), tuple(lessons_by_module.get(pk, ())))
+            for pk, title in Module.objects.filter(course_id=course_id).order_by('created_at').values_list('pk', 'title')
+        ]
+        return cls(course_id, modules)
+
+    @property
+    def lesson_ids(self):
+        return [lesson.pk for lesson in self.lessons]
+
+    @property
+    def quiz_ids(self):
+        return [module.quiz_id for module in self.modules if module.quiz_id]
+
+    @property
+    def last_module(self):
+        return self.modules[-1] if self.modules else None
+
+    def get_lesson(self, lesson_pk):
+        idx = self._lesson_index.get(lesson_pk)
+        return self.lessons[idx] if idx is not None else None
+
+    def get_module(self, module_pk):
+        idx = self._module_index.get(module_pk)
+        return self.modules[idx] if idx is not None else None
+
+    def neighbours(self, lesson_pk):
+        """Return (previous_lesson, next_lesson) in course order; either may be None."""
+        idx = self._lesson_index.get(lesson_pk)
+        if idx is None:
+            return None, None
+        previous_lesson = self.lessons[idx - 1] if idx > 0 else None
+        next_lesson = self.lessons[idx + 1] if idx < len(self.lessons) - 1 else None
+        return previous_lesson, next_lesson
+
+    def next_module(self, module_pk):
+        idx = self._module_index.get(module_pk)
+        if idx is None or idx >= len(self.modules) - 1:
+            return None
+        return self.modules[idx + 1]
+
+    def is_last_in_module(self, lesson_pk):
+        lesson = self.get_lesson(lesson_pk)
+        if lesson is None:
+            return False
+        module = self.get_module(lesson.module_id)
+        return module.lessons[-1].pk == lesson_pk
+
+    def blocking_module(self, module_pk, passed_quiz_ids):
+        """
+        First module before ``module_pk`` whose quiz has not been passed, or
+        None when the learner may access the module.
+        """
+        for module in self.modules:
+            if module.pk == module_pk:
+                break
+            if module.quiz_id and module.quiz_id not in passed_quiz_ids:
+                return module
+        return None
+
+    def progress_percentage(self, read_lesson_ids):
+        if not self.lessons:
+            return 0
+        completed = sum(1 for lesson in self.lessons if lesson.pk in read_lesson_ids)
+        return completed * 100.0 / len(self.lessons)
+
+    def read_lesson_ids(self, user):
+        """Set of lesson ids in this course the user has marked as read (one query)."""
+        return set(
+            Lesson.read_by_users.through.objects.filter(
+                user=user, lesson__module__course_id=self.course_id
+            ).values_list('lesson_id', flat=True)
+        )
+
+    def passed_quiz_ids(self, user):
+        """Set of quiz ids in this course the user has passed (one query)."""
+        from quiz.models import QuizRecord  # Avoid circular import
+
+        quiz_ids = self.quiz_ids
+        if not quiz_ids:
+            return set()
+        return set(
+            QuizRecord.objects.filter(
+                student=user, quiz_id__in=quiz_ids, best_score__gte=QUIZ_PASS_MARK
+            ).values_list('quiz_id', flat=True)
+        )
+
+
+# --- Cache ---
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'pending_hits': 0, 'pending_misses': 0}
+
+
+def _outline_key(course_id, version):
+    return f'course_outline:{OUTLINE_FORMAT}:{course_id}:{version}'
+
+
+def _current_version(course):
+    """Course.outline_version, from the instance if one was passed; the database is the only shared state."""
+    if isinstance(course, Course):
+        return course.outline_version
+    return Course.objects.filter(pk=course).values_list('outline_version', flat=True).first()
+
+
+def _record(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+        _stats['pending_hits' if hit else 'pending_misses'] += 1
+        if _stats['pending_hits'] + _stats['pending_misses'] < STATS_FLUSH_EVERY:
+            return
+        pending_hits, pending_misses = _stats['pending_hits'], _stats['pending_misses']
+        _stats['pending_hits'] = _stats['pending_misses'] = 0
+    _flush_stats(pending_hits, pending_misses)
+
+
+def _flush_stats(hits, misses):
+    for key, delta in ((STATS_HITS_KEY, hits), (STATS_MISSES_KEY, misses)):
+        if not delta:
+            continue
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, timeout=None)
+
+
+def get_course_outline(course):
+    """
+    Return the cached CourseOutline for ``course`` (instance or pk), building
+    and caching it on a miss. An instance saves reading the course's outline
+    version, so pass the one the view already loaded.
+    """
+    course_id = getattr(course, 'pk', course)
+    version = _current_version(course)
+    key = _outline_key(course_id, version)
+    outline = cache.get(key)
+    if outline is not None:
+        _record(hit=True)
+        return outline
+
+    _record(hit=False)
+    outline = CourseOutline.for_course(course_id)
+    cache.set(key, outline, timeout=OUTLINE_CACHE_TIMEOUT)
+    return outline
+
+
+def invalidate_course_outline(course_id):
+    """
+    Move the course to a new outline version. The version lives on the Course
+    row, so every process sees it (each process's cache may be its own) and
+    entries cached under older versions are never read again.
+    """
+    Course.objects.filter(pk=course_id).update(outline_version=F('outline_version') + 1)
+
+
+def outline_cache_stats():
+    """
+    Hit/miss counters for the outline cache. ``process`` covers this worker
+    only; ``shared`` is the total flushed to the cache by all workers.
+    """
+    with _stats_lock:
+        local_hits, local_misses = _stats['hits'], _stats['misses']
+    shared_hits = cache.get(STATS_HITS_KEY, 0)
+    shared_misses = cache.get(STATS_MISSES_KEY, 0)
+
+    def summary(hits, misses):
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': (hits / total) if total else 0.0}
+
+    return {
+        'process': summary(local_hits, local_misses),
+        'shared': summary(shared_hits, shared_misses),
+    }
+
+
+def reset_outline_cache_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+    cache.delete_many([STATS_HITS_KEY, STATS_MISSES_KEY])
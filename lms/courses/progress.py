@@ -0,0 +1,144 @@
+"""
+Rebuilding and resetting learners' progress in courses.
+
+rebuild_progress() recomputes CourseProgress from enrollments, read lessons
+and quiz records with one grouped query per input (``manage.py
+rebuild_course_progress``; migration 0022 first filled the table with a
+frozen copy of it).
+
+Resetting (unenrolling, admin bulk resets): reset_progress() takes an Enrollment queryset - one learner in one course,
+every course of some learners, or a whole course cohort - and clears the
+progress of each enrolled (user, course) with one DELETE per table, each
+filtered by an EXISTS subquery against those enrollments; no lessons,
+notes or attempts are loaded into Python.
+"""
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+REBUILD_BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def rebuild_progress(course_id=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Replace the CourseProgress rows of every enrollment (in ``course_id``)
+    with freshly computed ones, keeping their last activity. Returns the
+    number of rows written.
+    """
+    from quiz.models import Quiz, QuizRecord  # Avoid circular import
+    from .models import CourseProgress, Enrollment, Lesson
+    from .outline import QUIZ_PASS_MARK
+
+    enrollments = Enrollment.objects.all()
+    lessons = Lesson.objects.all()
+    quizzes = Quiz.objects.all()
+    reads = Lesson.read_by_users.through.objects.all()
+    passed = QuizRecord.objects.filter(best_score__gte=QUIZ_PASS_MARK)
+    existing = CourseProgress.objects.all()
+    if course_id:
+        enrollments = enrollments.filter(course_id=course_id)
+        lessons = lessons.filter(module__course_id=course_id)
+        quizzes = quizzes.filter(module__course_id=course_id)
+        reads = reads.filter(lesson__module__course_id=course_id)
+        passed = passed.filter(quiz__module__course_id=course_id)
+        existing = existing.filter(course_id=course_id)
+
+    # One grouped query per input; everything else happens in memory
+    lesson_totals = dict(
+        lessons.order_by().values('module__course').annotate(n=Count('pk')).values_list('module__course', 'n')
+    )
+    quiz_totals = dict(
+        quizzes.order_by().values('module__course').annotate(n=Count('pk')).values_list('module__course', 'n')
+    )
+    read_counts = {
+        (row['user_id'], row['lesson__module__course']): row['n']
+        for row in reads.order_by().values('user_id', 'lesson__module__course').annotate(n=Count('lesson_id'))
+    }
+    passed_counts = {
+        (row['student_id'], row['quiz__module__course']): row['n']
+        for row in passed.order_by().values('student_id', 'quiz__module__course').annotate(
+            n=Count('quiz_id', distinct=True),
+        )
+    }
+
+    now = timezone.now()
+    last_activity = {
+        (user_id, c_id): ts for user_id, c_id, ts in existing.values_list('user_id', 'course_id', 'last_activity')
+    }
+    existing.delete()
+
+    rows = []
+    for user_id, c_id in enrollments.values_list('user_id', 'course_id').iterator():
+        key = (user_id, c_id)
+        lessons_read = read_counts.get(key, 0)
+        quizzes_passed = passed_counts.get(key, 0)
+        rows.append(CourseProgress(
+            user_id=user_id,
+            course_id=c_id,
+            lessons_read=lessons_read,
+            quizzes_passed=quizzes_passed,
+            percentage=CourseProgress.compute_percentage(
+                lessons_read, lesson_totals.get(c_id, 0), quizzes_passed, quiz_totals.get(c_id, 0)
+            ),
+            last_activity=last_activity.get(key, now),
+        ))
+    CourseProgress.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def _enrolled(enrollments, user, course):
+    """EXISTS: the row's (``user``, ``course``) lookups name one of ``enrollments``."""
+    return Exists(enrollments.filter(user_id=OuterRef(user), course_id=OuterRef(course)))
+
+
+@transaction.atomic
+def reset_progress(enrollments, unenroll=False):
+    """
+    Clear read lessons, notes, quiz attempts (with their records and
+    responses), certificates, badges, progress rows and queued completion
+    checks for every (user, course) in ``enrollments``, and revoke the
+    points earned there. With ``unenroll`` the enrollments are deleted too.
+    Returns {table: rows deleted}.
+    """
+    from quiz.models import QuizAttempt, QuizRecord, QuizResponse  # Avoid circular import
+    from users.models import PointsEvent, Profile
+    from users.points import revoke_matching
+    from .models import Certificate, CertificateJob, CompletionCheck, CourseProgress, Lesson, Note
+
+    enrollments = enrollments.order_by()
+    points = revoke_matching(PointsEvent.objects.filter(
+        Q(source=PointsEvent.SOURCE_LESSON) & Exists(enrollments.filter(
+            user_id=OuterRef('user_id'), course__modules__lessons=OuterRef('object_id'),
+        ))
+        | Q(source=PointsEvent.SOURCE_QUIZ) & Exists(enrollments.filter(
+            user_id=OuterRef('user_id'), course__modules__quizzes=OuterRef('object_id'),
+        ))
+        | Q(source=PointsEvent.SOURCE_COURSE) & _enrolled(enrollments, 'user_id', 'object_id')
+    ))
+
+    deleted = {'points': points}
+    tables = (
+        ('read_lessons', Lesson.read_by_users.through, 'user_id', 'lesson__module__course_id'),
+        ('notes', Note, 'user_id', 'lesson__module__course_id'),
+        ('quiz_records', QuizRecord, 'student_id', 'quiz__module__course_id'),
+        ('quiz_responses', QuizResponse, 'attempt__student_id', 'attempt__quiz__module__course_id'),
+        ('certificate_jobs', CertificateJob, 'certificate__user_id', 'certificate__course_id'),
+        ('badges', Profile.earned_badges.through, 'profile__user_id', 'course_id'),
+        ('course_progress', CourseProgress, 'user_id', 'course_id'),
+        ('completion_checks', CompletionCheck, 'user_id', 'course_id'),
+    )
+    for name, model, user, course in tables:
+        deleted[name] = model.objects.filter(_enrolled(enrollments, user, course)).delete()[0]
+
+    # Their record, response and job rows are gone, so these deletes have
+    # little left to collect; anything created meanwhile is cascaded as usual
+    for name, model, user, course in (
+        ('quiz_attempts', QuizAttempt, 'student_id', 'quiz__module__course_id'),
+        ('certificates', Certificate, 'user_id', 'course_id'),
+    ):
+        deleted[name] = model.objects.filter(_enrolled(enrollments, user, course)).delete()[1].get(model._meta.label, 0)
+
+    if unenroll:
+        deleted['enrollments'] = enrollments.delete()[0]
+    return deleted
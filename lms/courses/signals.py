@@ -0,0 +1,74 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from quiz.models import Quiz
+from .models import Course, Module, Lesson, Video
+from .outline import invalidate_course_outline
+
+
+def _invalidate(*course_ids):
+    # In the change's own transaction: other processes see the new version together with the new structure
+    for course_id in {c for c in course_ids if c}:
+        invalidate_course_outline(course_id)
+
+
+def _course_id_for_module(module_id):
+    return Module.objects.filter(pk=module_id).values_list('course_id', flat=True).first()
+
+
+def _course_id_for_lesson(lesson_id):
+    return Lesson.objects.filter(pk=lesson_id).values_list('module__course_id', flat=True).first()
+
+
+# Modules, lessons and quizzes can be moved between parents from the
+# instructor and admin forms; remember the old course so its outline is
+# invalidated as well.
+@receiver(pre_save, sender=Module)
+def remember_module_course(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._outline_previous_course_id = _course_id_for_module(instance.pk)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_course(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._outline_previous_course_id = _course_id_for_lesson(instance.pk)
+
+
+@receiver(pre_save, sender=Quiz)
+def remember_quiz_course(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._outline_previous_course_id = Quiz.objects.filter(pk=instance.pk).values_list(
+            'module__course_id', flat=True,
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    _invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Module)
+def module_changed(sender, instance, **kwargs):
+    _invalidate(instance.course_id, getattr(instance, '_outline_previous_course_id', None))
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    _invalidate(
+        _course_id_for_module(instance.module_id),
+        getattr(instance, '_outline_previous_course_id', None),
+    )
+
+
+@receiver([post_save, post_delete], sender=Video)
+def video_changed(sender, instance, **kwargs):
+    _invalidate(_course_id_for_lesson(instance.lesson_id))
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    _invalidate(
+        _course_id_for_module(instance.module_id),
+        getattr(instance, '_outline_previous_course_id', None),
+    )
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.certificate_queue import enqueue_certificate, claim_jobs, render_certificate_job, run_job
+from courses.completion import evaluate_completions, reconcile_completions, run_due_checks
+from courses.models import (
+    Course, Module, Lesson, Video, Certificate, CertificateJob, CompletionCheck, CourseProgress, Enrollment, Note,
+)
+from courses.progress import reset_progress
+from courses.utility import CERTIFICATE_TEMPLATE_PATH, get_certificate_template_reader
+from courses.outline import get_course_outline, outline_cache_stats, reset_outline_cache_stats
+from quiz.history import record_attempt
+from quiz.models import Quiz, QuizAttempt, QuizRecord, QuizResponse
+from users.learner import Learner
+from users.models import User, Profile, PointsEvent
+from users.points import award_points
+
+
+class CourseOutlineCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+
+    def setUp(self):
+        cache.clear()
+        reset_outline_cache_stats()
+        self.course = Course.objects.create(title="Course", created_by=self.instructor)
+        self.module = Module.objects.create(course=self.course, title="Module")
+        self.lesson = Lesson.objects.create(module=self.module, title="Lesson")
+        # Creating the module and lesson moved the course's outline version
+        self.course.refresh_from_db()
+
+    def test_second_lookup_is_served_from_cache(self):
+        get_course_outline(self.course)
+        with self.assertNumQueries(0):
+            outline = get_course_outline(self.course)
+        self.assertEqual([lesson.pk for lesson in outline.lessons], [self.lesson.pk])
+        # By pk the version is read from the course row
+        with self.assertNumQueries(1):
+            get_course_outline(self.course.pk)
+        stats = outline_cache_stats()['process']
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_structure_changes_invalidate_outline(self):
+        get_course_outline(self.course)
+        new_lesson = Lesson.objects.create(module=self.module, title="Second")
+        self.assertEqual(len(get_course_outline(self.course.pk).lessons), 2)
+
+        Video.objects.create(lesson=new_lesson, title="Clip", video_url="https://example.com/v")
+        self.assertEqual(get_course_outline(self.course.pk).lessons[1].lesson_type, 'video')
+
+        quiz = Quiz.objects.create(module=self.module, title="Quiz", created_by=self.instructor)
+        self.assertEqual(get_course_outline(self.course.pk).modules[0].quiz_id, quiz.pk)
+
+        self.module.delete()
+        self.assertEqual(get_course_outline(self.course.pk).modules, ())
+
+    def test_moving_a_lesson_invalidates_both_courses(self):
+        other = Course.objects.create(title="Other", created_by=self.instructor)
+        other_module = Module.objects.create(course=other, title="Other module")
+        get_course_outline(self.course.pk)
+        get_course_outline(other.pk)
+
+        self.lesson.module = other_module
+        self.lesson.save()
+
+        self.assertEqual(get_course_outline(self.course.pk).lessons, ())
+        self.assertEqual(len(get_course_outline(other.pk).lessons), 1)
+
+    def test_moving_a_quiz_invalidates_both_courses(self):
+        quiz = Quiz.objects.create(module=self.module, title="Quiz", created_by=self.instructor)
+        other = Course.objects.create(title="Other", created_by=self.instructor)
+        other_module = Module.objects.create(course=other, title="Other module")
+        self.assertEqual(get_course_outline(self.course.pk).quiz_ids, [quiz.pk])
+        get_course_outline(other.pk)
+
+        quiz.module = other_module
+        quiz.save()
+
+        self.assertEqual(get_course_outline(self.course.pk).quiz_ids, [])
+        self.assertEqual(get_course_outline(other.pk).modules[0].quiz_id, quiz.pk)
+
+    def test_version_is_shared_through_the_database(self):
+        # Another worker's cache still holds the outline; the version on the row moves past it
+        stale = get_course_outline(self.course)
+        with mock.patch('courses.outline.cache', LocMemCache('other-worker', {})):
+            Lesson.objects.create(module=self.module, title="Second")
+        self.assertIsNot(get_course_outline(self.course.pk), stale)
+        self.assertEqual(len(get_course_outline(self.course.pk).lessons), 2)
+
+        # Saving a copy loaded before the change doesn't take the version back
+        self.course.title = "Renamed"
+        self.course.save()
+        self.course.refresh_from_db()
+        self.assertEqual(len(get_course_outline(self.course).lessons), 2)
+
+
+class CertificateQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        cls.course = Course.objects.create(title="Course", created_by=cls.instructor)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_worker_renders_queued_certificate(self):
+        certificate = enqueue_certificate(self.student, self.course)
+        self.assertFalse(certificate.certificate_file)
+
+        job_ids = claim_jobs(limit=5)
+        self.assertEqual(job_ids, [certificate.job.pk])
+        self.assertEqual(claim_jobs(limit=5), [])
+
+        self.assertTrue(run_job(job_ids[0]))
+        certificate.refresh_from_db()
+        self.assertTrue(certificate.certificate_file)
+        self.assertEqual(certificate.job.status, CertificateJob.STATUS_DONE)
+
+    def test_failed_render_is_retried_then_marked_failed(self):
+        certificate = enqueue_certificate(self.student, self.course)
+        with mock.patch('courses.utility.generate_certificate_pdf', return_value=None):
+            [job_id] = claim_jobs(limit=1)
+            self.assertFalse(run_job(job_id, max_attempts=2))
+            job = CertificateJob.objects.get(pk=job_id)
+            self.assertEqual((job.status, job.attempts), (CertificateJob.STATUS_PENDING, 1))
+
+            CertificateJob.objects.filter(pk=job_id).update(run_after=job.created_at)
+            [job_id] = claim_jobs(limit=1)
+            self.assertFalse(run_job(job_id, max_attempts=2))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, CertificateJob.STATUS_FAILED)
+        self.assertTrue(job.error)
+        certificate.refresh_from_db()
+        self.assertFalse(certificate.certificate_file)
+
+
+def _thread_pool(max_workers, mp_context=None):
+    """Stands in for the command's process pool, so renders can be mocked and counted in-process."""
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+@mock.patch('courses.management.commands.regenerate_certificates.ProcessPoolExecutor', _thread_pool)
+class RegenerateCertificatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.courses = [Course.objects.create(title=f"Course {i}", created_by=cls.instructor) for i in range(2)]
+        cls.students = [User.objects.create_user(email=f"s{i}@example.com", password="pw") for i in range(3)]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.checkpoint = os.path.join(media_root, 'checkpoint.json')
+        self.certificates = [
+            Certificate.objects.create(user=student, course=course)
+            for course in self.courses for student in self.students
+        ]
+
+    def regenerate(self, *args, render=render_certificate_job):
+        out, err = StringIO(), StringIO()
+        renders = mock.Mock(side_effect=render)
+        with mock.patch('courses.management.commands.regenerate_certificates.render_certificate_job', renders):
+            call_command(
+                'regenerate_certificates', '--workers=2', '--batch-size=2', f'--checkpoint={self.checkpoint}', *args,
+                stdout=out, stderr=err,
+            )
+        rendered = sorted(job[0] for (job,), _ in renders.call_args_list)
+        return rendered, out.getvalue(), err.getvalue()
+
+    def test_course_and_since_filters(self):
+        old = self.certificates[3]
+        Certificate.objects.filter(pk=old.pk).update(issued_at=timezone.now() - timedelta(days=30))
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+
+        rendered, out, _ = self.regenerate(f'--course={self.courses[1].pk}', f'--since={since}')
+
+        expected = [c.pk for c in self.certificates[4:]]
+        self.assertEqual(rendered, expected)
+        self.assertIn("Regenerated: 2, failed: 0", out)
+        self.assertEqual(
+            sorted(Certificate.objects.exclude(certificate_file='').exclude(certificate_file=None).values_list('pk', flat=True)),
+            expected,
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_checkpoint_without_rendering_twice(self):
+        done = self.certificates[:3]
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'scope': {'course': None, 'since': None}, 'last_pk': done[-1].pk}, f)
+
+        rendered, out, _ = self.regenerate()
+
+        self.assertEqual(rendered, [c.pk for c in self.certificates[3:]])
+        self.assertIn(f"Resuming after certificate {done[-1].pk}.", out)
+        self.assertFalse(Certificate.objects.filter(pk__in=[c.pk for c in done]).exclude(certificate_file='').exists())
+
+        # A checkpoint from a run with other filters isn't silently reused
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'scope': {'course': self.courses[0].pk, 'since': None}, 'last_pk': 1}, f)
+        with self.assertRaises(CommandError):
+            self.regenerate()
+
+    def test_failed_render_leaves_the_rest_of_the_batch(self):
+        broken = self.certificates[1]
+        old_name = 'certificates/previous.pdf'
+        Certificate.objects.filter(pk=broken.pk).update(certificate_file=old_name)
+
+        def render(job):
+            if job[0] == broken.pk:
+                return job[0], None, "template missing"
+            return render_certificate_job(job)
+
+        rendered, out, err = self.regenerate('--restart', render=render)
+
+        self.assertEqual(len(rendered), len(self.certificates))
+        self.assertIn("Regenerated: 5, failed: 1", out)
+        self.assertIn(f"Certificate {broken.pk}: render failed template missing", err)
+        self.assertEqual(Certificate.objects.get(pk=broken.pk).certificate_file.name, old_name)
+        self.assertEqual(Certificate.objects.exclude(pk=broken.pk).filter(certificate_file__startswith='certificates/').count(), 5)
+
+
+class CompletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+        cls.course = Course.objects.create(title="Course", created_by=cls.instructor)
+        first = Module.objects.create(course=cls.course, title="First")
+        cls.last = Module.objects.create(course=cls.course, title="Last")
+        cls.lessons = [Lesson.objects.create(module=module, title="Lesson") for module in (first, cls.last)]
+        cls.quiz = Quiz.objects.create(module=cls.last, title="Final", created_by=cls.instructor)
+
+    def setUp(self):
+        cache.clear()
+
+    def run_checks(self):
+        return run_due_checks(due_by=timezone.now() + timedelta(minutes=1))
+
+    def complete(self, user):
+        user.read_lessons.add(*self.lessons)
+        record_attempt(user, self.quiz, 80)
+
+    def test_requests_queue_one_check_per_learner_and_course(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.client.force_login(self.student)
+        for lesson in self.lessons:
+            self.client.post(reverse('lesson_detail', args=[lesson.pk]), {'mark_read': '1'})
+        self.assertEqual(CompletionCheck.objects.count(), 1)
+        # Not due until the coalescing window has passed
+        self.assertEqual(run_due_checks()[0], 0)
+
+        record_attempt(self.student, self.quiz, 80)
+        self.assertEqual(self.run_checks(), (1, {(self.student.pk, self.course.pk)}, set()))
+        self.assertFalse(CompletionCheck.objects.exists())
+        self.assertTrue(self.student.profile.earned_badges.filter(pk=self.course.pk).exists())
+        certificate = Certificate.objects.get(user=self.student, course=self.course)
+        self.assertEqual(certificate.job.status, CertificateJob.STATUS_PENDING)
+        self.assertEqual(Learner(self.student).points, 2 * 10 + 100)
+
+        self.client.post(reverse('lesson_detail', args=[self.lessons[0].pk]), {'unmark_read': '1'})
+        self.assertEqual(self.run_checks(), (1, set(), {(self.student.pk, self.course.pk)}))
+        self.assertFalse(self.student.profile.earned_badges.exists())
+        self.assertFalse(Certificate.objects.exists())
+        self.assertEqual(Learner(self.student).points, 10)
+
+    def test_evaluation_queries_do_not_grow_with_the_batch(self):
+        def evaluate(count):
+            users = [User.objects.create_user(email=f"u{count}-{i}@example.com", password="pw") for i in range(count)]
+            for user in users:
+                self.complete(user)
+            with CaptureQueriesContext(connection) as queries:
+                completed, _ = evaluate_completions((user.pk, self.course.pk) for user in users)
+            self.assertEqual(len(completed), count)
+            return len(queries)
+
+        self.assertEqual(evaluate(1), evaluate(20))
+
+    def test_reconcile_settles_every_enrollment(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.complete(self.student)
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        Profile.objects.create(user=other, first_name="O", last_name="T", image=None)
+        # A badge without the work behind it
+        other.profile.earned_badges.add(self.course)
+
+        self.assertEqual(reconcile_completions(batch_size=1), (2, 1, 1))
+        self.assertEqual(list(self.course.awarded_to.values_list('user__email', flat=True)), ["student@example.com"])
+        self.assertEqual(reconcile_completions(), (1, 0, 0))
+
+
+class ResetProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.courses = [Course.objects.create(title=f"Course {i}", created_by=cls.instructor) for i in range(2)]
+
+    def add_learner(self, n):
+        user = User.objects.create_user(email=f"learner{n}@example.com", password="pw")
+        profile = Profile.objects.create(user=user, first_name="L", last_name=str(n), image=None)
+        for course in self.courses:
+            module = Module.objects.create(course=course, title="Module")
+            lesson = Lesson.objects.create(module=module, title="Lesson")
+            quiz = Quiz.objects.create(module=module, title="Quiz", created_by=self.instructor)
+            Enrollment.objects.create(user=user, course=course)
+            user.read_lessons.add(lesson)
+            Note.objects.create(user=user, lesson=lesson, content="note")
+            record_attempt(user, quiz, 100, [quiz.pk])
+            CertificateJob.enqueue(Certificate.objects.create(user=user, course=course))
+            profile.earned_badges.add(course)
+            CourseProgress.objects.create(user=user, course=course, lessons_read=1)
+            award_points([(user.pk, PointsEvent.SOURCE_LESSON, lesson.pk)], 10)
+            award_points([(user.pk, PointsEvent.SOURCE_QUIZ, quiz.pk)], 50)
+            award_points([(user.pk, PointsEvent.SOURCE_COURSE, course.pk)], 100)
+        return user
+
+    def test_cohort_reset_leaves_other_courses_alone(self):
+        users = [self.add_learner(n) for n in range(2)]
+        cohort, other = self.courses
+        deleted = reset_progress(Enrollment.objects.filter(course=cohort))
+
+        self.assertEqual(deleted['points'], 2 * 160)
+        self.assertEqual((deleted['read_lessons'], deleted['certificates'], deleted['badges']), (2, 2, 2))
+        for user in users:
+            self.assertEqual(Learner(user).points, 160)
+            self.assertEqual(list(user.read_lessons.values_list('module__course', flat=True)), [other.pk])
+            self.assertEqual(list(user.certificates.values_list('course', flat=True)), [other.pk])
+            self.assertEqual(list(user.profile.earned_badges.all()), [other])
+        self.assertFalse(Note.objects.filter(lesson__module__course=cohort).exists())
+        self.assertFalse(QuizAttempt.objects.filter(quiz__module__course=cohort).exists())
+        self.assertFalse(QuizRecord.objects.filter(quiz__module__course=cohort).exists())
+        self.assertEqual(QuizResponse.objects.filter(attempt__quiz__module__course=other).count(), 2)
+        self.assertFalse(CourseProgress.objects.filter(course=cohort).exists())
+        self.assertEqual(CertificateJob.objects.count(), 2)
+        # Still enrolled unless asked otherwise
+        self.assertEqual(Enrollment.objects.count(), 4)
+
+        deleted = reset_progress(Enrollment.objects.filter(user=users[0]), unenroll=True)
+        self.assertEqual((deleted['enrollments'], deleted['points']), (2, 160))
+        self.assertEqual(Enrollment.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_the_cohort(self):
+        def reset(count):
+            for n in range(count):
+                self.add_learner(f"{count}-{n}")
+            with CaptureQueriesContext(connection) as queries:
+                reset_progress(Enrollment.objects.filter(course=self.courses[0]))
+            return len(queries)
+
+        self.assertEqual(reset(1), reset(10))
+
+
+class CourseProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.course = Course.objects.create(title="Course", created_by=cls.instructor)
+        module = Module.objects.create(course=cls.course, title="Module")
+        cls.lessons = [Lesson.objects.create(module=module, title=f"Lesson {i}") for i in range(3)]
+        cls.quizzes = [Quiz.objects.create(module=module, title=f"Quiz {i}", created_by=cls.instructor) for i in range(2)]
+        cls.learners = [User.objects.create_user(email=f"l{i}@example.com", password="pw") for i in range(3)]
+        for learner in cls.learners:
+            Enrollment.objects.create(user=learner, course=cls.course)
+
+    def test_compute_percentage_counts_lessons_and_quizzes_as_steps(self):
+        self.assertEqual(CourseProgress.compute_percentage(0, 0, 0, 0), 0.0)
+        self.assertEqual(CourseProgress.compute_percentage(3, 3, 1, 1), 100.0)
+        self.assertEqual(CourseProgress.compute_percentage(2, 3, 1, 2), 60.0)
+
+    def test_refresh_counts_read_lessons_and_passing_best_scores(self):
+        learner = self.learners[0]
+        learner.read_lessons.add(*self.lessons[:2])
+        record_attempt(learner, self.quizzes[0], 60)
+        record_attempt(learner, self.quizzes[0], 75)
+        record_attempt(learner, self.quizzes[1], 74)
+
+        progress = CourseProgress.refresh(learner, self.course)
+        self.assertEqual((progress.lessons_read, progress.quizzes_passed, progress.percentage), (2, 1, 60.0))
+        self.assertEqual(CourseProgress.objects.get(user=learner, course=self.course), progress)
+        self.assertEqual(self.course.progress(learner), 60.0)
+
+    def test_rebuild_matches_refresh(self):
+        first, second, third = self.learners
+        first.read_lessons.add(*self.lessons)
+        record_attempt(first, self.quizzes[0], 100)
+        record_attempt(first, self.quizzes[1], 80)
+        second.read_lessons.add(self.lessons[0])
+        record_attempt(second, self.quizzes[1], 50)
+        expected = {
+            learner.pk: (progress.lessons_read, progress.quizzes_passed, progress.percentage)
+            for learner in self.learners
+            for progress in [CourseProgress.refresh(learner, self.course)]
+        }
+        CourseProgress.objects.all().delete()
+
+        call_command('rebuild_course_progress', stdout=StringIO())
+
+        rebuilt = {
+            user_id: (lessons_read, quizzes_passed, percentage)
+            for user_id, lessons_read, quizzes_passed, percentage in CourseProgress.objects.values_list(
+                'user_id', 'lessons_read', 'quizzes_passed', 'percentage',
+            )
+        }
+        self.assertEqual(rebuilt, expected)
+        self.assertEqual(expected[third.pk], (0, 0, 0.0))
+
+
+class CertificateTemplateCacheTests(TestCase):
+    def test_template_is_parsed_once_until_file_changes(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, 'template.pdf')
+        shutil.copyfile(CERTIFICATE_TEMPLATE_PATH, path)
+
+        reader = get_certificate_template_reader(path)
+        self.assertIs(get_certificate_template_reader(path), reader)
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertIsNot(get_certificate_template_reader(path), reader)
@@ -1,5 +1,6 @@
 import io
 import os
+import threading
 from pypdf import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, landscape
@@ -46,76 +47,109 @@ TEXT_COLOR_COURSE = HexColor("#1a5490")   # Teal for course name
 TEXT_COLOR_DATE = HexColor("#1a5490")     # Blue for date
 
 
-def generate_certificate_pdf(user, course):
+# --- TEMPLATE CACHE ---
+# The template is parsed once per process and re-parsed only when the file's
+# mtime/size changes. Each certificate clones the cached page into its own
+# writer, so only the small text overlay is built per call.
+_template_lock = threading.Lock()
+_template_cache = {}
+
+
+def get_certificate_template_reader(path=CERTIFICATE_TEMPLATE_PATH):
+    """Return a cached PdfReader for the template, or None if it has no pages."""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(path, "rb") as template_file:
+        reader = PdfReader(io.BytesIO(template_file.read()))
+    if not reader.pages:
+        return None
+    _template_cache[path] = (key, reader)
+    return reader
+
+
+def clear_certificate_template_cache():
+    _template_cache.clear()
+
+
+def generate_certificate_pdf(user, course, awarded_on=None):
     """
     Generates a PDF certificate by overlaying text onto the Kuza Ndoto Academy template.
     
     Args:
         user: User object containing student information
         course: Course object containing course details
+        awarded_on: date printed on the certificate (defaults to today)
         
     Returns:
         bytes: PDF content as bytes, or None if an error occurs
     """
+    try:
+        return render_certificate_pdf(get_student_name(user), course.title, awarded_on)
+    except Exception as e:
+        print(f"Error during PDF generation for user {user.id}, course {course.id}: {e}")
+        traceback.print_exc()
+        return None
+
+
+def render_certificate_pdf(student_name, course_title, awarded_on=None):
+    """
+    Renders a certificate from plain values (no model access), so it can run
+    in worker processes. Raises on error.
+
+    Returns:
+        bytes: PDF content as bytes, or None if the template is missing/empty
+    """
     if not os.path.exists(CERTIFICATE_TEMPLATE_PATH):
         print(f"Error: Certificate template not found at {CERTIFICATE_TEMPLATE_PATH}")
         return None
 
-    try:
-        packet = io.BytesIO()
-        c = canvas.Canvas(packet, pagesize=PAGE_SIZE)
-
-        # --- 1. STUDENT NAME (on the line after "This is awarded to") ---
-        student_name = get_student_name(user)
-        c.setFillColor(TEXT_COLOR_NAME)
-        c.setFont(FONT_NAME_BOLD, FONT_SIZE_NAME)
-        c.drawCentredString(X_CENTER, STUDENT_NAME_Y, student_name)
-
-        # --- 2. COURSE NAME (in the designated course area) ---
-        course_name = course.title
-        c.setFillColor(TEXT_COLOR_COURSE)
-        c.setFont(FONT_NAME_BOLD, FONT_SIZE_COURSE)
-        c.drawCentredString(X_CENTER, COURSE_NAME_Y, course_name.upper())
-
-        # --- 3. COMPLETION DATE (near signature area) ---
-        completion_date = date.today().strftime("%B %d, %Y")
-        c.setFillColor(TEXT_COLOR_DATE)
-        c.setFont(FONT_NAME_REGULAR, FONT_SIZE_DATE)
-        c.drawCentredString(X_CENTER, DATE_Y, f"Awarded on: {completion_date}")
-
-        c.save()
-        packet.seek(0)
-
-        # Merge overlay with template
-        overlay_pdf = PdfReader(packet)
-        if not overlay_pdf.pages:
-            print("Error: Overlay PDF has no pages.")
-            return None
-
-        with open(CERTIFICATE_TEMPLATE_PATH, "rb") as template_file:
-            template_pdf = PdfReader(template_file)
-            if not template_pdf.pages:
-                print("Error: Template PDF has no pages.")
-                return None
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=PAGE_SIZE)
 
-            output_writer = PdfWriter()
-            template_page = template_pdf.pages[0]
-            overlay_page = overlay_pdf.pages[0]
+    # --- 1. STUDENT NAME (on the line after "This is awarded to") ---
+    c.setFillColor(TEXT_COLOR_NAME)
+    c.setFont(FONT_NAME_BOLD, FONT_SIZE_NAME)
+    c.drawCentredString(X_CENTER, STUDENT_NAME_Y, student_name)
 
-            template_page.merge_page(overlay_page)
-            output_writer.add_page(template_page)
+    # --- 2. COURSE NAME (in the designated course area) ---
+    c.setFillColor(TEXT_COLOR_COURSE)
+    c.setFont(FONT_NAME_BOLD, FONT_SIZE_COURSE)
+    c.drawCentredString(X_CENTER, COURSE_NAME_Y, course_title.upper())
 
-            output_buffer = io.BytesIO()
-            output_writer.write(output_buffer)
-            output_buffer.seek(0)
+    # --- 3. COMPLETION DATE (near signature area) ---
+    completion_date = (awarded_on or date.today()).strftime("%B %d, %Y")
+    c.setFillColor(TEXT_COLOR_DATE)
+    c.setFont(FONT_NAME_REGULAR, FONT_SIZE_DATE)
+    c.drawCentredString(X_CENTER, DATE_Y, f"Awarded on: {completion_date}")
 
-            return output_buffer.getvalue()
+    c.save()
+    packet.seek(0)
 
-    except Exception as e:
-        print(f"Error during PDF generation for user {user.id}, course {course.id}: {e}")
-        traceback.print_exc()
+    # Merge overlay with template
+    overlay_pdf = PdfReader(packet)
+    if not overlay_pdf.pages:
+        print("Error: Overlay PDF has no pages.")
         return None
 
+    output_writer = PdfWriter()
+    with _template_lock:
+        template_pdf = get_certificate_template_reader()
+        if template_pdf is None:
+            print("Error: Template PDF has no pages.")
+            return None
+        # add_page clones the page into the writer; the cached reader is never mutated
+        template_page = output_writer.add_page(template_pdf.pages[0])
+
+    template_page.merge_page(overlay_pdf.pages[0])
+
+    output_buffer = io.BytesIO()
+    output_writer.write(output_buffer)
+    return output_buffer.getvalue()
+
 
 def get_student_name(user):
     """
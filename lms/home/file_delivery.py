@@ -0,0 +1,339 @@
+"""
+Streaming delivery of protected media files (lesson PDFs, ebooks, certificates).
+
+Views do their own access checks and then hand the FieldFile to
+serve_protected_file(), which streams the bytes from wherever they live:
+
+1. the local MEDIA_ROOT (dev, and files generated on this machine),
+2. Cloudinary in production, downloaded once into the local raw file cache
+   (home/raw_file_cache.py) or proxied through a short-lived signed URL,
+3. the configured storage backend as a last resort.
+
+Files are never read into memory in one piece. Single byte ranges are
+answered with 206 Partial Content so PDF.js can fetch pages on demand, and
+ETag / Last-Modified validators let browsers revalidate with a 304.
+
+With settings.PROTECTED_MEDIA_OFFLOAD set, local files are not streamed by
+Django at all: the response carries an X-Accel-Redirect (nginx) or
+X-Sendfile header and the front proxy sends the bytes, e.g. for nginx:
+
+    location /protected-media/ {
+        internal;
+        alias /path/to/MEDIA_ROOT/;
+    }
+"""
+import logging
+import os
+import time
+from urllib.parse import quote
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from . import raw_file_cache
+
+CHUNK_SIZE = 64 * 1024
+SIGNED_URL_TTL_SECONDS = 60
+UPSTREAM_TIMEOUT_SECONDS = 30
+
+# Request headers passed on to Cloudinary so it can answer ranges and revalidations itself
+FORWARDED_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+FORWARDED_RESPONSE_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+OFFLOAD_X_ACCEL_REDIRECT = 'x-accel-redirect'
+OFFLOAD_X_SENDFILE = 'x-sendfile'
+
+
+logger = logging.getLogger(__name__)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a ``Range`` header against a file of ``size`` bytes.
+
+    Returns an inclusive (start, end) tuple, or None when the header should be
+    ignored and the whole file served (malformed, non-byte or multi-range
+    requests). Raises RangeNotSatisfiable when no requested byte exists.
+    """
+    unit, _, spec = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def make_etag(size, mtime):
+    return f'"{int(mtime * 1_000_000):x}-{size:x}"'
+
+
+def _if_range_allows(request, etag, last_modified):
+    """A Range is only honoured if the If-Range validator (when sent) still matches."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return etag is not None and if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return last_modified is not None and if_range_date is not None and int(last_modified) == if_range_date
+
+
+def _iter_file_range(fileobj, length):
+    try:
+        remaining = length
+        while remaining > 0:
+            chunk = fileobj.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def _set_common_headers(response, filename, as_attachment, etag=None, last_modified=None):
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def serve_fileobj(request, fileobj, size, filename, content_type='application/pdf',
+                  as_attachment=False, etag=None, last_modified=None):
+    """
+    Stream an open binary file object, honouring conditional and Range
+    headers. The file object is closed once the response has been consumed
+    (or immediately if no body is sent).
+    """
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        fileobj.close()
+        return not_modified
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and _if_range_allows(request, etag, last_modified):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except RangeNotSatisfiable:
+            fileobj.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        fileobj.seek(start)
+        response = StreamingHttpResponse(_iter_file_range(fileobj, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    return _set_common_headers(response, filename, as_attachment, etag, last_modified)
+
+
+def serve_local_file(request, path, filename, content_type='application/pdf', as_attachment=False):
+    """Stream a file from the local filesystem."""
+    fileobj = open(path, 'rb')
+    stat = os.fstat(fileobj.fileno())
+    return serve_fileobj(
+        request, fileobj, stat.st_size, filename, content_type, as_attachment,
+        etag=make_etag(stat.st_size, stat.st_mtime), last_modified=stat.st_mtime,
+    )
+
+
+def serve_storage_file(request, field_file, filename, content_type='application/pdf', as_attachment=False):
+    """Stream a FieldFile through its storage backend."""
+    storage, name = field_file.storage, field_file.name
+    size = storage.size(name)
+    try:
+        last_modified = storage.get_modified_time(name).timestamp()
+    except (NotImplementedError, OSError):
+        last_modified = None
+    etag = make_etag(size, last_modified) if last_modified is not None else None
+    return serve_fileobj(
+        request, storage.open(name, 'rb'), size, filename, content_type, as_attachment,
+        etag=etag, last_modified=last_modified,
+    )
+
+
+def offload_mode():
+    mode = (getattr(settings, 'PROTECTED_MEDIA_OFFLOAD', '') or '').strip().lower()
+    if mode not in ('', OFFLOAD_X_ACCEL_REDIRECT, OFFLOAD_X_SENDFILE):
+        raise ImproperlyConfigured(
+            f"PROTECTED_MEDIA_OFFLOAD must be '', '{OFFLOAD_X_ACCEL_REDIRECT}' or '{OFFLOAD_X_SENDFILE}', not {mode!r}."
+        )
+    return mode
+
+
+def offload_local_file(request, path, filename, mode, content_type='application/pdf', as_attachment=False,
+                       root=None, internal_url=None):
+    """
+    Empty response telling the front proxy to send ``path`` itself. The proxy
+    handles Range and conditional requests, so the worker is freed at once.
+    For X-Accel-Redirect, ``path`` must live under ``root`` (default
+    MEDIA_ROOT), which nginx exposes at ``internal_url``.
+    """
+    response = HttpResponse(content_type=content_type)
+    if mode == OFFLOAD_X_SENDFILE:
+        response['X-Sendfile'] = os.path.abspath(path)
+    else:
+        relative = os.path.relpath(path, root or settings.MEDIA_ROOT).replace(os.sep, '/')
+        internal_url = internal_url or getattr(settings, 'PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/')
+        response['X-Accel-Redirect'] = internal_url.rstrip('/') + '/' + quote(relative)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def _iter_upstream(upstream):
+    try:
+        for chunk in upstream.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                yield chunk
+    except (requests.RequestException, OSError) as e:
+        # The status and headers are already sent: end the body early (the
+        # client sees it fall short of Content-Length) rather than raise mid-stream
+        logger.warning("Upstream %s failed mid-stream: %s", upstream.url, e)
+    finally:
+        upstream.close()
+
+
+def serve_remote_file(request, url, filename, content_type='application/pdf', as_attachment=False):
+    """
+    Proxy a remote file chunk by chunk. Range and conditional headers are
+    forwarded so the origin answers 206/304 itself.
+    """
+    headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+    # Keep Content-Length/Content-Range meaningful: requests would transparently gunzip the body
+    headers['Accept-Encoding'] = 'identity'
+    upstream = requests.get(url, headers=headers, stream=True, timeout=UPSTREAM_TIMEOUT_SECONDS)
+
+    if upstream.status_code in (304, 416):
+        upstream.close()
+        response = HttpResponseNotModified() if upstream.status_code == 304 else HttpResponse(status=416)
+        for name in ('ETag', 'Last-Modified', 'Content-Range'):
+            if name in upstream.headers:
+                response[name] = upstream.headers[name]
+        return response
+    try:
+        upstream.raise_for_status()
+    except requests.HTTPError:
+        upstream.close()
+        raise
+
+    response = StreamingHttpResponse(_iter_upstream(upstream), status=upstream.status_code, content_type=content_type)
+    for name in FORWARDED_RESPONSE_HEADERS:
+        if name in upstream.headers:
+            response[name] = upstream.headers[name]
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def cloudinary_public_id(file_name):
+    public_id = file_name or ''
+    media_path = getattr(settings, 'MEDIA_URL', '').strip('/')
+    if media_path and not public_id.startswith(media_path):
+        public_id = f"{media_path}/{public_id}"
+    return public_id
+
+
+def cloudinary_download_url(file_name, as_attachment=False):
+    """Short-lived signed URL for a raw PDF stored on Cloudinary."""
+    import cloudinary.utils
+
+    public_id = cloudinary_public_id(file_name)
+    options = {
+        'resource_type': 'raw',
+        'type': 'upload',
+        'expires_at': int(time.time()) + SIGNED_URL_TTL_SECONDS,
+    }
+    if as_attachment:
+        options['attachment'] = True
+    return cloudinary.utils.private_download_url(public_id, 'pdf', **options)
+
+
+def serve_cached_file(request, path, filename, content_type='application/pdf', as_attachment=False):
+    """Serve an entry of the raw file cache, offloading it to the front proxy when configured."""
+    mode = offload_mode()
+    if mode:
+        return offload_local_file(
+            request, path, filename, mode, content_type, as_attachment,
+            root=raw_file_cache.cache_dir(),
+            internal_url=getattr(settings, 'RAW_FILE_CACHE_INTERNAL_URL', '/protected-cache/'),
+        )
+    return serve_local_file(request, path, filename, content_type, as_attachment)
+
+
+def local_media_path(field_file):
+    """Path of ``field_file`` under MEDIA_ROOT if it exists on this machine, else None."""
+    file_name = getattr(field_file, 'name', None)
+    if not file_name:
+        return None
+    local_path = os.path.join(settings.MEDIA_ROOT, file_name)
+    return local_path if os.path.exists(local_path) else None
+
+
+def serve_protected_file(request, field_file, filename, content_type='application/pdf',
+                         as_attachment=False, redirect_in_production=False, version=''):
+    """
+    Serve ``field_file`` to a user who has already passed the view's access
+    checks. ``redirect_in_production`` sends the browser straight to the
+    storage URL instead of proxying, as the ebook viewer always has.
+    ``version`` is added to the raw file cache key for Cloudinary files.
+    """
+    local_path = local_media_path(field_file)
+    if local_path:
+        mode = offload_mode()
+        if mode:
+            return offload_local_file(request, local_path, filename, mode, content_type, as_attachment)
+        return serve_local_file(request, local_path, filename, content_type, as_attachment)
+
+    if getattr(settings, 'ENVIRONMENT', '') == 'production':
+        if redirect_in_production:
+            return HttpResponseRedirect(field_file.url)
+        if raw_file_cache.is_enabled():
+            cached_path = raw_file_cache.fetch(
+                cloudinary_public_id(field_file.name),
+                lambda: cloudinary_download_url(field_file.name),
+                version=version,
+            )
+            if cached_path:
+                try:
+                    return serve_cached_file(request, cached_path, filename, content_type, as_attachment)
+                except FileNotFoundError:
+                    # Evicted since fetch() returned it: proxy this request as a miss
+                    pass
+        url = cloudinary_download_url(field_file.name, as_attachment=as_attachment)
+        return serve_remote_file(request, url, filename, content_type, as_attachment)
+
+    return serve_storage_file(request, field_file, filename, content_type, as_attachment)
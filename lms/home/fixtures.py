@@ -0,0 +1,87 @@
+"""
+Bulk builders for synthetic courses and learners, used by the
+learner-session benchmark (perf.benchmark) and the tests.
+
+Apart from the Course itself, rows are bulk-inserted, so model signals do
+not run for them: course progress is set directly, lessons and quizzes are
+not search-indexed, and the course outline cache is built lazily on first use.
+"""
+from courses.models import Course, Module, Lesson, Video, AdditionalMaterial, Enrollment, CourseProgress
+from quiz.models import Quiz, Question, Answer, QuizAttempt, QuizRecord
+from users.models import User, Profile
+
+BATCH_SIZE = 5000
+
+
+def make_users(prefix, count, domain='example.com', **fields):
+    """``count`` users with completed profiles and unusable passwords (log them in with force_login)."""
+    users = User.objects.bulk_create([
+        User(email=f"{prefix}{i}@{domain}", password='!', **fields) for i in range(count)
+    ])
+    Profile.objects.bulk_create([
+        Profile(user=user, first_name=prefix.title(), last_name=str(i), country="Kenya", image=None)
+        for i, user in enumerate(users)
+    ])
+    return users
+
+
+def build_course(instructor, modules=1, lessons_per_module=1, enrollments=1, students=None,
+                 quizzes=True, questions_per_quiz=2, answers_per_question=3,
+                 title="Course", description="<p>About</p>", content="<p>Text</p>"):
+    """
+    A course with ``modules`` modules of ``lessons_per_module`` lessons each
+    (the first lesson of a module has a video and a material), one quiz per
+    module unless ``quizzes`` is false (the first answer of each question is
+    correct), and ``enrollments`` new students, or the given ``students``,
+    enrolled with every lesson read and every quiz passed.
+    """
+    course = Course.objects.create(title=title, description=description, created_by=instructor)
+    module_objs = Module.objects.bulk_create([
+        Module(course=course, title=f"Module {m}", description=description) for m in range(modules)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(module=module, title=f"Lesson {m}.{i}", content=content)
+        for m, module in enumerate(module_objs) for i in range(lessons_per_module)
+    ])
+    first_lessons = lessons[::max(lessons_per_module, 1)]
+    Video.objects.bulk_create([
+        Video(lesson=lesson, title="Intro", video_url="https://example.com/v") for lesson in first_lessons
+    ])
+    AdditionalMaterial.objects.bulk_create([
+        AdditionalMaterial(lesson=lesson, title="Slides", material_url="https://example.com/s")
+        for lesson in first_lessons
+    ])
+    quiz_objs = Quiz.objects.bulk_create([
+        Quiz(module=module, title=f"Quiz {m}", created_by=instructor) for m, module in enumerate(module_objs)
+    ]) if quizzes else []
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, question_text=f"Question {q}") for quiz in quiz_objs for q in range(questions_per_quiz)
+    ])
+    Answer.objects.bulk_create([
+        Answer(question=question, answer_text=f"Answer {a}", is_correct=(a == 0))
+        for question in questions for a in range(answers_per_question)
+    ])
+
+    if students is None:
+        students = make_users(f"c{course.pk}student", enrollments)
+    Enrollment.objects.bulk_create([Enrollment(user=student, course=course) for student in students])
+    Lesson.read_by_users.through.objects.bulk_create([
+        Lesson.read_by_users.through(lesson_id=lesson.pk, user_id=student.pk)
+        for lesson in lessons for student in students
+    ], batch_size=BATCH_SIZE)
+    attempts = QuizAttempt.objects.bulk_create([
+        QuizAttempt(quiz=quiz, student=student, score=100, completed=True)
+        for quiz in quiz_objs for student in students
+    ], batch_size=BATCH_SIZE)
+    QuizRecord.objects.bulk_create([
+        QuizRecord(
+            quiz_id=attempt.quiz_id, student_id=attempt.student_id, best_attempt=attempt, best_score=100,
+            attempts=1, score_total=100, first_taken=attempt.date_taken, last_taken=attempt.date_taken,
+        )
+        for attempt in attempts
+    ], batch_size=BATCH_SIZE)
+    CourseProgress.objects.bulk_create([
+        CourseProgress(user=student, course=course, lessons_read=len(lessons), quizzes_passed=len(quiz_objs), percentage=100)
+        for student in students
+    ])
+    return course
@@ -0,0 +1,259 @@
+"""
+Size-bounded on-disk LRU cache for raw files hosted on Cloudinary.
+
+Lesson PDFs and certificates are proxied from Cloudinary in production. With
+the cache enabled, the first request downloads the file once to local disk and
+later requests (from any worker on the machine) are served from there.
+
+- Entries are keyed by public_id and version. Uploads get a fresh public_id
+  (django-cloudinary-storage uploads with unique filenames), so a replaced file
+  never hits a stale entry; ``version`` can add an explicit discriminator.
+- Downloads go to a temp file in the cache directory and are moved into place
+  with os.replace, so readers never see a partial file.
+- Concurrent misses for the same key are collapsed into one download: threads
+  wait on a per-key lock, other processes on a per-key flock.
+- After every insert the least recently used entries (by access time, which
+  hits bump explicitly) are removed until the cache is under its size limit.
+  An entry's lock file goes with it only if nobody holds it, and lockers
+  check after acquiring that the file they locked is still the one in
+  place, so a removed lock file never lets two downloads run at once.
+- An entry can still be evicted between fetch() returning its path and the
+  caller opening it; callers treat FileNotFoundError as a miss.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process de-duplication only
+    fcntl = None
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 30
+ENTRY_SUFFIX = '.bin'
+LOCK_SUFFIX = '.lock'
+PART_SUFFIX = '.part'
+
+# Temp files older than this are left over from a crashed download
+STALE_PART_SECONDS = 60 * 60
+
+
+def cache_dir():
+    return getattr(settings, 'RAW_FILE_CACHE_DIR', '') or os.path.join(settings.BASE_DIR, '.raw_file_cache')
+
+
+def max_bytes():
+    return int(getattr(settings, 'RAW_FILE_CACHE_MAX_BYTES', 0) or 0)
+
+
+def is_enabled():
+    return max_bytes() > 0
+
+
+def cache_key(public_id, version=''):
+    return hashlib.sha256(f'{public_id}\0{version}'.encode()).hexdigest()
+
+
+def entry_path(key):
+    return os.path.join(cache_dir(), key[:2], key + ENTRY_SUFFIX)
+
+
+_key_locks_guard = threading.Lock()
+_key_locks = {}
+
+
+def _key_lock(key):
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+class _ProcessLock:
+    """Exclusive flock on a sidecar file, so other worker processes wait for our download."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        while True:
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # evict() may have unlinked the file while we waited; a lock on that inode excludes nobody
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    self.fd = fd
+                    return self
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def __exit__(self, *exc_info):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def _touch(path):
+    """Mark an entry as recently used without changing its mtime (which feeds the ETag)."""
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def lookup(public_id, version=''):
+    """Path of the cached file, or None on a miss."""
+    path = entry_path(cache_key(public_id, version))
+    return path if _touch(path) else None
+
+
+def _download(url, path):
+    """Download ``url`` to ``path`` atomically. Returns False if the file is too large to cache."""
+    limit = max_bytes()
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > limit:
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=PART_SUFFIX)
+        try:
+            written = 0
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > limit:
+                        raise OverflowError
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except OverflowError:
+            os.unlink(tmp_path)
+            return False
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return True
+
+
+def fetch(public_id, url_factory, version=''):
+    """
+    Return the local path of ``public_id``, downloading it on a miss.
+    ``url_factory`` is only called when a download is needed (signed URLs
+    expire). Returns None if the file cannot be cached (too large).
+    """
+    key = cache_key(public_id, version)
+    path = entry_path(key)
+    if _touch(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _key_lock(key), _ProcessLock(path[:-len(ENTRY_SUFFIX)] + LOCK_SUFFIX):
+        # Another thread or process may have finished the download while we waited
+        if _touch(path):
+            return path
+        if not _download(url_factory(), path):
+            return None
+    evict()
+    return path if os.path.exists(path) else None
+
+
+def _entries():
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return
+    for bucket in os.scandir(root):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            yield entry
+
+
+def evict(limit=None):
+    """Remove least recently used entries until the cache fits in ``limit`` bytes; returns bytes freed."""
+    limit = max_bytes() if limit is None else limit
+    now = time.time()
+    files, locks, total = [], [], 0
+    for entry in _entries():
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.name.endswith(PART_SUFFIX):
+            if now - stat.st_mtime > STALE_PART_SECONDS:
+                _remove(entry.path)
+            continue
+        if entry.name.endswith(ENTRY_SUFFIX):
+            files.append((stat.st_atime, stat.st_size, entry.path))
+            total += stat.st_size
+        elif entry.name.endswith(LOCK_SUFFIX):
+            locks.append(entry.path)
+
+    # Lock files left behind by an earlier eviction (held at the time) or a failed download
+    for path in locks:
+        if not os.path.exists(path[:-len(LOCK_SUFFIX)] + ENTRY_SUFFIX):
+            _remove_lock(path)
+
+    freed = 0
+    files.sort()
+    for _, size, path in files:
+        if total - freed <= limit:
+            break
+        if _remove(path):
+            _remove_lock(path[:-len(ENTRY_SUFFIX)] + LOCK_SUFFIX)
+            freed += size
+    return freed
+
+
+def _remove_lock(path):
+    """Remove a lock file unless some process holds it (it is then left for a later eviction)."""
+    if fcntl is None:
+        return _remove(path)
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    try:
+        return _remove(path)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def usage():
+    """(entry count, total bytes) currently on disk."""
+    count = total = 0
+    for entry in _entries():
+        if entry.name.endswith(ENTRY_SUFFIX):
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                continue
+            count += 1
+    return count, total
@@ -0,0 +1,139 @@
+"""
+Query budget for every public page.
+
+Each view is requested against a small catalogue (one module, lesson and
+enrollment) and a large one (100 of each) and must issue the same number of
+queries for both, so any per-row query (N+1) added to a view or template
+fails here.
+
+The instructor layout (instructor/index.html) loads django-tailwind's
+``tailwind_tags``, which is not an installed app, so these tests swap it for
+a bare ``{% block content %}``; the pages' own templates render as usual.
+
+Not covered: the file streaming views (home/tests.py), module_detail (its
+template does not exist) and the newsletter page (it loads tailwind_tags
+itself).
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from leaderboard.ranking import clear_boards
+from search.suggest import clear_suggest_index
+from .test_utils import build_catalogue
+
+SMALL = 1
+LARGE = 100
+
+TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.locmem.Loader', {
+                'instructor/index.html': '{% block content %}{% endblock %}',
+            }),
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ],
+    },
+}]
+
+
+@override_settings(TEMPLATES=TEMPLATES)
+class QueryBudgetTests(TestCase):
+    """Same number of queries for SMALL and LARGE catalogues, for every page."""
+
+    def setUp(self):
+        cache.clear()
+        clear_suggest_index()
+        clear_boards()
+
+    def requests(self, data):
+        """name -> (user or None, method, url, POST data, expected status)."""
+        course, module, lesson, quiz = data['course'], data['module'], data['lesson'], data['quiz']
+        learner, instructor = data['learner'], data['instructor']
+        return {
+            # home
+            'home (anonymous)': (None, 'get', reverse('home'), None, 200),
+            'home': (learner, 'get', reverse('home'), None, 200),
+            'courses': (learner, 'get', reverse('courses'), None, 200),
+            'course_detail': (learner, 'get', reverse('course_detail', args=[course.pk]), None, 200),
+            'course_detail enroll': (learner, 'post', reverse('course_detail', args=[course.pk]), {'action': 'enroll'}, 302),
+            'course_detail unenroll': (learner, 'post', reverse('course_detail', args=[course.pk]), {'action': 'unenroll'}, 302),
+            'lesson_detail': (learner, 'get', reverse('lesson_detail', args=[lesson.pk]), None, 200),
+            'lesson_detail unmark_read': (learner, 'post', reverse('lesson_detail', args=[lesson.pk]), {'unmark_read': '1'}, 302),
+            'lesson_detail mark_read': (learner, 'post', reverse('lesson_detail', args=[lesson.pk]), {'mark_read': '1'}, 302),
+            'lesson_detail save_note': (learner, 'post', reverse('lesson_detail', args=[lesson.pk]), {'save_note': '1', 'note_content': 'x'}, 302),
+            'quiz_detail': (learner, 'get', reverse('quiz_detail', args=[quiz.pk]), None, 200),
+            'submit_quiz': (learner, 'post', reverse('submit_quiz', args=[quiz.pk]), data['answers'], 200),
+            'quiz_list': (learner, 'get', reverse('quiz_list'), None, 200),
+            'quiz_review': (learner, 'get', reverse('quiz_review', args=[quiz.pk]), None, 200),
+            'ebook_list': (learner, 'get', reverse('ebook_list'), None, 200),
+            'ebook_detail': (learner, 'get', reverse('ebook_detail', args=[data['ebook'].slug]), None, 200),
+            'certificate_list': (learner, 'get', reverse('certificate_list'), None, 200),
+            'search': (learner, 'get', reverse('search') + '?q=lesson', None, 200),
+            'search_suggest': (learner, 'get', reverse('search_suggest') + '?q=les', None, 200),
+            'leaderboard': (learner, 'get', reverse('leaderboard'), None, 200),
+            'leaderboard course': (learner, 'get', reverse('leaderboard') + f'?scope=course&course={course.pk}', None, 200),
+            # instructor
+            'instructor_dashboard': (instructor, 'get', reverse('instructor_dashboard'), None, 200),
+            'instructor_course_list': (instructor, 'get', reverse('instructor_course_list'), None, 200),
+            'create_course': (instructor, 'get', reverse('create_course'), None, 200),
+            'instructor_course_detail': (instructor, 'get', reverse('instructor_course_detail', args=[course.pk]), None, 200),
+            'update_course': (instructor, 'get', reverse('update_course', args=[course.pk]), None, 200),
+            'delete_course': (instructor, 'get', reverse('delete_course', args=[course.pk]), None, 200),
+            'instructor_module_list': (instructor, 'get', reverse('instructor_module_list'), None, 200),
+            'instructor_module_detail': (instructor, 'get', reverse('instructor_module_detail', args=[module.pk]), None, 200),
+            'create_module': (instructor, 'get', reverse('create_module', args=[course.pk]), None, 200),
+            'update_module': (instructor, 'get', reverse('update_module', args=[module.pk]), None, 200),
+            'delete_module': (instructor, 'get', reverse('delete_module', args=[module.pk]), None, 200),
+            'instructor_lesson_list': (instructor, 'get', reverse('instructor_lesson_list', args=[module.pk]), None, 200),
+            'create_lesson': (instructor, 'get', reverse('create_lesson', args=[module.pk]), None, 200),
+            'instructor_lesson_detail': (instructor, 'get', reverse('instructor_lesson_detail', args=[lesson.pk]), None, 200),
+            'update_lesson': (instructor, 'get', reverse('update_lesson', args=[lesson.pk]), None, 200),
+            'delete_lesson': (instructor, 'get', reverse('delete_lesson', args=[lesson.pk]), None, 200),
+            # users
+            'login': (None, 'get', reverse('login'), None, 200),
+            'register': (None, 'get', reverse('register'), None, 200),
+            'profile': (learner, 'get', reverse('profile'), None, 200),
+            'profile_create': (learner, 'get', reverse('profile_create'), None, 200),
+            'subscribe': (learner, 'post', reverse('subscribe'), {}, 302),
+            'unsubscribe': (learner, 'post', reverse('unsubscribe'), {}, 302),
+            'mark_tour_seen': (learner, 'post', reverse('mark_tour_seen'), {}, 200),
+        }
+
+    def query_counts(self, size):
+        """Query count of every request against a catalogue of ``size``; data is rolled back afterwards."""
+        counts = {}
+        with transaction.atomic():
+            data = build_catalogue(size)
+            for name, (user, method, url, post_data, status) in self.requests(data).items():
+                # Each request runs in its own savepoint so writes don't leak into the next one
+                with transaction.atomic():
+                    cache.clear()
+                    clear_suggest_index()
+                    clear_boards()
+                    # The current Site is cached per process after its first lookup
+                    Site.objects.get_current()
+                    self.client.logout()
+                    if user is not None:
+                        self.client.force_login(user)
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = getattr(self.client, method)(url, post_data)
+                    self.assertEqual(response.status_code, status, f"{name} at size {size}")
+                    counts[name] = len(ctx.captured_queries)
+                    transaction.set_rollback(True)
+            transaction.set_rollback(True)
+        return counts
+
+    def test_query_count_does_not_grow_with_catalogue_size(self):
+        small = self.query_counts(SMALL)
+        large = self.query_counts(LARGE)
+        growing = {name: (small[name], large[name]) for name in small if large[name] != small[name]}
+        self.assertEqual(growing, {}, "views whose query count grows with catalogue size (small, large)")
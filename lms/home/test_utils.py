@@ -0,0 +1,58 @@
+"""
+Test-only fixtures: the catalogue the query budget tests request pages
+against, built with home.fixtures.
+"""
+from django.db.models import F
+
+from courses.models import Enrollment, Note, Ebook, EbookCategory, Certificate
+from leaderboard.ranking import refresh_leaderboard
+from search.index import rebuild_index
+from users.models import Profile
+from .fixtures import build_course, make_users
+
+
+def build_catalogue(size):
+    """
+    Everything the public pages list, ``size`` of each: an instructor with
+    ``size`` courses (the first with ``size`` modules and enrollments), a
+    learner enrolled in and certified for all of them, and ebooks. Returns a dict of the objects the requests need.
+    """
+    instructor = make_users('teacher', 1, role='instructor')[0]
+
+    course = build_course(instructor, modules=size, lessons_per_module=2, enrollments=size)
+    courses = [course] + [
+        build_course(instructor, title=f"Course {i}", enrollments=0) for i in range(1, size)
+    ]
+    learner = Enrollment.objects.filter(course=course).order_by('pk').first().user
+    Enrollment.objects.bulk_create([Enrollment(user=learner, course=other) for other in courses[1:]])
+    Profile.earned_badges.through.objects.bulk_create([
+        Profile.earned_badges.through(profile_id=learner.profile.pk, course_id=c.pk) for c in courses
+    ])
+    Certificate.objects.bulk_create([Certificate(user=learner, course=c) for c in courses])
+    module = course.modules.order_by('pk').last()
+    lesson = module.lessons.order_by('pk').first()
+    Note.objects.create(user=learner, lesson=lesson, content="Remember this")
+
+    category = EbookCategory.objects.create(name="Guides", slug="guides")
+    ebooks = Ebook.objects.bulk_create([
+        Ebook(title=f"Guide {i}", slug=f"guide-{i}", file=f"ebooks/guide-{i}.pdf", category=category, uploaded_by=instructor)
+        for i in range(size)
+    ])
+    rebuild_index()
+    Profile.objects.update(points=F('pk'))
+    refresh_leaderboard()
+
+    quiz = module.quizzes.first()
+    return {
+        'instructor': instructor,
+        'learner': learner,
+        'course': course,
+        'module': module,
+        'lesson': lesson,
+        'quiz': quiz,
+        'answers': {
+            f'question_{question.pk}': question.answers.filter(is_correct=True).first().pk
+            for question in quiz.questions.all()
+        },
+        'ebook': ebooks[0],
+    }
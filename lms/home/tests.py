@@ -1,3 +1,341 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+import requests
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from courses.models import Lesson, Enrollment, Ebook
+from courses.outline import CourseOutline
+from home import raw_file_cache
+from quiz.history import record_attempt
+from quiz.models import Quiz
+from users.models import User, Profile
+from .fixtures import build_course
+
+
+class CourseOutlineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_outline_loads_in_fixed_queries(self):
+        small = build_course(self.instructor, modules=1, lessons_per_module=1, enrollments=0)
+        large = build_course(self.instructor, modules=10, lessons_per_module=10, enrollments=0)
+        with self.assertNumQueries(3):
+            CourseOutline.for_course(small)
+        with self.assertNumQueries(3):
+            outline = CourseOutline.for_course(large)
+        self.assertEqual(len(outline.lessons), 100)
+        self.assertEqual(outline.lessons[0].lesson_type, 'video')
+        self.assertEqual(outline.lessons[1].lesson_type, 'text')
+
+    def test_neighbours_and_gating(self):
+        course = build_course(self.instructor, modules=2, lessons_per_module=2, enrollments=0)
+        outline = CourseOutline.for_course(course)
+        first, second, third, _ = outline.lessons
+        self.assertEqual(outline.neighbours(first.pk), (None, second))
+        self.assertEqual(outline.neighbours(third.pk), (second, outline.lessons[3]))
+
+        second_module = outline.modules[1]
+        self.assertEqual(outline.blocking_module(second_module.pk, set()), outline.modules[0])
+        record_attempt(self.student, Quiz.objects.get(pk=outline.modules[0].quiz_id), 80)
+        self.assertIsNone(outline.blocking_module(second_module.pk, outline.passed_quiz_ids(self.student)))
+
+    def lesson_page_queries(self, course):
+        Enrollment.objects.create(user=self.student, course=course)
+        lesson = Lesson.objects.filter(module__course=course).order_by('module__created_at', 'created_at').first()
+        # Fresh session, so both measurements include the profile completeness check
+        self.client.logout()
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('lesson_detail', args=[lesson.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_lesson_detail_query_count_is_constant(self):
+        small = self.lesson_page_queries(build_course(self.instructor, modules=1, lessons_per_module=1, enrollments=0))
+        large = self.lesson_page_queries(build_course(self.instructor, modules=8, lessons_per_module=8, enrollments=0))
+        self.assertEqual(small, large)
+
+
+class FileDeliveryTests(TestCase):
+    PDF_BYTES = b"%PDF-1.4\n" + bytes(range(256)) * 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'lesson_pdfs'))
+        with open(os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'), 'wb') as f:
+            f.write(self.PDF_BYTES)
+
+        course = build_course(self.instructor, enrollments=0, quizzes=False)
+        self.lesson = Lesson.objects.get(module__course=course)
+        self.lesson.pdf_file.name = 'lesson_pdfs/notes.pdf'
+        self.lesson.save()
+        Enrollment.objects.create(user=self.student, course=course)
+        self.client.force_login(self.student)
+        self.url = reverse('lesson_stream', args=[self.lesson.pk])
+
+    def test_full_file_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.PDF_BYTES)
+        self.assertEqual(response['Content-Length'], str(len(self.PDF_BYTES)))
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="lesson.pdf"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_byte_ranges(self):
+        size = len(self.PDF_BYTES)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.PDF_BYTES[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{size}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b"".join(response.streaming_content), self.PDF_BYTES[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+        # A stale If-Range validator means the client gets the whole (changed) file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(ENVIRONMENT='production', RAW_FILE_CACHE_MAX_BYTES=1024 * 1024)
+    def test_cloudinary_file_is_served_from_raw_file_cache(self):
+        os.remove(os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'))
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+
+        with override_settings(RAW_FILE_CACHE_DIR=cache_dir), \
+                mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(self.PDF_BYTES)) as get, \
+                mock.patch('home.file_delivery.cloudinary_download_url', return_value='https://cdn.example/x'):
+            for _ in range(2):
+                response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), self.PDF_BYTES[:10])
+        self.assertEqual(get.call_count, 1)
+
+    def fake_proxy(self, response):
+        """Resolve an offload response the way the front proxy would; returns the bytes it would send."""
+        self.assertEqual(response.content, b"")
+        if 'X-Sendfile' in response:
+            path = response['X-Sendfile']
+        else:
+            internal = response['X-Accel-Redirect']
+            self.assertTrue(internal.startswith('/protected-media/'))
+            path = os.path.join(self.media_root, unquote(internal[len('/protected-media/'):]))
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='x-accel-redirect', PROTECTED_MEDIA_INTERNAL_URL='/protected-media/')
+    def test_x_accel_redirect_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/lesson_pdfs/notes.pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="lesson.pdf"')
+        self.assertEqual(self.fake_proxy(response), self.PDF_BYTES)
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='x-sendfile')
+    def test_x_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'))
+        self.assertEqual(self.fake_proxy(response), self.PDF_BYTES)
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='x-accel-redirect')
+    def test_offload_still_checks_enrollment(self):
+        Enrollment.objects.filter(user=self.student).delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    @override_settings(ENVIRONMENT='production', RAW_FILE_CACHE_MAX_BYTES=0)
+    def test_cloudinary_file_is_proxied_in_chunks(self):
+        os.remove(os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'))
+        upstream = mock.Mock(status_code=206, headers={'Content-Range': 'bytes 0-9/100', 'Content-Length': '10'})
+        upstream.iter_content.return_value = iter([b"0123", b"456789"])
+
+        with mock.patch('home.file_delivery.requests.get', return_value=upstream) as get, \
+                mock.patch('home.file_delivery.cloudinary_download_url', return_value='https://cdn.example/x'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+            self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/100')
+        self.assertEqual(get.call_args.kwargs['headers']['Range'], 'bytes=0-9')
+        self.assertTrue(get.call_args.kwargs['stream'])
+        upstream.close.assert_called_once()
+
+    @override_settings(ENVIRONMENT='production', RAW_FILE_CACHE_MAX_BYTES=0)
+    def test_upstream_failure_mid_stream_ends_the_body(self):
+        os.remove(os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'))
+        upstream = mock.Mock(status_code=200, headers={'Content-Length': '10'}, url='https://cdn.example/x')
+
+        def iter_content(chunk_size):
+            yield b"0123"
+            raise requests.ConnectionError("reset by peer")
+        upstream.iter_content.side_effect = iter_content
+
+        with mock.patch('home.file_delivery.requests.get', return_value=upstream), \
+                mock.patch('home.file_delivery.cloudinary_download_url', return_value='https://cdn.example/x'), \
+                self.assertLogs('home.file_delivery', 'WARNING'):
+            response = self.client.get(self.url)
+            self.assertEqual(b"".join(response.streaming_content), b"0123")
+        upstream.close.assert_called_once()
+
+    @override_settings(ENVIRONMENT='production', RAW_FILE_CACHE_MAX_BYTES=1024 * 1024)
+    def test_entry_evicted_before_open_is_proxied(self):
+        os.remove(os.path.join(self.media_root, 'lesson_pdfs', 'notes.pdf'))
+        upstream = mock.Mock(status_code=200, headers={'Content-Length': '4'}, url='https://cdn.example/x')
+        upstream.iter_content.return_value = iter([b"0123"])
+
+        with mock.patch('home.file_delivery.raw_file_cache.fetch', return_value=os.path.join(self.media_root, 'gone.bin')), \
+                mock.patch('home.file_delivery.requests.get', return_value=upstream), \
+                mock.patch('home.file_delivery.cloudinary_download_url', return_value='https://cdn.example/x'):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b"".join(response.streaming_content), b"0123")
+
+    def test_ebook_upstream_failure_is_not_found(self):
+        ebook = Ebook.objects.create(title="Book", slug="book", file='ebooks/book.pdf')
+        with mock.patch('home.views.serve_protected_file', side_effect=requests.Timeout("timed out")):
+            response = self.client.get(reverse('ebook_stream', args=[ebook.slug]))
+        self.assertEqual(response.status_code, 404)
+
+
+def fake_download(body, delay=0):
+    response = mock.MagicMock(status_code=200, headers={'Content-Length': str(len(body))})
+    response.__enter__.return_value = response
+
+    def iter_content(chunk_size):
+        time.sleep(delay)
+        yield body
+    response.iter_content.side_effect = iter_content
+    return response
+
+
+class RawFileCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(RAW_FILE_CACHE_DIR=self.cache_dir, RAW_FILE_CACHE_MAX_BYTES=250)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_miss_downloads_once_then_hits(self):
+        with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"x" * 100)) as get:
+            first = raw_file_cache.fetch('media/lesson_pdfs/a', lambda: 'https://cdn.example/a')
+            second = raw_file_cache.fetch('media/lesson_pdfs/a', lambda: 'https://cdn.example/a')
+        self.assertEqual(first, second)
+        self.assertEqual(get.call_count, 1)
+        with open(first, 'rb') as f:
+            self.assertEqual(f.read(), b"x" * 100)
+        # A new version is a different entry
+        self.assertIsNone(raw_file_cache.lookup('media/lesson_pdfs/a', version='2'))
+
+    def test_concurrent_misses_share_one_download(self):
+        results = []
+        with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"y" * 50, delay=0.2)) as get:
+            threads = [
+                threading.Thread(target=lambda: results.append(raw_file_cache.fetch('shared', lambda: 'https://cdn.example/s')))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for name in ('a', 'b'):
+            with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"z" * 100)):
+                path = raw_file_cache.fetch(name, lambda: 'https://cdn.example/')
+            # Make access times strictly ordered
+            os.utime(path, (time.time() - 100 if name == 'a' else time.time() - 50, os.stat(path).st_mtime))
+        raw_file_cache.lookup('a')  # 'a' is now the most recently used
+
+        with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"z" * 100)):
+            raw_file_cache.fetch('c', lambda: 'https://cdn.example/')
+
+        self.assertIsNotNone(raw_file_cache.lookup('a'))
+        self.assertIsNone(raw_file_cache.lookup('b'))
+        self.assertIsNotNone(raw_file_cache.lookup('c'))
+        self.assertEqual(raw_file_cache.usage(), (2, 200))
+
+    def lock_path(self, public_id):
+        entry = raw_file_cache.entry_path(raw_file_cache.cache_key(public_id))
+        return entry[:-len(raw_file_cache.ENTRY_SUFFIX)] + raw_file_cache.LOCK_SUFFIX
+
+    def test_eviction_keeps_lock_files_that_are_held(self):
+        with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"x" * 100)):
+            raw_file_cache.fetch('a', lambda: 'https://cdn.example/a')
+        lock_path = self.lock_path('a')
+
+        with raw_file_cache._ProcessLock(lock_path):
+            raw_file_cache.evict(limit=0)
+            self.assertIsNone(raw_file_cache.lookup('a'))
+            self.assertTrue(os.path.exists(lock_path))
+        # Once released, the orphaned lock file goes with the next eviction
+        raw_file_cache.evict(limit=0)
+        self.assertFalse(os.path.exists(lock_path))
+
+    def test_waiter_relocks_when_its_lock_file_was_removed(self):
+        lock_path = self.lock_path('b')
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        locked = []
+
+        def wait_for_lock():
+            with raw_file_cache._ProcessLock(lock_path) as lock:
+                locked.append(os.fstat(lock.fd).st_ino == os.stat(lock_path).st_ino)
+
+        with raw_file_cache._ProcessLock(lock_path):
+            waiter = threading.Thread(target=wait_for_lock)
+            waiter.start()
+            time.sleep(0.1)
+            # What evict() in another process does to an unheld lock file
+            os.unlink(lock_path)
+        waiter.join(timeout=5)
+        self.assertEqual(locked, [True])
+
+    def test_files_larger_than_the_cache_are_not_stored(self):
+        with mock.patch('home.raw_file_cache.requests.get', return_value=fake_download(b"w" * 300)):
+            self.assertIsNone(raw_file_cache.fetch('huge', lambda: 'https://cdn.example/'))
+        self.assertEqual(raw_file_cache.usage(), (0, 0))
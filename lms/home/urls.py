@@ -13,6 +13,8 @@ from .views import (
     ReviewQuizView,
     LessonStreamView,
     SearchView,
+    SearchSuggestView,
+    LeaderboardView,
 )
 
 urlpatterns = [
@@ -45,5 +47,9 @@ urlpatterns = [
 
     # Search
     path('search/', SearchView.as_view(), name='search'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search_suggest'),
+
+    # Leaderboard
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
 
 ]
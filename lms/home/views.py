@@ -1,21 +1,32 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, HttpResponseRedirect, FileResponse, Http404, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse, Http404, HttpResponseForbidden, JsonResponse
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView, View, ListView
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.db import models, transaction
-from django.db.models import F, Count, Q, Sum, Case, When, Value, IntegerField
+from django.db.models import Count, Q, Sum
 import os
-from courses.models import Course, Lesson, Module, Enrollment, Note, Ebook, EbookCategory, Certificate
-from quiz.models import Quiz, Question, Answer, QuizAttempt
-from users.models import User, Profile
+from courses.models import Course, Lesson, Module, Enrollment, Note, Ebook, EbookCategory, Certificate, CourseProgress
+from courses.outline import get_course_outline
+from courses.completion import enqueue_completion_check
+from courses.progress import reset_progress
+from .file_delivery import serve_protected_file
+from search import index as search_index
+from search import suggest as search_suggest
+from quiz.grading import get_answer_key, grade
+from quiz.history import record_attempt
+from quiz.models import Quiz, QuizAttempt, QuizRecord
+from users.models import User, Profile, PointsEvent
+from users.points import award_points, revoke_points
+from users.learner import get_learner
 from django.conf import settings
 import cloudinary
 import cloudinary.utils
-import urllib.request
-import urllib.error
+import requests
+from urllib.parse import urlencode
 
 # Gamification constants
 POINTS_PER_LESSON = 10
@@ -23,64 +34,6 @@ POINTS_PER_COURSE = 100
 POINTS_PER_QUIZ = 50  # Award when user achieves pass mark in a quiz
 
 
-@transaction.atomic
-def check_completion_and_generate_certificate(user, course, request, allow_award=True):
-    """
-    Course completion check. Only awards course points/certificate when allow_award is True.
-    Revokes if course becomes incomplete.
-    """
-    ProfileModel = Profile
-    profile, _ = ProfileModel.objects.get_or_create(user=user)
-    already_completed = profile.earned_badges.filter(pk=course.pk).exists()
-
-    total_lessons = Lesson.objects.filter(module__course=course).count()
-    if total_lessons == 0:
-        return False
-
-    read_lessons_count = Lesson.objects.filter(module__course=course, read_by_users=user).count()
-    all_lessons_read = read_lessons_count >= total_lessons
-
-    # Require passing the last module's quiz if it exists
-    quiz_requirement_met = True
-    last_module = course.modules.order_by('created_at').last()
-    if last_module:
-        final_quiz = Quiz.objects.filter(module=last_module).first()
-        if final_quiz:
-            quiz_requirement_met = QuizAttempt.objects.filter(
-                student=user, quiz=final_quiz, score__gte=75
-            ).exists()
-
-    is_now_complete = all_lessons_read and quiz_requirement_met
-
-    if allow_award and is_now_complete and not already_completed:
-        ProfileModel.objects.filter(user=user).update(points=F('points') + POINTS_PER_COURSE)
-        profile.earned_badges.add(course)
-        profile.refresh_from_db()
-        certificate = Certificate(user=user, course=course)
-        if certificate.generate_and_save_certificate():
-            messages.success(request, f"Congratulations! You've completed {course.title}, earned {POINTS_PER_COURSE} points, and a badge!")
-        else:
-            messages.success(request, f"Congratulations! You've completed {course.title}, earned {POINTS_PER_COURSE} points, and a badge! (Certificate generation failed)")
-        return True
-    elif not is_now_complete and already_completed:
-        ProfileModel.objects.filter(user=user).update(
-            points=Case(
-                When(points__gte=Value(POINTS_PER_COURSE), then=F('points') - Value(POINTS_PER_COURSE)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-        )
-        profile.earned_badges.remove(course)
-        Certificate.objects.filter(user=user, course=course).delete()
-        messages.info(request, f"Course '{course.title}' is no longer complete. Badge and {POINTS_PER_COURSE} points removed.")
-        return False
-    elif allow_award and is_now_complete and not Certificate.objects.filter(user=user, course=course).exists():
-        certificate = Certificate(user=user, course=course)
-        certificate.generate_and_save_certificate()
-
-    return False
-
-
 class HomeView(TemplateView):
     template_name = "home/home.html"
 
@@ -95,18 +48,20 @@ class HomeView(TemplateView):
 
         if self.request.user.is_authenticated:
             user = self.request.user
-            profile, _ = Profile.objects.get_or_create(user=user)
+            learner = get_learner(self.request)
+            profile = learner.get_or_create_profile()
 
-            enrolled_courses = Course.objects.filter(enrollment__user=user).prefetch_related(
-                'modules__lessons',
-                'modules__quizzes'
-            )
+            enrolled_courses = Course.objects.filter(enrollment__user=user)
 
-            completed_course_pks = set(profile.earned_badges.values_list('pk', flat=True))
+            completed_course_pks = learner.earned_badge_ids
+            progress_by_course = dict(
+                CourseProgress.objects.filter(user=user).values_list('course_id', 'percentage')
+            )
             completed_list = []
             in_progress_list = []
 
             for course in enrolled_courses:
+                course.progress_percentage = progress_by_course.get(course.pk, 0)
                 if course.pk in completed_course_pks:
                     completed_list.append(course)
                 else:
@@ -116,7 +71,7 @@ class HomeView(TemplateView):
                 "enrolled_courses": enrolled_courses,
                 "completed_courses": completed_list,
                 "in_progress_courses": in_progress_list,
-                "user_points": profile.points,
+                "user_points": learner.points,
                 "user_badges": len(completed_course_pks),
             })
         return context
@@ -129,7 +84,7 @@ class CoursesView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        profile, _ = Profile.objects.get_or_create(user=user)
+        learner = get_learner(self.request)
 
         current_filter = self.request.GET.get('filter', 'all')
         context['current_filter'] = current_filter
@@ -141,7 +96,7 @@ class CoursesView(TemplateView):
             'created_by__profile__first_name', 'created_by__profile__last_name'
         )
 
-        completed_course_ids = set(profile.earned_badges.values_list('id', flat=True))
+        completed_course_ids = learner.earned_badge_ids
         completed_courses = [c for c in enrolled_courses if c.id in completed_course_ids]
         enrolled_not_completed_courses = [c for c in enrolled_courses if c.id not in completed_course_ids]
 
@@ -163,18 +118,8 @@ class CoursesView(TemplateView):
 
 class CourseDetailView(View):
     def get(self, request, pk):
-        course = get_object_or_404(
-            Course.objects.select_related('created_by__profile').prefetch_related(
-                models.Prefetch(
-                    'modules',
-                    queryset=Module.objects.order_by('created_at').prefetch_related(
-                        models.Prefetch('lessons', queryset=Lesson.objects.order_by('created_at').only('pk', 'title'))
-                    ).only('pk', 'title', 'course_id')
-                )
-            ),
-            pk=pk
-        )
-        modules = course.modules.all()
+        course = get_object_or_404(Course.objects.select_related('created_by__profile'), pk=pk)
+        modules = get_course_outline(course).modules
         enrolled = request.user.is_authenticated and Enrollment.objects.filter(user=request.user, course=course).exists()
         return render(request, 'home/course_detail.html', {'course': course, 'modules': modules, 'enrolled': enrolled})
 
@@ -184,16 +129,20 @@ class CourseDetailView(View):
         course = get_object_or_404(Course, pk=pk)
         action = request.POST.get('action', 'enroll')
         user = request.user
-        profile, _ = Profile.objects.get_or_create(user=user)
+        learner = get_learner(request)
+        # Badges and points earned in the course need a profile
+        learner.get_or_create_profile()
 
         if action == 'enroll':
             enrollment, created = Enrollment.objects.get_or_create(user=user, course=course)
+            learner.enrolled_course_ids.add(course.pk)
             if created:
                 messages.success(request, f'You have successfully enrolled in {course.title}!')
             else:
                 messages.info(request, f'You are already enrolled in {course.title}.')
 
-            first_lesson = Lesson.objects.filter(module__course=course).order_by('module__created_at', 'created_at').first()
+            lessons = get_course_outline(course).lessons
+            first_lesson = lessons[0] if lessons else None
             if first_lesson:
                 return redirect('lesson_detail', pk=first_lesson.pk)
 
@@ -201,33 +150,10 @@ class CourseDetailView(View):
             return HttpResponseRedirect(reverse('course_detail', args=[pk]))
 
         elif action == 'unenroll':
-            enrollment = Enrollment.objects.filter(user=user, course=course).first()
-            if enrollment:
-                was_completed = profile.earned_badges.filter(pk=course.pk).exists()
-
-                lessons_in_course = Lesson.objects.filter(module__course=course)
-                points_to_remove = lessons_in_course.filter(read_by_users=user).count() * POINTS_PER_LESSON
-
-                user.read_lessons.remove(*lessons_in_course)
-                Note.objects.filter(user=user, lesson__in=lessons_in_course).delete()
-                quizzes_in_course = Quiz.objects.filter(module__course=course)
-                QuizAttempt.objects.filter(student=user, quiz__in=quizzes_in_course).delete()
-
-                if was_completed:
-                    points_to_remove += POINTS_PER_COURSE
-                    profile.earned_badges.remove(course)
-                    Certificate.objects.filter(user=user, course=course).delete()
-
-                if points_to_remove > 0:
-                    Profile.objects.filter(user=user).update(
-                        points=Case(
-                            When(points__gte=Value(points_to_remove), then=F('points') - Value(points_to_remove)),
-                            default=Value(0),
-                            output_field=IntegerField(),
-                        )
-                    )
-
-                enrollment.delete()
+            if course.pk in learner.enrolled_course_ids:
+                reset_progress(Enrollment.objects.filter(user=user, course=course), unenroll=True)
+                learner.enrolled_course_ids.discard(course.pk)
+                learner.earned_badge_ids.discard(course.pk)
                 messages.success(request, f'You have successfully unenrolled from {course.title} and your progress has been cleared.')
             else:
                 messages.warning(request, f'You are not enrolled in {course.title}.')
@@ -240,13 +166,10 @@ class CourseDetailView(View):
 
 class ModuleDetailView(View):
     def get(self, request, pk):
-        module = get_object_or_404(
-            Module.objects.select_related('course').prefetch_related(
-                models.Prefetch('lessons', queryset=Lesson.objects.only('pk', 'title').order_by('created_at'))
-            ),
-            pk=pk
-        )
-        return render(request, 'home/module_detail.html', {'module': module})
+        module = get_object_or_404(Module.objects.select_related('course'), pk=pk)
+        outline_module = get_course_outline(module.course_id).get_module(module.pk)
+        lessons = outline_module.lessons if outline_module else ()
+        return render(request, 'home/module_detail.html', {'module': module, 'lessons': lessons})
 
 
 @method_decorator(login_required, name='dispatch')
@@ -260,62 +183,35 @@ class LessonDetailView(View):
             messages.warning(request, f"You must be enrolled in '{course.title}' to view this lesson.")
             return redirect('course_detail', pk=course.pk)
 
-        # Enforce module progression: all previous module quizzes (if any) must be passed
-        ordered_modules = list(course.modules.order_by('created_at'))
-        for m in ordered_modules:
-            if m == lesson.module:
-                break
-            q = m.quizzes.first()
-            if q and not QuizAttempt.objects.filter(student=user, quiz=q, score__gte=75).exists():
-                messages.warning(request, f"Please pass the quiz for module '{m.title}' (score 75%+) to proceed.")
-                return redirect('quiz_detail', quiz_id=q.pk)
-
-        all_course_modules = course.modules.order_by('created_at').prefetch_related(
-            models.Prefetch('lessons', queryset=Lesson.objects.order_by('created_at').only('pk', 'title')),
-            models.Prefetch('quizzes', queryset=Quiz.objects.only('pk', 'module_id'))
-        )
+        outline = get_course_outline(course)
+        read_lesson_ids = outline.read_lesson_ids(user)
+        passed_quiz_ids = outline.passed_quiz_ids(user)
 
-        lesson_pks_in_course = Lesson.objects.filter(module__course=course).values_list('pk', flat=True)
-        total_lessons_count = lesson_pks_in_course.count()
-        read_lesson_ids = set(user.read_lessons.filter(pk__in=lesson_pks_in_course).values_list('pk', flat=True))
-        completed_lessons_count = len(read_lesson_ids)
+        # Enforce module progression: all previous module quizzes (if any) must be passed
+        blocking_module = outline.blocking_module(lesson.module_id, passed_quiz_ids)
+        if blocking_module:
+            messages.warning(request, f"Please pass the quiz for module '{blocking_module.title}' (score 75%+) to proceed.")
+            return redirect('quiz_detail', quiz_id=blocking_module.quiz_id)
 
-        progress_percentage = (completed_lessons_count * 100.0 / total_lessons_count) if total_lessons_count else 0
+        progress_percentage = outline.progress_percentage(read_lesson_ids)
         read = lesson.pk in read_lesson_ids
+        previous_lesson, next_lesson = outline.neighbours(lesson.pk)
 
-        # Prev/next lesson ids
-        all_lessons_flat_pks = list(
-            Lesson.objects.filter(module__course=course)
-            .order_by('module__created_at', 'created_at')
-            .values_list('pk', flat=True)
-        )
-        previous_lesson = None
-        next_lesson = None
-        try:
-            idx = all_lessons_flat_pks.index(lesson.pk)
-            prev_id = all_lessons_flat_pks[idx - 1] if idx > 0 else None
-            next_id = all_lessons_flat_pks[idx + 1] if idx < len(all_lessons_flat_pks) - 1 else None
-            if prev_id:
-                previous_lesson = Lesson.objects.only('pk').get(pk=prev_id)
-            if next_id:
-                next_lesson = Lesson.objects.only('pk').get(pk=next_id)
-        except ValueError:
-            pass
-
-        module_quiz = lesson.module.quizzes.first()
+        module_quiz_id = outline.get_module(lesson.module_id).quiz_id
         quiz_attempt = None
-        if module_quiz:
-            quiz_attempt = QuizAttempt.objects.filter(student=user, quiz=module_quiz).first()
+        if module_quiz_id:
+            quiz_attempt = QuizAttempt.objects.filter(student=user, quiz_id=module_quiz_id).order_by('-date_taken', '-pk').first()
 
         note = Note.objects.filter(user=user, lesson=lesson).first()
 
         context = {
             'lesson': lesson,
-            'all_course_modules': all_course_modules,
+            'all_course_modules': outline.modules,
             'previous_lesson': previous_lesson,
             'next_lesson': next_lesson,
             'progress_percentage': progress_percentage,
             'read': read,
+            'module_quiz_id': module_quiz_id,
             'quiz_attempt': quiz_attempt,
             'read_lesson_ids': read_lesson_ids,
             'note': note,
@@ -324,12 +220,12 @@ class LessonDetailView(View):
 
     @transaction.atomic
     def post(self, request, pk):
-        lesson = get_object_or_404(Lesson, pk=pk)
+        lesson = get_object_or_404(Lesson.objects.select_related('module__course'), pk=pk)
         user = request.user
         course = lesson.module.course
-        profile, _ = Profile.objects.get_or_create(user=user)
+        learner = get_learner(request)
 
-        if not Enrollment.objects.filter(user=user, course=course).exists():
+        if course.pk not in learner.enrolled_course_ids:
             messages.error(request, "You are not enrolled in this course.")
             return HttpResponse("You are not enrolled in this course.", status=403)
 
@@ -347,74 +243,58 @@ class LessonDetailView(View):
         if 'mark_read' in request.POST and not lesson_was_already_read:
             lesson.read_by_users.add(user)
             action_taken = 'mark_read'
-            Profile.objects.filter(user=user).update(points=F('points') + POINTS_PER_LESSON)
-            messages.success(request, f"Lesson complete! +{POINTS_PER_LESSON} points.")
+            awarded = award_points([(user.pk, PointsEvent.SOURCE_LESSON, lesson.pk)], POINTS_PER_LESSON)
+            messages.success(request, f"Lesson complete! +{awarded} points." if awarded else "Lesson complete!")
 
         elif 'unmark_read' in request.POST and lesson_was_already_read:
-            was_course_complete = profile.earned_badges.filter(pk=course.pk).exists()
             lesson.read_by_users.remove(user)
             action_taken = 'unmark_read'
 
-            Profile.objects.filter(user=user).update(
-                points=Case(
-                    When(points__gte=Value(POINTS_PER_LESSON), then=F('points') - Value(POINTS_PER_LESSON)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
+            revoked = revoke_points([(user.pk, PointsEvent.SOURCE_LESSON, lesson.pk)])
+            messages.info(
+                request, f"Lesson marked incomplete. -{revoked} points." if revoked else "Lesson marked incomplete.",
             )
-            messages.info(request, f"Lesson marked incomplete. -{POINTS_PER_LESSON} points.")
-            if was_course_complete:
-                check_completion_and_generate_certificate(user, course, request, allow_award=False)
 
         # Next navigation + gating
         if action_taken:
-            if action_taken in ('mark_read', 'unmark_read'):
-                allow_award = (action_taken == 'mark_read')
-                course_just_completed = check_completion_and_generate_certificate(user, course, request, allow_award=allow_award)
-            else:
-                course_just_completed = False
+            CourseProgress.refresh(user, course)
+            # Badge, course points and certificate are settled by the completion worker
+            enqueue_completion_check(user.pk, course.pk)
 
             # Determine next step
-            all_lessons_flat = list(
-                Lesson.objects.filter(module__course=course)
-                .order_by('module__created_at', 'created_at')
-                .values_list('pk', flat=True)
-            )
-            try:
-                idx = all_lessons_flat.index(lesson.pk)
-                next_id = all_lessons_flat[idx + 1] if idx < len(all_lessons_flat) - 1 else None
-
+            outline = get_course_outline(course)
+            _, next_lesson = outline.neighbours(lesson.pk)
+            if outline.get_lesson(lesson.pk) is None:
+                next_url = reverse('course_detail', kwargs={'pk': course.id})
+            else:
                 # If this was the last lesson in its module, gate on module quiz
-                last_in_module = (Lesson.objects.filter(module=lesson.module).order_by('created_at').last().pk == lesson.pk)
-                if last_in_module:
-                    module_quiz = lesson.module.quizzes.first()
-                    if module_quiz:
-                        quiz_passed = QuizAttempt.objects.filter(student=user, quiz=module_quiz, score__gte=75).exists()
+                if outline.is_last_in_module(lesson.pk):
+                    module_quiz_id = outline.get_module(lesson.module_id).quiz_id
+                    if module_quiz_id:
+                        quiz_passed = QuizRecord.objects.filter(student=user, quiz_id=module_quiz_id, best_score__gte=75).exists()
                         if not quiz_passed:
-                            if action_taken == 'mark_read' and not course_just_completed:
+                            if action_taken == 'mark_read':
                                 messages.info(request, "Module complete. Please take the module quiz (75%+ to proceed).")
-                            next_url = reverse('quiz_detail', kwargs={'quiz_id': module_quiz.pk})
+                            next_url = reverse('quiz_detail', kwargs={'quiz_id': module_quiz_id})
 
                 # If not gated by a quiz, proceed as usual
                 if not next_url:
-                    if next_id:
-                        next_url = reverse('lesson_detail', kwargs={'pk': next_id})
+                    if next_lesson:
+                        next_url = reverse('lesson_detail', kwargs={'pk': next_lesson.pk})
                     else:
                         # End of course: if last module has quiz and not passed, gate it; else go to course detail
-                        last_module = course.modules.order_by('created_at').last()
-                        final_quiz = Quiz.objects.filter(module=last_module).first() if last_module else None
-                        if final_quiz:
-                            quiz_passed = QuizAttempt.objects.filter(student=user, quiz=final_quiz, score__gte=75).exists()
+                        last_module = outline.last_module
+                        final_quiz_id = last_module.quiz_id if last_module else None
+                        if final_quiz_id:
+                            quiz_passed = QuizRecord.objects.filter(student=user, quiz_id=final_quiz_id, best_score__gte=75).exists()
                             if not quiz_passed:
-                                if action_taken == 'mark_read' and not course_just_completed:
+                                if action_taken == 'mark_read':
                                     messages.info(request, "Last lesson complete. Now, take the final quiz!")
-                                next_url = reverse('quiz_detail', kwargs={'quiz_id': final_quiz.pk})
+                                next_url = reverse('quiz_detail', kwargs={'quiz_id': final_quiz_id})
                         if not next_url:
-                            if action_taken == 'mark_read' and not course_just_completed:
+                            if action_taken == 'mark_read':
                                 messages.success(request, f"All lessons complete in '{course.title}'.")
                             next_url = reverse('course_detail', kwargs={'pk': course.id})
-            except ValueError:
-                next_url = reverse('course_detail', kwargs={'pk': course.id})
 
         return redirect(next_url or reverse('lesson_detail', kwargs={'pk': lesson.id}))
 
@@ -461,94 +341,43 @@ class SubmitQuizView(View):
             messages.warning(request, "Complete all module lessons before submitting the quiz.")
             return redirect('quiz_detail', quiz_id=quiz.id)
 
-        # Prepare grading
-        questions = list(quiz.questions.all())
-        all_answers = list(Answer.objects.filter(question__quiz=quiz))
-        correct_answer_ids = {a.id for a in all_answers if a.is_correct}
-        answer_text_by_id = {a.id: a.answer_text for a in all_answers}
-        answers_by_question = {}
-        for a in all_answers:
-            answers_by_question.setdefault(a.question_id, []).append(a)
-
-        score = 0
-        total_questions = len(questions)
-        question_results = []  # per-question outcome with options
-        responses = {}  # NEW: store user's selections for this attempt (session only)
-
-        # Check if user had already passed (to avoid double awarding points)
-        already_passed_before = QuizAttempt.objects.filter(student=user, quiz=quiz, score__gte=75).exists()
-
-        for q in questions:
-            selected_id_str = request.POST.get(f'question_{q.id}')
-            selected_id = int(selected_id_str) if selected_id_str and selected_id_str.isdigit() else None
-            is_correct = (selected_id in correct_answer_ids) if selected_id else False
-            if is_correct:
-                score += 1
-
-            if selected_id is not None:
-                responses[str(q.id)] = selected_id  # save as strings for session-JSON compatibility
-
-            # Build options for view-only rendering
-            options = [
-                {
-                    'id': opt.id,
-                    'text': opt.answer_text,
-                    'is_correct': opt.is_correct,
-                }
-                for opt in answers_by_question.get(q.id, [])
-            ]
-
-            question_results.append({
-                'question': q,
-                'selected_answer_text': answer_text_by_id.get(selected_id) if selected_id else None,
-                'selected_id': selected_id,
-                'is_correct': is_correct,
-                'options': options,
-            })
-
-        score_percentage = (score * 100.0 / total_questions) if total_questions > 0 else 0.0
+        # Grade against the cached answer key; no Question/Answer queries
+        answer_key = get_answer_key(quiz)
+        selections = answer_key.selections_from(request.POST)
+        result = grade(answer_key, selections)
+        score, total_questions, score_percentage = result.score, result.total, result.percentage
+        question_results = answer_key.question_results(selections)  # includes options and selected choice
 
-        # Save attempt (latest attempt overwrites)
-        QuizAttempt.objects.update_or_create(
-            student=user, quiz=quiz,
-            defaults={'score': score_percentage, 'completed': True}
-        )
+        # Append the attempt and the selections made in it; earlier attempts are kept
+        record_attempt(user, quiz, score_percentage, selections.values())
+        # Selections used to be kept in the session; drop what older submissions left there
+        request.session.pop('quiz_responses', None)
 
-        # Save selections in session (no model changes)
-        quiz_responses = request.session.get('quiz_responses', {})
-        quiz_responses[str(quiz.id)] = responses
-        request.session['quiz_responses'] = quiz_responses
-        request.session.modified = True
+        CourseProgress.refresh(user, course)
 
         passed = score_percentage >= 75.0
 
-        # Award quiz points only on first time passing this quiz
-        if passed and not already_passed_before:
-            Profile.objects.filter(user=user).update(points=F('points') + POINTS_PER_QUIZ)
+        # Award quiz points only on first time passing this quiz (the ledger ignores repeats)
+        if passed and award_points([(user.pk, PointsEvent.SOURCE_QUIZ, quiz.pk)], POINTS_PER_QUIZ):
             messages.success(request, f"Great job! +{POINTS_PER_QUIZ} points for passing the quiz.")
 
-        # If this is the last module and now all lessons are read and quiz passed, allow course completion
-        course_just_completed = False
-        if passed:
-            all_lessons_read = not Lesson.objects.filter(module__course=course).exclude(read_by_users=user).exists()
-            last_module_in_course = course.modules.order_by('created_at').last()
-            if module == last_module_in_course and all_lessons_read:
-                course_just_completed = check_completion_and_generate_certificate(user, course, request, allow_award=True)
+        # The last module's quiz decides course completion, which the completion worker settles
+        outline = get_course_outline(course)
+        last_module_in_course = outline.last_module
+        if last_module_in_course and module.pk == last_module_in_course.pk:
+            enqueue_completion_check(user.pk, course.pk)
+            if passed and course.pk not in get_learner(request).earned_badge_ids and not (
+                Lesson.objects.filter(module__course=course).exclude(read_by_users=user).exists()
+            ):
+                messages.success(request, f"Congratulations! You've completed {course.title}! Your badge, {POINTS_PER_COURSE} points and certificate will be ready in a moment.")
 
         # Determine Continue target (next module's first lesson if available, else course detail)
         continue_url = reverse('course_detail', kwargs={'pk': course.pk})
         if passed:
-            ordered_module_ids = list(course.modules.order_by('created_at').values_list('pk', flat=True))
-            try:
-                idx = ordered_module_ids.index(module.pk)
-                if idx < len(ordered_module_ids) - 1:
-                    next_module_id = ordered_module_ids[idx + 1]
-                    first_lesson_next = Lesson.objects.filter(module_id=next_module_id).order_by('created_at').first()
-                    if first_lesson_next:
-                        continue_url = reverse('lesson_detail', kwargs={'pk': first_lesson_next.pk})
-                    # If next module has no lessons, fallback remains course detail
-            except ValueError:
-                pass
+            next_module = outline.next_module(module.pk)
+            # If next module has no lessons, fallback remains course detail
+            if next_module and next_module.lessons:
+                continue_url = reverse('lesson_detail', kwargs={'pk': next_module.lessons[0].pk})
 
         # Final message on failure
         if not passed:
@@ -577,11 +406,12 @@ class QuizAttemptListView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        attempts = (QuizAttempt.objects
-                    .filter(student=self.request.user)
-                    .select_related('quiz__module__course')
-                    .order_by('-id'))
-        context['attempts'] = attempts
+        # One row per quiz: the best score, with how many attempts it took
+        records = (QuizRecord.objects
+                   .filter(student=self.request.user)
+                   .select_related('quiz__module__course')
+                   .order_by('-last_taken'))
+        context['records'] = records
         return context
 
 
@@ -590,7 +420,7 @@ class QuizAttemptListView(TemplateView):
 class ReviewQuizView(View):
     def get(self, request, quiz_id):
         quiz = get_object_or_404(Quiz.objects.select_related('module__course'), id=quiz_id)
-        attempt = QuizAttempt.objects.filter(student=request.user, quiz=quiz).first()
+        attempt = QuizAttempt.objects.filter(student=request.user, quiz=quiz).order_by('-date_taken', '-pk').select_related('response').first()
         if not attempt:
             messages.info(request, "You haven't attempted this quiz yet.")
             return redirect('quiz_detail', quiz_id=quiz.id)
@@ -598,58 +428,24 @@ class ReviewQuizView(View):
         module = quiz.module
         course = module.course
 
-        total_questions = quiz.questions.count()
+        answer_key = get_answer_key(quiz)
+        total_questions = len(answer_key)
         score_percentage = float(attempt.score or 0.0)
         score_correct = int(round((score_percentage / 100.0) * total_questions)) if total_questions > 0 else 0
         passed = score_percentage >= 75.0
 
-        # Pull saved selections from session (no model changes)
-        resp_root = request.session.get('quiz_responses', {})
-        saved = resp_root.get(str(quiz.id), {}) if isinstance(resp_root, dict) else {}
-        if not saved:
+        response = getattr(attempt, 'response', None)
+        if response is None:
             messages.info(request, "Detailed selections for this attempt are unavailable.")
-
-        # Preload answers for building view-only blocks
-        answers = Answer.objects.filter(question__quiz=quiz).select_related('question')
-        answers_by_q = {}
-        for a in answers:
-            answers_by_q.setdefault(a.question_id, []).append(a)
-
-        question_results = []
-        for q in quiz.questions.all():
-            raw = saved.get(str(q.id))
-            try:
-                selected_id = int(raw) if raw not in (None, '') else None
-            except (TypeError, ValueError):
-                selected_id = None
-
-            opts = answers_by_q.get(q.id, [])
-            options = [{'id': o.id, 'text': o.answer_text, 'is_correct': o.is_correct} for o in opts]
-
-            sel_obj = next((o for o in opts if o.id == selected_id), None) if selected_id else None
-            is_correct = (sel_obj.is_correct if sel_obj is not None else None)
-
-            question_results.append({
-                'question': q,
-                'selected_answer_text': (sel_obj.answer_text if sel_obj else None),
-                'selected_id': selected_id,
-                'is_correct': is_correct,
-                'options': options,
-            })
+        selections = answer_key.selections_for(response.selected_ids) if response is not None else {}
+        question_results = answer_key.question_results(selections)
 
         # Determine Continue target (next module's first lesson if available, else course detail)
         continue_url = reverse('course_detail', kwargs={'pk': course.pk})
         if passed:
-            ordered_module_ids = list(course.modules.order_by('created_at').values_list('pk', flat=True))
-            try:
-                idx = ordered_module_ids.index(module.pk)
-                if idx < len(ordered_module_ids) - 1:
-                    next_module_id = ordered_module_ids[idx + 1]
-                    first_lesson_next = Lesson.objects.filter(module_id=next_module_id).order_by('created_at').first()
-                    if first_lesson_next:
-                        continue_url = reverse('lesson_detail', kwargs={'pk': first_lesson_next.pk})
-            except ValueError:
-                pass
+            next_module = get_course_outline(course).next_module(module.pk)
+            if next_module and next_module.lessons:
+                continue_url = reverse('lesson_detail', kwargs={'pk': next_module.lessons[0].pk})
 
         return render(request, 'quiz/quiz_result.html', {
             'quiz': quiz,
@@ -712,27 +508,10 @@ class EbookStreamView(View):
             raise Http404("Ebook is not a PDF.")
 
         try:
-            import os
-            file_name = getattr(ebook.file, 'name', None)
-            if file_name:
-                local_path = os.path.join(settings.MEDIA_ROOT, file_name)
-                if os.path.exists(local_path):
-                    with open(local_path, 'rb') as f:
-                        pdf_content = f.read()
-                    response = HttpResponse(pdf_content, content_type='application/pdf')
-                    response['Content-Disposition'] = 'inline; filename="ebook.pdf"'
-                    return response
-
-            if getattr(settings, 'ENVIRONMENT', '') == 'production':
-                return HttpResponseRedirect(ebook.file.url)
-            else:
-                pdf_content = ebook.file.read()
-                response = HttpResponse(pdf_content, content_type='application/pdf')
-                response['Content-Disposition'] = 'inline; filename="ebook.pdf"'
-                return response
+            return serve_protected_file(request, ebook.file, 'ebook.pdf', redirect_in_production=True)
 
-        except urllib.error.URLError as e:
-            print(f"Error fetching ebook {slug} from Cloudinary: {e}")
+        except requests.RequestException as e:
+            print(f"Error fetching ebook {slug} from cloud storage: {e}")
             raise Http404("File not found on cloud storage.")
         except Exception as e:
             print(f"Error serving ebook {slug}: {e}")
@@ -753,48 +532,7 @@ class LessonStreamView(View):
             raise Http404("PDF file not found for this lesson.")
 
         try:
-            import os
-            file_name = getattr(lesson.pdf_file, 'name', None)
-
-            # 1. Serve from local disk (works dev + locally-stored files)
-            if file_name:
-                local_path = os.path.join(settings.MEDIA_ROOT, file_name)
-                if os.path.exists(local_path):
-                    with open(local_path, 'rb') as f:
-                        pdf_content = f.read()
-                    response = HttpResponse(pdf_content, content_type='application/pdf')
-                    response['Content-Disposition'] = 'inline; filename="lesson.pdf"'
-                    return response
-
-            # 2. Production: fetch from Cloudinary server-side using signed URL
-            if getattr(settings, 'ENVIRONMENT', '') == 'production':
-                import cloudinary
-                import requests as req_lib
-
-                public_id = file_name or ''
-                media_path = getattr(settings, 'MEDIA_URL', '').strip('/')
-                if media_path and not public_id.startswith(media_path):
-                    public_id = f"{media_path}/{public_id}"
-
-                download_url = cloudinary.utils.private_download_url(
-                    public_id,
-                    'pdf',
-                    resource_type='raw',
-                    type='upload',
-                    expires_at=int(__import__('time').time()) + 60,
-                )
-                cloud_response = req_lib.get(download_url, timeout=30)
-                cloud_response.raise_for_status()
-
-                response = HttpResponse(cloud_response.content, content_type='application/pdf')
-                response['Content-Disposition'] = 'inline; filename="lesson.pdf"'
-                return response
-
-            # 3. Fallback: read directly from storage
-            pdf_content = lesson.pdf_file.read()
-            response = HttpResponse(pdf_content, content_type='application/pdf')
-            response['Content-Disposition'] = 'inline; filename="lesson.pdf"'
-            return response
+            return serve_protected_file(request, lesson.pdf_file, 'lesson.pdf')
 
         except Exception as e:
             print(f"Error serving lesson PDF {pk}: {e}")
@@ -807,7 +545,7 @@ class CertificateListView(ListView):
     context_object_name = 'certificates'
 
     def get_queryset(self): 
-        return Certificate.objects.filter(user=self.request.user).select_related('course').order_by('-issued_at')
+        return Certificate.objects.filter(user=self.request.user).select_related('course', 'job').order_by('-issued_at')
 
 
 from django.views.decorators.cache import never_cache
@@ -816,63 +554,23 @@ from django.views.decorators.cache import never_cache
 @method_decorator(never_cache, name='dispatch')
 class DownloadCertificateView(View):
     def get(self, request, certificate_id):
-        certificate = get_object_or_404(Certificate.objects.select_related('user', 'course'), pk=certificate_id)
+        certificate = get_object_or_404(Certificate.objects.select_related('user', 'course', 'job'), pk=certificate_id)
         if certificate.user != request.user:
             return HttpResponseForbidden("You do not have permission to download this certificate.")
 
         # Fail fast if file field is empty
         if not certificate.certificate_file:
-            messages.error(request, "Certificate file is missing or still generating.")
+            job = getattr(certificate, 'job', None)
+            if job is not None and job.is_pending:
+                messages.info(request, "Your certificate is still being generated. Please check back in a moment.")
+            else:
+                messages.error(request, "Certificate file is missing. Please contact support.")
             return redirect('certificate_list')
         try:
             course_title_safe = "".join([c if c.isalnum() else "_" for c in certificate.course.title])
             filename = f"Certificate_{course_title_safe}_{certificate.unique_id}.pdf"
 
-            import os
-            file_name = getattr(certificate.certificate_file, 'name', None)
-
-            # 1. Try local filesystem first (works in dev, and for locally-generated certs)
-            if file_name:
-                local_path = os.path.join(settings.MEDIA_ROOT, file_name)
-                if os.path.exists(local_path):
-                    with open(local_path, 'rb') as f:
-                        file_data = f.read()
-                    response = HttpResponse(file_data, content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                    return response
-
-            # 2. Production: fetch from Cloudinary server-side using authenticated API
-            if getattr(settings, 'ENVIRONMENT', '') == 'production':
-                import cloudinary
-                import requests as req_lib
-
-                public_id = file_name or ''
-                media_path = getattr(settings, 'MEDIA_URL', '').strip('/')
-                if media_path and not public_id.startswith(media_path):
-                    public_id = f"{media_path}/{public_id}"
-
-                # Generate a short-lived signed download URL (expires in 60s)
-                download_url = cloudinary.utils.private_download_url(
-                    public_id,
-                    'pdf',
-                    resource_type='raw',
-                    type='upload',
-                    expires_at=int(__import__('time').time()) + 60,
-                    attachment=True,
-                )
-                # Fetch the file server-side so the user never sees a Cloudinary URL
-                cloud_response = req_lib.get(download_url, timeout=30)
-                cloud_response.raise_for_status()
-
-                response = HttpResponse(cloud_response.content, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                return response
-
-            # 3. Fallback: read directly from storage
-            file_data = certificate.certificate_file.read()
-            response = HttpResponse(file_data, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            return serve_protected_file(request, certificate.certificate_file, filename, as_attachment=True)
 
         except Exception as e:
             print(f"Certificate download error: {e}")
@@ -883,56 +581,121 @@ class DownloadCertificateView(View):
 # ──────────────────────────────────────────────
 # Search
 # ──────────────────────────────────────────────
+class SearchSuggestView(View):
+    """Search-as-you-type: JSON title suggestions from the in-memory prefix index."""
+
+    def get(self, request):
+        q = request.GET.get('q', '').strip()
+        try:
+            limit = int(request.GET.get('limit', search_suggest.DEFAULT_LIMIT))
+        except ValueError:
+            limit = search_suggest.DEFAULT_LIMIT
+
+        suggestions = []
+        if q:
+            enrolled_course_ids = get_learner(request).enrolled_course_ids
+            suggestions = search_suggest.suggest(q, enrolled_course_ids, limit)
+        return JsonResponse({'query': q, 'results': [suggestion.as_dict() for suggestion in suggestions]})
+
+
 class SearchView(View):
     template_name = 'home/search_results.html'
+    paginate_by = 20
 
     def get(self, request):
         q = request.GET.get('q', '').strip()
         results = {'courses': [], 'lessons': [], 'ebooks': [], 'quizzes': []}
+        counts = {key: 0 for key in results}
+        page_obj = None
+        total = 0
 
         if q:
-            # Courses: search by title, description, category
-            courses_qs = Course.objects.filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q) |
-                Q(category__icontains=q)
-            ).distinct()
-
-            # Lessons: only visible to enrolled users
-            lessons_qs = Lesson.objects.filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q) |
-                Q(content__icontains=q)
-            ).select_related('module__course').distinct()
-
-            if request.user.is_authenticated:
-                enrolled_course_ids = Enrollment.objects.filter(
-                    user=request.user
-                ).values_list('course_id', flat=True)
-                lessons_qs = lessons_qs.filter(module__course__id__in=enrolled_course_ids)
-            else:
-                lessons_qs = Lesson.objects.none()
-
-            # Ebooks: only published ones
-            ebooks_qs = Ebook.objects.filter(
-                published=True
-            ).filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q)
-            ).select_related('category').distinct()
-
-            # Quizzes
-            quizzes_qs = Quiz.objects.filter(
-                Q(title__icontains=q) |
-                Q(module__title__icontains=q)
-            ).select_related('module__course').distinct()
-
-            results = {
-                'courses': list(courses_qs),
-                'lessons': list(lessons_qs),
-                'ebooks': list(ebooks_qs),
-                'quizzes': list(quizzes_qs),
-            }
-
-        total = sum(len(v) for v in results.values())
-        return render(request, self.template_name, {'results': results, 'query': q, 'total': total})
+            # Ranked matches from the search index (see search/index.py); lessons
+            # are limited to enrolled courses and ebooks to published ones
+            page_obj = Paginator(search_index.search(q, request.user), self.paginate_by).get_page(request.GET.get('page'))
+            results = search_index.load_results(page_obj.object_list)
+
+            kind_keys = {'course': 'courses', 'lesson': 'lessons', 'ebook': 'ebooks', 'quiz': 'quizzes'}
+            for kind, count in (
+                search_index.search(q, request.user, ranked=False)
+                .order_by().values_list('kind').annotate(count=Count('pk'))
+            ):
+                counts[kind_keys[kind]] = count
+            total = page_obj.paginator.count
+
+        return render(request, self.template_name, {
+            'results': results,
+            'counts': counts,
+            'query': q,
+            'total': total,
+            'page_obj': page_obj,
+        })
+
+
+# ──────────────────────────────────────────────
+# Leaderboard
+# ──────────────────────────────────────────────
+@method_decorator(login_required, name='dispatch')
+class LeaderboardView(View):
+    """Paged global, per-course or per-country leaderboard from the snapshot (see leaderboard/ranking.py)."""
+    template_name = 'home/leaderboard.html'
+    paginate_by = 25
+
+    def get(self, request):
+        from leaderboard import ranking  # Avoid circular import
+        from leaderboard.models import LeaderboardEntry
+
+        learner = get_learner(request)
+        profile = learner.profile
+        scope = request.GET.get('scope', LeaderboardEntry.SCOPE_GLOBAL)
+        if scope not in ranking.SCOPES:
+            scope = LeaderboardEntry.SCOPE_GLOBAL
+
+        scope_key = ''
+        course = None
+        courses = Course.objects.filter(pk__in=learner.enrolled_course_ids).only('pk', 'title').order_by('title')
+        if scope == LeaderboardEntry.SCOPE_COURSE:
+            course_id = request.GET.get('course', '')
+            course = (
+                Course.objects.filter(pk=course_id).only('pk', 'title').first() if course_id.isdigit()
+                else courses.first()
+            )
+            if course is None:
+                raise Http404("Course not found.")
+            scope_key = str(course.pk)
+        elif scope == LeaderboardEntry.SCOPE_COUNTRY:
+            scope_key = (request.GET.get('country') or (profile.country if profile else '') or '').strip()
+
+        board = ranking.get_board(scope, scope_key)
+        params = {'scope': scope}
+        if course is not None:
+            params['course'] = course.pk
+        elif scope == LeaderboardEntry.SCOPE_COUNTRY:
+            params['country'] = scope_key
+        page_obj = Paginator(board, self.paginate_by).get_page(request.GET.get('page'))
+
+        # The learner's own rank: against live points where the board ranks
+        # Profile.points, otherwise their row in the snapshot
+        my_rank = my_points = None
+        if scope == LeaderboardEntry.SCOPE_COURSE:
+            entry = board.entry_for(request.user.pk)
+            if entry is not None:
+                my_rank, my_points = entry.rank, entry.points
+        elif profile is not None and learner.points > 0:
+            my_points = learner.points
+            if scope == LeaderboardEntry.SCOPE_GLOBAL or scope_key == (profile.country or '').strip():
+                my_rank = board.rank_for_points(my_points)
+
+        return render(request, self.template_name, {
+            'scope': scope,
+            'scope_key': scope_key,
+            'course': course,
+            'courses': courses,
+            'board': board,
+            'page_obj': page_obj,
+            'entries': page_obj.object_list,
+            'my_rank': my_rank,
+            'my_points': my_points,
+            'total': len(board),
+            'board_query': urlencode(params),
+        })
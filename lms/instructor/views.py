@@ -8,12 +8,103 @@ from django.views.generic import (TemplateView,
                                   UpdateView, 
                                   DeleteView, 
                                   DetailView)
-from courses.models import Course, Module, Lesson
+from datetime import timedelta
 
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from analytics.models import CourseRollup, DailyActivity, ModuleRollup
+from courses.models import Course, Module, Lesson
+from quiz.grading import get_answer_key
+from quiz.models import QuestionAnalysis
+
+# Questions listed in the dashboard's item analysis, hardest first
+ITEM_ANALYSIS_ROWS = 10
+# Days of daily active learners shown per course
+ACTIVITY_DAYS_SHOWN = 14
+
+
+def _course_analytics(instructor):
+    """
+    Per-course dashboard rows from the rollups written by ``manage.py
+    refresh_course_analytics``: three queries however many courses and learners.
+    """
+    today = timezone.localdate()
+    days = [today - timedelta(days=offset) for offset in range(ACTIVITY_DAYS_SHOWN - 1, -1, -1)]
+    funnels, activity = {}, {}
+    for rollup in ModuleRollup.objects.filter(course__created_by=instructor).select_related('module').order_by(
+        'course_id', 'position',
+    ):
+        funnels.setdefault(rollup.course_id, []).append(rollup)
+    for course_id, day, active in DailyActivity.objects.filter(
+        course__created_by=instructor, day__gte=days[0],
+    ).values_list('course_id', 'day', 'active_learners'):
+        activity.setdefault(course_id, {})[day] = active
+
+    rows = []
+    for rollup in CourseRollup.objects.filter(course__created_by=instructor).select_related('course').order_by(
+        'course__title', 'course_id',
+    ):
+        daily = activity.get(rollup.course_id, {})
+        counts = [daily.get(day, 0) for day in days]
+        peak = max(counts) or 1
+        enrolled = rollup.enrollments or 1
+        rows.append({
+            'rollup': rollup,
+            'funnel': [
+                {
+                    'module': step,
+                    'started_percent': step.learners_started * 100.0 / enrolled,
+                    'finished_percent': step.learners_finished_lessons * 100.0 / enrolled,
+                    'passed_percent': None if step.learners_passed_quiz is None
+                    else step.learners_passed_quiz * 100.0 / enrolled,
+                }
+                for step in funnels.get(rollup.course_id, [])
+            ],
+            'daily_active': [
+                {'day': day, 'learners': count, 'height_percent': count * 100.0 / peak}
+                for day, count in zip(days, counts)
+            ],
+        })
+    return rows
+
+
+def _item_rows(analyses):
+    """Dashboard rows for QuestionAnalysis ``analyses``, with each question's most chosen wrong answer."""
+    rows = []
+    for analysis in analyses:
+        distractor, distractor_share = None, 0.0
+        for answer_id, text, is_correct in get_answer_key(analysis.quiz).options(analysis.question_id):
+            share = analysis.option_share(answer_id)
+            if not is_correct and share > distractor_share:
+                distractor, distractor_share = text, share
+        rows.append({
+            'analysis': analysis,
+            'percent_correct': analysis.difficulty * 100,
+            'discrimination': analysis.discrimination,
+            'distractor': distractor,
+            'distractor_percent': distractor_share * 100,
+        })
+    return rows
+
+
+class InstructorView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    template_name = "instructor/dashboard.html"
 
+    def test_func(self):
+        return self.request.user.role == 'instructor'
 
-class InstructorView(TemplateView):
-    template_name = "instructor/dashboard.html"
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Written by `manage.py quiz_item_analysis`
+        analyses = QuestionAnalysis.objects.filter(
+            quiz__module__course__created_by=self.request.user, responses__gt=0,
+        ).annotate(
+            p_value=Cast('correct', FloatField()) / F('responses'),
+        ).select_related('question', 'quiz__module__course').order_by('p_value', 'question_id')[:ITEM_ANALYSIS_ROWS]
+        context['item_analysis'] = _item_rows(analyses)
+        context['course_analytics'] = _course_analytics(self.request.user)
+        return context
 
 # Course Management Views
 class InstructorCourseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
@@ -22,11 +113,11 @@ class InstructorCourseListView(LoginRequiredMixin, UserPassesTestMixin, ListView
     context_object_name = 'courses'
 
     def get_queryset(self):
-        return Course.objects.filter(created_by=self.request.user)
+        return Course.objects.filter(created_by=self.request.user).select_related('created_by')
     
     def test_func(self):
         courses = self.get_queryset()
-        return all(course.created_by == self.request.user for course in courses)
+        return all(course.created_by_id == self.request.user.pk for course in courses)
     
 class  InstructorCourseCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     model = Course
@@ -195,6 +286,12 @@ class InstructorLessonCreateView(LoginRequiredMixin, UserPassesTestMixin, Create
     fields = [ 'module', 'title', 'description', 'objectives', 'image_content', 'content']
     template_name = "instructor/lesson_form.html"
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Module.__str__ includes the course title
+        form.fields['module'].queryset = Module.objects.select_related('course')
+        return form
+
     def form_valid(self, form):
         selected_module = form.cleaned_data['module']
         if selected_module.course.created_by != self.request.user:
@@ -225,6 +322,12 @@ class InstructorLessonUpdateView(LoginRequiredMixin, UserPassesTestMixin, Update
     fields = [ 'module', 'title', 'description', 'objectives', 'image_content', 'content']
     template_name = "instructor/lesson_update_form.html"
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Module.__str__ includes the course title
+        form.fields['module'].queryset = Module.objects.select_related('course')
+        return form
+
     def form_valid(self, form):
         selected_module = form.cleaned_data['module']
         if selected_module.course.created_by != self.request.user:
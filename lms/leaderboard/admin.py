@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import LeaderboardEntry
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('rank', 'user', 'points', 'scope', 'scope_key', 'refreshed_at')
+    list_filter = ('scope',)
+    search_fields = ('user__email', 'scope_key')
+    list_select_related = ('user',)
+    ordering = ('scope', 'scope_key', 'position')
+    readonly_fields = ('scope', 'scope_key', 'user', 'points', 'position', 'rank', 'refreshed_at')
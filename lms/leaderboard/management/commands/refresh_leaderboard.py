@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leaderboard.ranking import SCOPES, refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the leaderboard snapshot (global, per-course and per-country). Run it periodically from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scope', action='append', choices=SCOPES, dest='scopes',
+            help="Only rebuild this scope (repeatable); default: all.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = refresh_leaderboard(options['scopes'] or SCOPES)
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{scope}={count}" for scope, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f"Leaderboard refreshed in {elapsed:.2f}s ({summary})."))
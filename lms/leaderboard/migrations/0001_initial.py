@@ -0,0 +1,34 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('course', 'Course'), ('country', 'Country')], max_length=10)),
+                ('scope_key', models.CharField(blank=True, default='', max_length=64)),
+                ('points', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('refreshed_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'scope_key', 'position'], name='leaderboard_board_position')],
+                'unique_together': {('scope', 'scope_key', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['refreshed_at'], name='leaderboard_refreshed_at'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import models
+
+from users.models import User
+
+
+class LeaderboardEntry(models.Model):
+    """
+    One row of the last leaderboard snapshot (see leaderboard.ranking).
+    Rebuilt in bulk by ``manage.py refresh_leaderboard``; never edited in place.
+
+    ``position`` is the 1-based row number within the board (used for paging
+    by index range instead of OFFSET); ``rank`` is the competition rank shown
+    to users, so tied learners share a rank.
+    """
+    SCOPE_GLOBAL = 'global'
+    SCOPE_COURSE = 'course'
+    SCOPE_COUNTRY = 'country'
+    SCOPE_CHOICES = [
+        (SCOPE_GLOBAL, 'Global'),
+        (SCOPE_COURSE, 'Course'),
+        (SCOPE_COUNTRY, 'Country'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    # Course id or country name; empty for the global board
+    scope_key = models.CharField(max_length=64, blank=True, default='')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    points = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+    rank = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('scope', 'scope_key', 'user')
+        indexes = [
+            models.Index(fields=['scope', 'scope_key', 'position'], name='leaderboard_board_position'),
+            # MAX(refreshed_at) is the snapshot version (leaderboard.ranking)
+            models.Index(fields=['refreshed_at'], name='leaderboard_refreshed_at'),
+        ]
+
+    def __str__(self):
+        board = f"{self.scope}:{self.scope_key}" if self.scope_key else self.scope
+        return f"#{self.rank} {self.user.email} ({board}, {self.points} points)"
@@ -0,0 +1,218 @@
+"""
+Global, per-course and per-country leaderboards.
+
+Ranking every learner by points on each page view is a sort over all
+profiles, so the boards are materialized instead:
+
+- refresh_leaderboard() (``manage.py refresh_leaderboard``, run from cron)
+  recomputes every board into LeaderboardEntry in one transaction, stamping
+  the rows with the time of the refresh.
+- Each process loads a board on first use: the top entries, and the points
+  of everyone on it as a sorted array. Pages inside the top come from
+  memory; deeper pages are a range scan on the (scope, scope_key, position)
+  index; the rank for any number of points is a bisect over the array, so
+  "my rank" is O(log n) and needs no query.
+- The latest ``refreshed_at`` in the table (an indexed MAX, one query per
+  lookup) is the snapshot's version: every process reloads its boards on
+  the next lookup once it changes, with no shared cache involved.
+
+The global and country boards rank Profile.points, folded from the points
+ledger (users.points) just before. A course board ranks the points a
+learner earned in that course: lessons read and quizzes passed
+(CourseProgress) plus the completion bonus if they hold the course badge.
+"""
+import threading
+from array import array
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Exists, F, IntegerField, Max, OuterRef, Value, When
+from django.db.models.functions import Cast, Trim
+from django.utils import timezone
+
+from .models import LeaderboardEntry
+
+TOP_N = getattr(settings, 'LEADERBOARD_TOP_N', 100)
+BATCH_SIZE = 2000
+SCOPES = (LeaderboardEntry.SCOPE_GLOBAL, LeaderboardEntry.SCOPE_COURSE, LeaderboardEntry.SCOPE_COUNTRY)
+
+
+def global_scores():
+    """(scope_key, user_id, points) rows, best first."""
+    from users.models import Profile  # Avoid circular import
+
+    return Profile.objects.filter(
+        user__isnull=False, user__is_active=True, points__gt=0,
+    ).annotate(key=Value('', output_field=CharField())).order_by('-points', 'user_id').values_list(
+        'key', 'user_id', 'points',
+    )
+
+
+def country_scores():
+    """(country, user_id, points) rows grouped by country, best first within each."""
+    from users.models import Profile  # Avoid circular import
+
+    return Profile.objects.filter(
+        user__isnull=False, user__is_active=True, points__gt=0, country__isnull=False,
+    ).annotate(key=Trim('country')).exclude(key='').order_by('key', '-points', 'user_id').values_list(
+        'key', 'user_id', 'points',
+    )
+
+
+def course_scores():
+    """(course_id, user_id, points earned in the course) rows grouped by course, best first within each."""
+    from courses.models import CourseProgress  # Avoid circular import
+    from home.views import POINTS_PER_COURSE, POINTS_PER_LESSON, POINTS_PER_QUIZ
+    from users.models import Profile
+
+    has_badge = Exists(Profile.earned_badges.through.objects.filter(
+        profile__user_id=OuterRef('user_id'), course_id=OuterRef('course_id'),
+    ))
+    return CourseProgress.objects.filter(user__is_active=True).annotate(
+        score=(
+            F('lessons_read') * POINTS_PER_LESSON
+            + F('quizzes_passed') * POINTS_PER_QUIZ
+            + Case(When(has_badge, then=Value(POINTS_PER_COURSE)), default=Value(0), output_field=IntegerField())
+        ),
+        key=Cast('course_id', CharField()),
+    ).filter(score__gt=0).order_by('course_id', '-score', 'user_id').values_list('key', 'user_id', 'score')
+
+
+SCORES = {
+    LeaderboardEntry.SCOPE_GLOBAL: global_scores,
+    LeaderboardEntry.SCOPE_COURSE: course_scores,
+    LeaderboardEntry.SCOPE_COUNTRY: country_scores,
+}
+
+
+def _write_board_rows(scope, rows, refreshed_at):
+    """Number ``rows`` (grouped by key, best first) into LeaderboardEntry; returns how many were written."""
+    batch = []
+    written = 0
+    key = None
+    position = rank = 0
+    last_points = None
+    for scope_key, user_id, points in rows.iterator(chunk_size=BATCH_SIZE):
+        if scope_key != key:
+            key, position, last_points = scope_key, 0, None
+        position += 1
+        if points != last_points:
+            rank, last_points = position, points
+        batch.append(LeaderboardEntry(
+            scope=scope, scope_key=scope_key, user_id=user_id, points=points,
+            position=position, rank=rank, refreshed_at=refreshed_at,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            LeaderboardEntry.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        LeaderboardEntry.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def refresh_leaderboard(scopes=SCOPES):
+    """Rebuild the snapshot for ``scopes``; returns {scope: rows written}."""
+    from users.points import fold_points  # Avoid circular import
+
+    if LeaderboardEntry.SCOPE_GLOBAL in scopes or LeaderboardEntry.SCOPE_COUNTRY in scopes:
+        # Those boards rank Profile.points, so bring it up to date with the ledger first
+        fold_points()
+    refreshed_at = timezone.now()
+    written = {}
+    with transaction.atomic():
+        for scope in scopes:
+            LeaderboardEntry.objects.filter(scope=scope).delete()
+            written[scope] = _write_board_rows(scope, SCORES[scope](), refreshed_at)
+    return written
+
+
+class Board:
+    """
+    One board as loaded by this process. Behaves as a read-only sequence of
+    LeaderboardEntry (with ``user__profile`` loaded), so it can be handed to
+    Django's Paginator.
+    """
+    __slots__ = ('scope', 'scope_key', 'top', 'points', 'refreshed_at')
+
+    def __init__(self, scope, scope_key, top, points, refreshed_at=None):
+        self.scope = scope
+        self.scope_key = scope_key
+        self.top = top
+        # Everyone's points, ascending
+        self.points = points
+        self.refreshed_at = refreshed_at
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("Boards only support slicing.")
+        start, stop, _ = index.indices(len(self))
+        if stop <= len(self.top):
+            return self.top[start:stop]
+        return list(self._entries().filter(position__gt=start, position__lte=stop).order_by('position'))
+
+    def _entries(self):
+        return LeaderboardEntry.objects.filter(
+            scope=self.scope, scope_key=self.scope_key,
+        ).select_related('user__profile')
+
+    def rank_for_points(self, points):
+        """Competition rank ``points`` would have on this board: one more than the number of learners above it."""
+        return len(self.points) - bisect_right(self.points, points) + 1
+
+    def entry_for(self, user_id):
+        """The user's snapshot row, or None if they aren't on this board."""
+        return LeaderboardEntry.objects.filter(
+            scope=self.scope, scope_key=self.scope_key, user_id=user_id,
+        ).only('points', 'rank', 'position').first()
+
+    @classmethod
+    def load(cls, scope, scope_key=''):
+        rows = LeaderboardEntry.objects.filter(scope=scope, scope_key=scope_key)
+        top = list(rows.select_related('user__profile').order_by('position')[:TOP_N])
+        # Position order is best first; reverse it rather than sort by points
+        points = array('q', rows.order_by('position').values_list('points', flat=True))
+        points.reverse()
+        return cls(scope, scope_key, top, points, top[0].refreshed_at if top else None)
+
+
+_lock = threading.Lock()
+_boards = {}
+_boards_version = None
+
+
+def _current_version():
+    """When the snapshot was last refreshed (None if it is empty); the same in every process."""
+    return LeaderboardEntry.objects.aggregate(version=Max('refreshed_at'))['version']
+
+
+def get_board(scope, scope_key=''):
+    """This process's copy of a board, reloaded if the snapshot was refreshed since it was loaded."""
+    global _boards_version
+    scope_key = str(scope_key or '')
+    version = _current_version()
+    if _boards_version == version:
+        board = _boards.get((scope, scope_key))
+        if board is not None:
+            return board
+    with _lock:
+        if _boards_version != version:
+            _boards.clear()
+            _boards_version = version
+        board = _boards.get((scope, scope_key))
+        if board is None:
+            board = _boards[(scope, scope_key)] = Board.load(scope, scope_key)
+    return board
+
+
+def clear_boards():
+    """Drop this process's boards (tests, or to free memory); the next lookup reloads them."""
+    global _boards_version
+    with _lock:
+        _boards.clear()
+        _boards_version = None
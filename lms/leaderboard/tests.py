@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from courses.models import Course, CourseProgress
+from users.models import User, Profile
+from . import ranking
+from .models import LeaderboardEntry
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.course = Course.objects.create(title="Maternal Health", description="", created_by=cls.instructor)
+        cls.learners = {}
+        for name, points, country in (
+            ("amina", 300, "Kenya"), ("baraka", 500, " Kenya "), ("chege", 300, "Uganda"),
+            ("dora", 100, ""), ("eli", 0, "Kenya"),
+        ):
+            user = User.objects.create_user(email=f"{name}@example.com", password="pw")
+            Profile.objects.create(user=user, first_name=name.title(), last_name="L", image=None,
+                                   points=points, country=country)
+            cls.learners[name] = user
+        inactive = User.objects.create_user(email="gone@example.com", password="pw", is_active=False)
+        Profile.objects.create(user=inactive, first_name="Gone", last_name="L", image=None, points=900)
+
+    def setUp(self):
+        cache.clear()
+        ranking.clear_boards()
+
+    def refresh(self):
+        return ranking.refresh_leaderboard()
+
+    def board_rows(self, scope, key=''):
+        return list(
+            LeaderboardEntry.objects.filter(scope=scope, scope_key=key).order_by('position')
+            .values_list('user__email', 'points', 'position', 'rank')
+        )
+
+    def test_global_board_ranks_ties_together(self):
+        self.refresh()
+        self.assertEqual(self.board_rows(LeaderboardEntry.SCOPE_GLOBAL), [
+            ("baraka@example.com", 500, 1, 1),
+            ("amina@example.com", 300, 2, 2),
+            ("chege@example.com", 300, 3, 2),
+            ("dora@example.com", 100, 4, 4),
+        ])
+
+    def test_country_boards(self):
+        self.refresh()
+        self.assertEqual(
+            [row[0] for row in self.board_rows(LeaderboardEntry.SCOPE_COUNTRY, "Kenya")],
+            ["baraka@example.com", "amina@example.com"],
+        )
+        self.assertEqual(len(self.board_rows(LeaderboardEntry.SCOPE_COUNTRY, "Uganda")), 1)
+        self.assertFalse(LeaderboardEntry.objects.filter(scope=LeaderboardEntry.SCOPE_COUNTRY, scope_key='').exists())
+
+    def test_course_board_scores_progress_and_badge(self):
+        from home.views import POINTS_PER_COURSE, POINTS_PER_LESSON, POINTS_PER_QUIZ
+
+        amina, dora = self.learners["amina"], self.learners["dora"]
+        CourseProgress.objects.create(user=amina, course=self.course, lessons_read=2, quizzes_passed=1)
+        CourseProgress.objects.create(user=dora, course=self.course, lessons_read=3, quizzes_passed=1)
+        dora.profile.earned_badges.add(self.course)
+        self.refresh()
+        self.assertEqual(self.board_rows(LeaderboardEntry.SCOPE_COURSE, str(self.course.pk)), [
+            ("dora@example.com", 3 * POINTS_PER_LESSON + POINTS_PER_QUIZ + POINTS_PER_COURSE, 1, 1),
+            ("amina@example.com", 2 * POINTS_PER_LESSON + POINTS_PER_QUIZ, 2, 2),
+        ])
+
+    def test_board_rank_lookup_and_paging(self):
+        self.refresh()
+        with mock.patch.object(ranking, 'TOP_N', 2):
+            board = ranking.get_board(LeaderboardEntry.SCOPE_GLOBAL)
+        self.assertEqual(len(board), 4)
+        # The loaded board is reused; only the snapshot version is read
+        with self.assertNumQueries(1):
+            self.assertIs(ranking.get_board(LeaderboardEntry.SCOPE_GLOBAL), board)
+        with self.assertNumQueries(0):
+            self.assertEqual(board.rank_for_points(500), 1)
+            self.assertEqual(board.rank_for_points(300), 2)
+            self.assertEqual(board.rank_for_points(200), 4)
+            self.assertEqual(board.rank_for_points(600), 1)
+            self.assertEqual([entry.user.profile.first_name for entry in board[0:2]], ["Baraka", "Amina"])
+        # Past the cached top: one indexed range query
+        with self.assertNumQueries(1):
+            self.assertEqual([entry.points for entry in board[2:4]], [300, 100])
+
+    def test_refresh_reloads_boards(self):
+        self.refresh()
+        board = ranking.get_board(LeaderboardEntry.SCOPE_GLOBAL)
+        Profile.objects.filter(user=self.learners["eli"]).update(points=1000)
+        self.assertIs(ranking.get_board(LeaderboardEntry.SCOPE_GLOBAL), board)
+        # Refreshed by another process: nothing but the database is shared
+        cache.clear()
+        self.refresh()
+        board = ranking.get_board(LeaderboardEntry.SCOPE_GLOBAL)
+        self.assertEqual(board[0:1][0].user_id, self.learners["eli"].pk)
+
+    def test_view_shows_page_and_own_rank(self):
+        self.refresh()
+        self.client.force_login(self.learners["chege"])
+        response = self.client.get(reverse('leaderboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['my_rank'], 2)
+        self.assertEqual(len(response.context['entries']), 4)
+
+        response = self.client.get(reverse('leaderboard'), {'scope': 'country'})
+        self.assertEqual(response.context['scope_key'], "Uganda")
+        self.assertEqual(response.context['my_rank'], 1)
+
+        response = self.client.get(reverse('leaderboard'), {'scope': 'course', 'course': self.course.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['my_rank'])
@@ -47,6 +47,10 @@ INSTALLED_APPS = [
     'testimonials',
     'quiz', 
     'instructor',
+    'search',
+    'perf',
+    'leaderboard',
+    'analytics',
     'crispy_forms',
     'crispy_bootstrap5',
     'crispy_tailwind',
@@ -77,12 +81,14 @@ INTERNAL_IPS = [
 NPM_BIN_PATH = "C:/Program Files/nodejs/npm.cmd"
 
 MIDDLEWARE = [
+    'perf.middleware.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.LearnerMiddleware',
     'users.middleware.ProfileCompletionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -216,6 +222,25 @@ else:
         'AUTO_RESOURCE_TYPE': True
     }
 
+# Let the front proxy send protected PDFs once the view has checked access.
+# '' streams from Django; 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd)
+# hand locally stored files to the proxy. For nginx, PROTECTED_MEDIA_INTERNAL_URL must
+# be an `internal;` location aliased to MEDIA_ROOT.
+PROTECTED_MEDIA_OFFLOAD = os.getenv('PROTECTED_MEDIA_OFFLOAD', '')
+PROTECTED_MEDIA_INTERNAL_URL = os.getenv('PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/')
+
+# On-disk LRU cache for Cloudinary raw files (lesson PDFs, certificates) proxied in
+# production. Set RAW_FILE_CACHE_MAX_BYTES=0 to disable. With X-Accel-Redirect offload,
+# RAW_FILE_CACHE_INTERNAL_URL must be an `internal;` location aliased to RAW_FILE_CACHE_DIR.
+RAW_FILE_CACHE_DIR = os.getenv('RAW_FILE_CACHE_DIR', os.path.join(BASE_DIR, '.raw_file_cache'))
+RAW_FILE_CACHE_MAX_BYTES = int(os.getenv('RAW_FILE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+RAW_FILE_CACHE_INTERNAL_URL = os.getenv('RAW_FILE_CACHE_INTERNAL_URL', '/protected-cache/')
+
+# Opt-in per-view query/latency instrumentation (perf app). Report at /admin/perf/
+# or with `manage.py perf_report`; requests slower than PERF_SLOW_REQUEST_MS are logged.
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', '') == '1'
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+
 CKEDITOR_UPLOAD_PATH = "uploads/"
 
 # Default primary key field type
@@ -21,8 +21,10 @@ from django.conf.urls.static import static
 from django.conf import settings
 from users import views as user_views
 from chatboat import views
+from perf import views as perf_views
  
 urlpatterns = [
+    path('admin/perf/', perf_views.perf_report, name='perf_report'),
     path('admin/', admin.site.urls),
     path('', include('home.urls')),
     path("api/", views.chatAPI, name="chatAPI"),
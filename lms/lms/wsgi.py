@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms.settings')
 
 application = get_wsgi_application()
+
+# Build the search-as-you-type index before the first request needs it
+from search.suggest import warm_suggest_index  # noqa: E402
+
+warm_suggest_index()
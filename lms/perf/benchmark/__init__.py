@@ -0,0 +1,11 @@
+"""
+Learner-session benchmark (``manage.py benchmark_learner_session``).
+
+dataset.build_dataset() creates a synthetic catalogue and learner accounts;
+runner.run_benchmark() walks learners through a whole course with the
+Django test client and reports p50/p95/p99 latency, queries and allocations
+per step. Reports are plain dicts written as JSON, so runs on different
+commits can be compared with runner.compare_reports().
+"""
+from .dataset import build_dataset
+from .runner import STEPS, compare_reports, run_benchmark
@@ -0,0 +1,82 @@
+"""
+Synthetic catalogue for the learner-session benchmark.
+
+Courses are built with the shared fixture builders (home.fixtures), whose
+rows are bulk-inserted (model signals do not run), which is fine for a fresh
+database: the course outline and search caches are built lazily on first use.
+"""
+from django.db import transaction
+
+ANSWERS_PER_QUESTION = 4
+
+
+class ModulePlan:
+    """What a session needs to walk one module: its lessons and how to pass its quiz."""
+    __slots__ = ('lesson_ids', 'quiz_id', 'answers')
+
+    def __init__(self, lesson_ids, quiz_id, answers):
+        self.lesson_ids = lesson_ids
+        self.quiz_id = quiz_id
+        # POST data for submit_quiz with every answer correct
+        self.answers = answers
+
+
+class CoursePlan:
+    __slots__ = ('course_id', 'modules')
+
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        self.modules = modules
+
+
+class Dataset:
+    __slots__ = ('courses', 'learner_ids')
+
+    def __init__(self, courses, learner_ids):
+        self.courses = courses
+        self.learner_ids = learner_ids
+
+    def course_for(self, session_number):
+        return self.courses[session_number % len(self.courses)]
+
+
+@transaction.atomic
+def build_dataset(courses=5, modules=5, lessons=5, questions=5, learners=10, population=50):
+    """
+    ``courses`` courses of ``modules`` modules with ``lessons`` lessons and a
+    ``questions``-question quiz each, ``learners`` fresh learner accounts for
+    the timed sessions, and ``population`` background learners enrolled in
+    every course with all lessons read, so per-course tables are not empty.
+    """
+    from courses.models import Lesson  # Avoid circular import
+    from home.fixtures import build_course, make_users
+    from quiz.models import Quiz, Answer
+
+    domain = 'benchmark.example.com'
+    instructor = make_users('instructor', 1, domain=domain, role='instructor')[0]
+    background = make_users('population', population, domain=domain)
+    content = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40 + "</p>"
+
+    plans = []
+    for c in range(courses):
+        course = build_course(
+            instructor, modules=modules, lessons_per_module=lessons, students=background,
+            questions_per_quiz=questions, answers_per_question=ANSWERS_PER_QUESTION,
+            title=f"Benchmark Course {c}", description=content, content=content,
+        )
+
+        lessons_by_module = {}
+        for module_id, pk in Lesson.objects.filter(module__course=course).order_by('pk').values_list('module_id', 'pk'):
+            lessons_by_module.setdefault(module_id, []).append(pk)
+        answers_by_quiz = {}
+        for quiz_id, question_id, pk in Answer.objects.filter(
+            question__quiz__module__course=course, is_correct=True,
+        ).order_by('question_id').values_list('question__quiz_id', 'question_id', 'pk'):
+            answers_by_quiz.setdefault(quiz_id, {})[f'question_{question_id}'] = pk
+        plans.append(CoursePlan(course.pk, [
+            ModulePlan(lessons_by_module.get(module_id, []), quiz_id, answers_by_quiz.get(quiz_id, {}))
+            for quiz_id, module_id in Quiz.objects.filter(module__course=course).order_by('pk').values_list('pk', 'module_id')
+        ]))
+
+    learner_ids = [user.pk for user in make_users('learner', learners, domain=domain)]
+    return Dataset(plans, learner_ids)
@@ -0,0 +1,264 @@
+"""
+Runs learner sessions through the Django test client and reports latency,
+query count and memory allocations per step.
+
+A session is what a new learner does to finish a course: home -> courses ->
+course_detail -> enroll, then for every module lesson_detail + mark_read for
+each lesson, quiz_detail and submit_quiz, and finally the certificate
+download (course completion and the certificate render are run off the
+clock, as the background workers would).
+
+SQLite takes one writer at a time and fails lock upgrades inside
+transactions with "database is locked" instead of waiting, so with SQLite
+and more than one thread each request holds a process-wide lock; latency
+then includes the time spent queued behind other sessions. Use PostgreSQL to
+measure real concurrency.
+"""
+import os
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from perf.middleware import RequestRecorder
+from perf.stats import percentile
+
+STEPS = (
+    'home', 'courses', 'course_detail', 'enroll', 'lesson_detail', 'mark_read',
+    'quiz_detail', 'submit_quiz', 'certificate_download',
+)
+
+
+class Sample:
+    __slots__ = ('step', 'ms', 'queries', 'status', 'error', 'alloc_peak_kib', 'alloc_net_kib')
+
+    def __init__(self, step, ms=0.0, queries=0, status=None, error=None):
+        self.step = step
+        self.ms = ms
+        self.queries = queries
+        self.status = status
+        self.error = error
+        self.alloc_peak_kib = None
+        self.alloc_net_kib = None
+
+
+class Session:
+    """One learner's requests; ``trace_allocations`` needs tracemalloc to be running."""
+
+    def __init__(self, client, trace_allocations=False, lock=None):
+        self.client = client
+        self.trace_allocations = trace_allocations
+        self.lock = lock or nullcontext()
+        self.samples = []
+
+    def request(self, step, method, url, data=None):
+        recorder = RequestRecorder()
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        with self.lock, connection.execute_wrapper(recorder):
+            response = getattr(self.client, method)(url, data)
+        sample = Sample(step, (time.perf_counter() - start) * 1000, recorder.queries, response.status_code)
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            sample.alloc_peak_kib = (peak - base) / 1024
+            sample.alloc_net_kib = (current - base) / 1024
+        if response.status_code >= 400:
+            sample.error = f"HTTP {response.status_code}"
+        self.samples.append(sample)
+        return response
+
+    def fail(self, step, error):
+        self.samples.append(Sample(step, error=error))
+
+
+def run_session(dataset, session_number, learner_id, trace_allocations=False, lock=None):
+    """Walk one learner through a whole course; returns the session's samples."""
+    from courses.certificate_queue import run_job  # Avoid circular import
+    from courses.completion import run_due_checks
+    from courses.models import Certificate, CertificateJob
+    from users.models import User
+
+    client = Client(raise_request_exception=False)
+    session = Session(client, trace_allocations, lock)
+    with session.lock:
+        client.force_login(User.objects.get(pk=learner_id))
+    plan = dataset.course_for(session_number)
+    course_url = reverse('course_detail', args=[plan.course_id])
+
+    try:
+        session.request('home', 'get', reverse('home'))
+        session.request('courses', 'get', reverse('courses'))
+        session.request('course_detail', 'get', course_url)
+        session.request('enroll', 'post', course_url, {'action': 'enroll'})
+        for module in plan.modules:
+            for lesson_id in module.lesson_ids:
+                lesson_url = reverse('lesson_detail', args=[lesson_id])
+                session.request('lesson_detail', 'get', lesson_url)
+                session.request('mark_read', 'post', lesson_url, {'mark_read': '1'})
+            session.request('quiz_detail', 'get', reverse('quiz_detail', args=[module.quiz_id]))
+            session.request('submit_quiz', 'post', reverse('submit_quiz', args=[module.quiz_id]), module.answers)
+
+        with session.lock:
+            # Everything queued so far, without waiting for the coalescing delay
+            run_due_checks(limit=None, due_by=timezone.now() + timedelta(days=1))
+        certificate = Certificate.objects.filter(user_id=learner_id, course_id=plan.course_id).first()
+        if certificate is None:
+            session.fail('certificate_download', "no certificate was issued")
+        else:
+            pending = CertificateJob.objects.filter(
+                certificate=certificate, status=CertificateJob.STATUS_PENDING,
+            ).values_list('pk', flat=True)
+            with session.lock:
+                for job_id in list(pending):
+                    run_job(job_id)
+            session.request('certificate_download', 'get', reverse('download_certificate', args=[certificate.pk]))
+    except Exception as e:
+        session.fail('session', f"{type(e).__name__}: {e}")
+    return session.samples
+
+
+def _run_session_in_thread(dataset, session_number, learner_id, lock):
+    try:
+        return run_session(dataset, session_number, learner_id, lock=lock)
+    finally:
+        connections.close_all()
+
+
+def summarize(samples):
+    """Per-step statistics, in session order."""
+    by_step = {}
+    for sample in samples:
+        by_step.setdefault(sample.step, []).append(sample)
+
+    steps = []
+    for step in list(STEPS) + sorted(set(by_step) - set(STEPS)):
+        step_samples = by_step.get(step)
+        if not step_samples:
+            continue
+        timed = [s for s in step_samples if s.status is not None]
+        latencies = [s.ms for s in timed]
+        queries = [s.queries for s in timed]
+        steps.append({
+            'step': step,
+            'count': len(step_samples),
+            'errors': sum(1 for s in step_samples if s.error),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0,
+            'queries_p50': percentile(queries, 50),
+            'queries_max': max(queries) if queries else 0,
+            'sample_errors': sorted({s.error for s in step_samples if s.error})[:5],
+        })
+    return steps
+
+
+def add_allocations(steps, samples):
+    """Median allocation figures from a traced session, merged into ``steps``."""
+    by_step = {}
+    for sample in samples:
+        if sample.alloc_peak_kib is not None:
+            by_step.setdefault(sample.step, []).append(sample)
+    for row in steps:
+        traced = by_step.get(row['step'], [])
+        row['alloc_peak_kib'] = round(percentile([s.alloc_peak_kib for s in traced], 50), 1) if traced else None
+        row['alloc_net_kib'] = round(percentile([s.alloc_net_kib for s in traced], 50), 1) if traced else None
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmark(dataset, sessions=10, concurrency=1, allocations=True, warmup=True):
+    """
+    Run ``sessions`` learner sessions, ``concurrency`` at a time, and return
+    the report dict. The dataset needs ``sessions`` learners, plus one for the
+    untimed warm-up session and one for the allocation-tracing session.
+
+    Latency comes from the timed sessions only; allocations from a separate
+    single-threaded session run under tracemalloc, which would otherwise slow
+    the timed requests down and mix up allocations between threads.
+    """
+    learners = list(dataset.learner_ids)
+    needed = sessions + int(warmup) + int(allocations)
+    if len(learners) < needed:
+        raise ValueError(f"The dataset has {len(learners)} learners; {needed} are needed.")
+
+    if warmup:
+        # Compile templates, fill process-level caches
+        run_session(dataset, 0, learners.pop())
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        results = [run_session(dataset, n, learners[n]) for n in range(sessions)]
+    else:
+        lock = threading.Lock() if connection.vendor == 'sqlite' else None
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(
+                lambda n: _run_session_in_thread(dataset, n, learners[n], lock), range(sessions)
+            ))
+    wall_seconds = time.perf_counter() - started
+    samples = [sample for session_samples in results for sample in session_samples]
+
+    steps = summarize(samples)
+    if allocations:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            traced = run_session(dataset, sessions, learners[sessions], trace_allocations=True)
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        add_allocations(steps, traced)
+
+    requests = sum(1 for sample in samples if sample.status is not None)
+    return {
+        'environment': environment(),
+        'sessions': sessions,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for sample in samples if sample.error),
+        'wall_seconds': round(wall_seconds, 3),
+        'requests_per_second': round(requests / wall_seconds, 1) if wall_seconds else 0,
+        'steps': steps,
+    }
+
+
+def compare_reports(baseline, current):
+    """Rows of (step, baseline p95, current p95, change %, baseline queries, current queries)."""
+    before = {row['step']: row for row in baseline.get('steps', [])}
+    rows = []
+    for row in current.get('steps', []):
+        old = before.get(row['step'])
+        if old is None:
+            continue
+        change = (row['p95_ms'] - old['p95_ms']) * 100.0 / old['p95_ms'] if old['p95_ms'] else 0.0
+        rows.append((row['step'], old['p95_ms'], row['p95_ms'], change, old['queries_p50'], row['queries_p50']))
+    return rows
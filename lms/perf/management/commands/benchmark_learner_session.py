@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from perf.benchmark import build_dataset, compare_reports, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a full learner session (browse, enroll, read every lesson, pass every quiz, "
+        "download the certificate) in a throwaway test database and report p50/p95/p99 latency, "
+        "queries and allocations per step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=5)
+        parser.add_argument('--modules', type=int, default=5, help="Modules per course.")
+        parser.add_argument('--lessons', type=int, default=5, help="Lessons per module.")
+        parser.add_argument('--questions', type=int, default=5, help="Questions per module quiz.")
+        parser.add_argument('--population', type=int, default=50,
+                            help="Background learners enrolled in every course with all lessons read.")
+        parser.add_argument('--sessions', type=int, default=20, help="Timed learner sessions.")
+        parser.add_argument('--concurrency', type=int, default=1, help="Sessions run in parallel (threads).")
+        parser.add_argument('--no-allocations', action='store_true', help="Skip the tracemalloc session.")
+        parser.add_argument('--label', default='', help="Free-form name stored in the report.")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', help="Earlier JSON report to compare p95 latency and queries against.")
+
+    def handle(self, *args, **options):
+        if options['sessions'] < 1 or options['courses'] < 1 or options['modules'] < 1 or options['lessons'] < 1:
+            raise CommandError("--sessions, --courses, --modules and --lessons must be at least 1.")
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        config = {key: options[key] for key in ('courses', 'modules', 'lessons', 'questions', 'population')}
+        allocations = not options['no_allocations']
+        report = self.run(config, options['sessions'], options['concurrency'], allocations)
+        report['label'] = options['label']
+        report['dataset'] = config
+
+        self.print_report(report)
+        if baseline is not None:
+            self.print_comparison(baseline, report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def run(self, config, sessions, concurrency, allocations):
+        """Build the dataset and run the sessions in a test database that is destroyed afterwards."""
+        tmp_dir = tempfile.mkdtemp(prefix='lms-benchmark-')
+        if connection.vendor == 'sqlite':
+            # The default in-memory test database can't take writes from several threads
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp_dir, 'benchmark.sqlite3')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Certificates are written under MEDIA_ROOT
+            with override_settings(DEBUG=False, MEDIA_ROOT=os.path.join(tmp_dir, 'media')):
+                self.stdout.write(f"Building dataset {config} ...")
+                dataset = build_dataset(learners=sessions + 2, **config)
+                self.stdout.write(f"Running {sessions} sessions, {concurrency} at a time ...")
+                return run_benchmark(dataset, sessions, concurrency, allocations=allocations)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def print_report(self, report):
+        env = report['environment']
+        self.stdout.write(
+            f"\n{report['requests']} requests in {report['wall_seconds']:.1f}s "
+            f"({report['requests_per_second']} req/s), {report['errors']} errors "
+            f"[{env['database']}, commit {env['commit'] or 'unknown'}]"
+        )
+        header = f"{'step':<22} {'count':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q p50':>6} {'q max':>6} {'alloc KiB':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report['steps']:
+            alloc = row.get('alloc_peak_kib')
+            self.stdout.write(
+                f"{row['step']:<22} {row['count']:>6} {row['errors']:>4} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['queries_p50']:>6} {row['queries_max']:>6} "
+                f"{(f'{alloc:.0f}' if alloc is not None else '-'):>10}"
+            )
+            for error in row['sample_errors']:
+                self.stdout.write(self.style.ERROR(f"    {error}"))
+
+    def print_comparison(self, baseline, report):
+        commit = baseline.get('environment', {}).get('commit') or 'baseline'
+        self.stdout.write(f"\nCompared with {commit}:")
+        for step, old_p95, new_p95, change, old_queries, new_queries in compare_reports(baseline, report):
+            line = f"{step:<22} p95 {old_p95:>8.1f} -> {new_p95:>8.1f} ms ({change:+.0f}%)  queries {old_queries} -> {new_queries}"
+            style = self.style.ERROR if change > 10 or new_queries > old_queries else self.style.SUCCESS
+            self.stdout.write(style(line))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from perf.stats import build_report, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-view latency and query statistics collected by PerfMiddleware "
+        "(merged from all workers through the shared cache)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=['p95', 'p99', 'count', 'queries', 'db'], default='p95')
+        parser.add_argument('--limit', type=int, default=25, help="Number of views to show.")
+        parser.add_argument('--reset', action='store_true', help="Clear the collected statistics.")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Performance statistics reset."))
+            return
+
+        rows = build_report(sort=options['sort'])[:options['limit']]
+        if not rows:
+            self.stdout.write("No requests recorded. Is PERF_INSTRUMENTATION enabled and the cache shared between processes?")
+            return
+
+        header = f"{'view':<40} {'reqs':>6} {'slow':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'q p50':>6} {'q p95':>6} {'db p95':>8} {'tpl p95':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['view'][:40]:<40} {row['count']:>6} {row['slow']:>5} "
+                f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f} "
+                f"{row['queries_p50']:>6} {row['queries_p95']:>6} {row['db_p95']:>8.1f} {row['template_p95']:>8.1f}"
+            )
+            for sql, count in row['duplicates']:
+                self.stdout.write(f"    {count}x {sql[:150]}")
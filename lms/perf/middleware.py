@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import base as template_base
+
+from .stats import fingerprint, store
+
+logger = logging.getLogger('perf')
+
+_local = threading.local()
+_template_timer_lock = threading.Lock()
+_original_template_render = None
+
+
+class RequestRecorder:
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'template_depth', 'fingerprints')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def _timed_render(self, context):
+    recorder = getattr(_local, 'recorder', None)
+    # Only time the outermost template; includes and {% extends %} render inside it
+    if recorder is None or recorder.template_depth:
+        return _original_template_render(self, context)
+    recorder.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        recorder.template_seconds += time.perf_counter() - start
+        recorder.template_depth -= 1
+
+
+def install_template_timer():
+    """Wrap Template.render once so template time can be attributed to the current request."""
+    global _original_template_render
+    with _template_timer_lock:
+        if _original_template_render is None:
+            _original_template_render = template_base.Template.render
+            template_base.Template.render = _timed_render
+
+
+class PerfMiddleware:
+    """
+    Opt-in (settings.PERF_INSTRUMENTATION) per-request instrumentation: SQL
+    query count and time, duplicate queries, template render time and wall
+    time, recorded per view name in perf.stats. Requests slower than
+    PERF_SLOW_REQUEST_MS are logged with their most repeated SQL.
+
+    Query time spent while rendering templates (lazy querysets) counts towards
+    both DB and template time.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        install_template_timer()
+
+    def __call__(self, request):
+        recorder = RequestRecorder()
+        _local.recorder = recorder
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _local.recorder = None
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or '<unresolved>'
+        duplicates = recorder.duplicates()
+        slow = wall_ms >= self.slow_request_ms
+        store.record(view_name, {
+            'wall_ms': wall_ms,
+            'queries': recorder.queries,
+            'db_ms': recorder.db_seconds * 1000,
+            'template_ms': recorder.template_seconds * 1000,
+        }, duplicates, slow=slow)
+
+        if slow:
+            top = sorted(duplicates.items(), key=lambda item: item[1], reverse=True)[:3]
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries (%.0f ms DB, %.0f ms templates)%s",
+                request.method, request.path, view_name, wall_ms, recorder.queries,
+                recorder.db_seconds * 1000, recorder.template_seconds * 1000,
+                ''.join(f"\n  {count}x {sql}" for sql, count in top),
+            )
+        return response
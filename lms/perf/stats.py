@@ -0,0 +1,189 @@
+"""
+Per-view request statistics collected by perf.middleware.PerfMiddleware.
+
+Each process keeps the most recent samples for every view in memory and
+periodically publishes a snapshot to the shared cache, so the staff report
+page and ``manage.py perf_report`` can merge the numbers from all workers
+(this needs a cache shared between processes, e.g. Redis or the database
+cache; with the default local-memory cache only the current process is seen).
+"""
+import math
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+SAMPLE_SIZE = getattr(settings, 'PERF_SAMPLE_SIZE', 500)
+FLUSH_EVERY = getattr(settings, 'PERF_FLUSH_EVERY', 50)
+# Duplicate-query fingerprints kept per view
+TOP_DUPLICATES = 20
+
+WORKERS_KEY = 'perf:workers'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+METRICS = ('wall_ms', 'queries', 'db_ms', 'template_ms')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-lists collapsed, so N+1 queries share one fingerprint."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class ViewStats:
+    """Rolling samples for one view name."""
+    __slots__ = ('count', 'slow', 'samples', 'duplicates')
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.count = 0
+        self.slow = 0
+        self.samples = {metric: deque(maxlen=sample_size) for metric in METRICS}
+        self.duplicates = Counter()
+
+    def add(self, sample, duplicates, slow):
+        self.count += 1
+        self.slow += int(slow)
+        for metric in METRICS:
+            self.samples[metric].append(sample[metric])
+        self.duplicates.update(duplicates)
+        if len(self.duplicates) > TOP_DUPLICATES * 5:
+            self.duplicates = Counter(dict(self.duplicates.most_common(TOP_DUPLICATES)))
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'slow': self.slow,
+            'samples': {metric: list(values) for metric, values in self.samples.items()},
+            'duplicates': dict(self.duplicates.most_common(TOP_DUPLICATES)),
+        }
+
+
+class StatsStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.unflushed = 0
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+
+    def record(self, view_name, sample, duplicates, slow=False):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats()
+            stats.add(sample, duplicates, slow)
+            self.unflushed += 1
+            if self.unflushed < FLUSH_EVERY:
+                return
+            self.unflushed = 0
+            snapshot = self._snapshot()
+        self._publish(snapshot)
+
+    def _snapshot(self):
+        return {'updated_at': time.time(), 'views': {name: s.snapshot() for name, s in self.views.items()}}
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def flush(self):
+        self._publish(self.snapshot())
+
+    def _publish(self, snapshot):
+        cache.set(f'perf:snapshot:{self.worker_id}', snapshot, timeout=SNAPSHOT_TIMEOUT)
+        workers = cache.get(WORKERS_KEY) or []
+        if self.worker_id not in workers:
+            cache.set(WORKERS_KEY, workers + [self.worker_id], timeout=SNAPSHOT_TIMEOUT)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.unflushed = 0
+
+
+store = StatsStore()
+
+
+def worker_snapshots():
+    """Snapshots published by all workers (including this process, freshly)."""
+    snapshots = {}
+    for worker_id in cache.get(WORKERS_KEY) or []:
+        snapshot = cache.get(f'perf:snapshot:{worker_id}')
+        if snapshot is not None:
+            snapshots[worker_id] = snapshot
+    if store.views:
+        snapshots[store.worker_id] = store.snapshot()
+    return snapshots
+
+
+def build_report(snapshots=None, sort='p95'):
+    """
+    One row per view, merged across workers:
+    count, slow, p50/p95/p99 wall time, p50/p95 queries, p95 DB and template
+    time, and the most repeated query fingerprints.
+    """
+    if snapshots is None:
+        snapshots = worker_snapshots()
+
+    merged = {}
+    for snapshot in snapshots.values():
+        for view_name, data in snapshot['views'].items():
+            row = merged.setdefault(view_name, {
+                'count': 0, 'slow': 0, 'samples': {metric: [] for metric in METRICS}, 'duplicates': Counter(),
+            })
+            row['count'] += data['count']
+            row['slow'] += data['slow']
+            for metric in METRICS:
+                row['samples'][metric].extend(data['samples'][metric])
+            row['duplicates'].update(data['duplicates'])
+
+    rows = []
+    for view_name, row in merged.items():
+        samples = row['samples']
+        rows.append({
+            'view': view_name,
+            'count': row['count'],
+            'slow': row['slow'],
+            'p50': percentile(samples['wall_ms'], 50),
+            'p95': percentile(samples['wall_ms'], 95),
+            'p99': percentile(samples['wall_ms'], 99),
+            'queries_p50': percentile(samples['queries'], 50),
+            'queries_p95': percentile(samples['queries'], 95),
+            'db_p95': percentile(samples['db_ms'], 95),
+            'template_p95': percentile(samples['template_ms'], 95),
+            'duplicates': row['duplicates'].most_common(3),
+        })
+    sort_key = {
+        'p95': lambda r: r['p95'],
+        'p99': lambda r: r['p99'],
+        'count': lambda r: r['count'],
+        'queries': lambda r: r['queries_p95'],
+        'db': lambda r: r['db_p95'],
+    }.get(sort, lambda r: r['p95'])
+    rows.sort(key=sort_key, reverse=True)
+    return rows
+
+
+def reset_stats():
+    store.reset()
+    workers = cache.get(WORKERS_KEY) or []
+    cache.delete_many([f'perf:snapshot:{worker_id}' for worker_id in workers] + [WORKERS_KEY])
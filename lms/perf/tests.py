@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from courses.models import Course
+from users.models import User, Profile
+from .benchmark import STEPS, build_dataset, compare_reports, run_benchmark
+from .middleware import PerfMiddleware
+from .stats import build_report, fingerprint, percentile, reset_stats, store
+
+
+@override_settings(PERF_INSTRUMENTATION=True, PERF_SLOW_REQUEST_MS=100000)
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.staff = User.objects.create_user(email="staff@example.com", password="pw", is_staff=True)
+        Profile.objects.create(user=cls.staff, first_name="Sta", last_name="Ff", image=None)
+        for i in range(3):
+            Course.objects.create(title=f"Course {i}", created_by=cls.instructor)
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.addCleanup(reset_stats)
+
+    def test_fingerprint_and_percentile(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id = 5 AND name = \'x\' AND pk IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id = 7 AND name = \'y\' AND pk IN (%s)'),
+        )
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([], 50), 0)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('courses'))
+        self.client.get(reverse('search'), {'q': 'course'})
+
+        rows = {row['view']: row for row in build_report(sort='count')}
+        self.assertEqual(rows['courses']['count'], 3)
+        self.assertEqual(rows['search']['count'], 1)
+        self.assertGreater(rows['courses']['queries_p50'], 0)
+        self.assertGreater(rows['courses']['p95'], 0)
+        self.assertGreater(rows['courses']['template_p95'], 0)
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        def n_plus_one(request):
+            for course in Course.objects.all():
+                list(Course.objects.filter(pk=course.pk))
+            return HttpResponse()
+
+        request = self.client.get(reverse('courses')).wsgi_request
+        store.reset()
+        PerfMiddleware(n_plus_one)(request)
+        duplicates = dict(build_report()[0]['duplicates'])
+        self.assertIn(3, duplicates.values())
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('perf', level='WARNING') as logs:
+            self.client.get(reverse('courses'))
+        self.assertIn('Slow request GET /courses/', logs.output[0])
+
+    def test_report_page_and_command(self):
+        self.client.get(reverse('courses'))
+        self.assertEqual(self.client.get(reverse('perf_report')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('perf_report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'courses')
+
+        store.flush()
+        out = StringIO()
+        call_command('perf_report', stdout=out)
+        self.assertIn('courses', out.getvalue())
+
+
+class PerfMiddlewareDisabledTests(TestCase):
+    def test_off_by_default(self):
+        reset_stats()
+        self.client.get(reverse('courses'))
+        self.assertEqual(build_report(), [])
+
+
+class LearnerSessionBenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_session_walks_every_step(self):
+        dataset = build_dataset(courses=1, modules=2, lessons=2, questions=2, learners=3, population=2)
+        report = run_benchmark(dataset, sessions=1, concurrency=1)
+
+        self.assertEqual(report['errors'], 0)
+        steps = {row['step']: row for row in report['steps']}
+        self.assertEqual(list(steps), list(STEPS))
+        self.assertEqual(steps['lesson_detail']['count'], 4)
+        self.assertEqual(steps['submit_quiz']['count'], 2)
+        self.assertEqual(steps['certificate_download']['count'], 1)
+        self.assertGreater(steps['mark_read']['queries_p50'], 0)
+        self.assertGreaterEqual(steps['home']['p99_ms'], steps['home']['p50_ms'])
+        self.assertIsNotNone(steps['home']['alloc_peak_kib'])
+
+    def test_compare_reports(self):
+        baseline = {'steps': [{'step': 'home', 'p95_ms': 10.0, 'queries_p50': 9}]}
+        current = {'steps': [{'step': 'home', 'p95_ms': 15.0, 'queries_p50': 7}]}
+        self.assertEqual(compare_reports(baseline, current), [('home', 10.0, 15.0, 50.0, 9, 7)])
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect, render
+
+from .stats import build_report, reset_stats, worker_snapshots
+
+
+@staff_member_required
+def perf_report(request):
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        reset_stats()
+        return redirect('perf_report')
+
+    sort = request.GET.get('sort', 'p95')
+    snapshots = worker_snapshots()
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Performance report',
+        'rows': build_report(snapshots, sort=sort),
+        'workers': len(snapshots),
+        'sort': sort,
+        'enabled': getattr(settings, 'PERF_INSTRUMENTATION', False),
+        'slow_ms': getattr(settings, 'PERF_SLOW_REQUEST_MS', 500),
+    }
+    return render(request, 'perf/report.html', context)
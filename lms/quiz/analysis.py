@@ -0,0 +1,147 @@
+"""
+Item analysis of quiz questions.
+
+analyse_items() (``manage.py quiz_item_analysis``, run periodically) reads
+only the attempts added since the last run: each quiz keeps a watermark in
+QuizAnalysis.last_attempt_id. New attempts are streamed with their packed
+responses (QuizResponse) CHUNK_SIZE at a time. Each chunk is graded as one
+matrix against the quiz's answer key with NumPy, and the per-question sums
+are added to QuestionAnalysis. The watermark moves in the same
+transaction, so a run that stops part way is picked up where it left off.
+
+The sums give each question's difficulty (share answered correctly), its
+discrimination (point-biserial correlation with the rest of the quiz) and
+how often each option was chosen, which shows the distractors that draw
+learners away from the right answer. Attempts are graded with the answer key
+as it is when they are analysed; run with ``--rebuild`` after changing
+which answers are correct. Attempts from before responses were stored have
+no selections and are skipped.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Coalesce
+
+from .grading import get_answer_key
+from .models import Quiz, QuizAnalysis, QuizAttempt, QuestionAnalysis
+
+CHUNK_SIZE = getattr(settings, 'QUIZ_ANALYSIS_CHUNK_SIZE', 2000)
+SUM_FIELDS = ('responses', 'correct', 'unanswered', 'total_sum', 'total_sq_sum', 'correct_total_sum', 'option_counts')
+
+
+def _tally(key, blobs):
+    """
+    Grade packed responses ``blobs`` against ``key``. Returns per-question
+    arrays (correct, unanswered, correct_total_sum), the sum and sum of
+    squares of the attempts' totals, and per-option selection counts.
+    """
+    questions, options = len(key.question_ids), len(key.option_ids)
+    attempts = len(blobs)
+    chosen = np.full((attempts, questions), -1, dtype=np.int64)
+
+    if options:
+        option_ids = np.asarray(key.option_ids, dtype=np.int64)
+        order = np.argsort(option_ids)
+        sorted_ids = option_ids[order]
+        question_of = np.repeat(np.arange(questions), np.diff(np.asarray(key.option_offsets, dtype=np.int64)))
+
+        selected = [np.frombuffer(bytes(blob), dtype='<i8') for blob in blobs]
+        rows = np.repeat(np.arange(attempts), [len(ids) for ids in selected])
+        selected = np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+        # Answers that are no longer options of the quiz are ignored
+        pos = np.minimum(np.searchsorted(sorted_ids, selected), options - 1)
+        known = sorted_ids[pos] == selected
+        option = order[pos[known]]
+        chosen[rows[known], question_of[option]] = option
+
+    answered = chosen >= 0
+    if options:
+        correct_flags = np.frombuffer(key.correct, dtype=np.uint8).astype(bool)
+        right = answered & correct_flags[np.where(answered, chosen, 0)]
+    else:
+        right = np.zeros_like(answered)
+    totals = right.sum(axis=1).astype(np.float64)
+    return {
+        'correct': right.sum(axis=0),
+        'unanswered': (~answered).sum(axis=0),
+        'correct_total_sum': totals @ right,
+        'total_sum': float(totals.sum()),
+        'total_sq_sum': float((totals ** 2).sum()),
+        'option_counts': np.bincount(chosen[answered], minlength=options),
+    }
+
+
+def _store(quiz_id, key, tally, attempts, first_attempt_id, last_attempt_id):
+    """Add ``tally`` to the quiz's QuestionAnalysis rows and move its watermark; False if another run got there first."""
+    with transaction.atomic():
+        QuizAnalysis.objects.get_or_create(quiz_id=quiz_id)
+        analysis = QuizAnalysis.objects.select_for_update().get(quiz_id=quiz_id)
+        if analysis.last_attempt_id >= first_attempt_id:
+            return False
+
+        existing = {row.question_id: row for row in QuestionAnalysis.objects.filter(quiz_id=quiz_id)}
+        created, updated = [], []
+        for idx, question_id in enumerate(key.question_ids):
+            row = existing.get(question_id)
+            if row is None:
+                row = QuestionAnalysis(question_id=question_id, quiz_id=quiz_id)
+                created.append(row)
+            else:
+                updated.append(row)
+            row.responses += attempts
+            row.correct += int(tally['correct'][idx])
+            row.unanswered += int(tally['unanswered'][idx])
+            row.total_sum += tally['total_sum']
+            row.total_sq_sum += tally['total_sq_sum']
+            row.correct_total_sum += float(tally['correct_total_sum'][idx])
+            counts = dict(row.option_counts)
+            for option in range(key.option_offsets[idx], key.option_offsets[idx + 1]):
+                if tally['option_counts'][option]:
+                    answer_id = str(key.option_ids[option])
+                    counts[answer_id] = counts.get(answer_id, 0) + int(tally['option_counts'][option])
+            row.option_counts = counts
+        QuestionAnalysis.objects.bulk_create(created)
+        QuestionAnalysis.objects.bulk_update(updated, SUM_FIELDS)
+        QuizAnalysis.objects.filter(pk=analysis.pk).update(
+            last_attempt_id=last_attempt_id, attempts=F('attempts') + attempts,
+        )
+    return True
+
+
+def analyse_quiz(quiz_id, chunk_size=CHUNK_SIZE):
+    """Analyse the quiz's attempts since its watermark; returns how many were added."""
+    key = get_answer_key(quiz_id)
+    after = QuizAnalysis.objects.filter(quiz_id=quiz_id).values_list('last_attempt_id', flat=True).first() or 0
+    analysed = 0
+    while True:
+        # Keyset pagination on the attempt id, so each chunk is one index range scan
+        rows = list(
+            QuizAttempt.objects.filter(quiz_id=quiz_id, pk__gt=after, response__isnull=False)
+            .order_by('pk').values_list('pk', 'response__selected')[:chunk_size]
+        )
+        if not rows:
+            return analysed
+        if not _store(quiz_id, key, _tally(key, [blob for _, blob in rows]), len(rows), rows[0][0], rows[-1][0]):
+            return analysed
+        analysed += len(rows)
+        after = rows[-1][0]
+
+
+def analyse_items(quiz_ids=None, chunk_size=CHUNK_SIZE, rebuild=False):
+    """
+    Bring the item analysis of every quiz with new attempts (or of
+    ``quiz_ids``) up to date; ``rebuild`` starts them over. Returns
+    {quiz_id: attempts analysed}.
+    """
+    quizzes = Quiz.objects.all()
+    if quiz_ids:
+        quizzes = quizzes.filter(pk__in=quiz_ids)
+    if rebuild:
+        with transaction.atomic():
+            QuestionAnalysis.objects.filter(quiz__in=quizzes).delete()
+            QuizAnalysis.objects.filter(quiz__in=quizzes).delete()
+    pending = quizzes.annotate(newest=Max('attempts__pk')).filter(
+        newest__gt=Coalesce(F('analysis__last_attempt_id'), Value(0)),
+    ).order_by('pk').values_list('pk', flat=True)
+    return {quiz_id: analyse_quiz(quiz_id, chunk_size) for quiz_id in pending}
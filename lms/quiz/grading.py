@@ -0,0 +1,228 @@
+"""
+Quiz answer keys and grading.
+
+An AnswerKey is a quiz compiled into flat arrays: question ids, and for each
+question a slice of option ids, texts and correct flags. It is built with
+two queries and cached per quiz version, like the course outline; saving or
+deleting a Question or Answer moves Quiz.answer_key_version on (quiz.signals),
+so every process sees the change. Each process also keeps the keys it used
+recently, so grading a submission for a loaded Quiz needs no Question or
+Answer queries, nor any cache round trip.
+
+grade() is a pure function of a key and the learner's selections.
+"""
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Quiz
+
+# Bump when the cached structure changes shape so old pickles are never read
+KEY_FORMAT = 1
+KEY_CACHE_TIMEOUT = getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_TIMEOUT', 60 * 60 * 24)
+# Answer keys kept in each process, most recently used
+LOCAL_KEYS = getattr(settings, 'QUIZ_ANSWER_KEY_LOCAL_SIZE', 256)
+
+
+class AnswerKey:
+    """
+    A quiz's questions and options, in display order. The options of the
+    question at index ``i`` are ``option_offsets[i]:option_offsets[i + 1]``
+    of ``option_ids``, ``option_texts`` and ``correct``.
+    """
+    __slots__ = (
+        'quiz_id', 'question_ids', 'question_texts', 'option_offsets', 'option_ids', 'option_texts', 'correct',
+        '_question_index', '_option_index',
+    )
+
+    def __init__(self, quiz_id, question_ids, question_texts, option_offsets, option_ids, option_texts, correct):
+        self.quiz_id = quiz_id
+        self.question_ids = question_ids
+        self.question_texts = question_texts
+        self.option_offsets = option_offsets
+        self.option_ids = option_ids
+        self.option_texts = option_texts
+        # One byte per option, 1 if it is a correct answer
+        self.correct = correct
+        self._question_index = {pk: idx for idx, pk in enumerate(question_ids)}
+        self._option_index = {pk: idx for idx, pk in enumerate(option_ids)}
+
+    def __getstate__(self):
+        return (
+            self.quiz_id, self.question_ids, self.question_texts, self.option_offsets,
+            self.option_ids, self.option_texts, self.correct,
+        )
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    @classmethod
+    def for_quiz(cls, quiz):
+        """Compile ``quiz`` (instance or pk) in two queries."""
+        from .models import Answer, Question
+
+        quiz_id = getattr(quiz, 'pk', quiz)
+        question_ids, question_texts = array('q'), []
+        for pk, text in Question.objects.filter(quiz_id=quiz_id).order_by('created_at', 'pk').values_list(
+            'pk', 'question_text',
+        ):
+            question_ids.append(pk)
+            question_texts.append(text)
+
+        options = {}
+        for question_id, pk, text, is_correct in Answer.objects.filter(question__quiz_id=quiz_id).order_by(
+            'created_at', 'pk',
+        ).values_list('question_id', 'pk', 'answer_text', 'is_correct'):
+            options.setdefault(question_id, []).append((pk, text, is_correct))
+
+        option_offsets, option_ids, option_texts, correct = array('l', [0]), array('q'), [], bytearray()
+        for question_id in question_ids:
+            for pk, text, is_correct in options.get(question_id, ()):
+                option_ids.append(pk)
+                option_texts.append(text)
+                correct.append(1 if is_correct else 0)
+            option_offsets.append(len(option_ids))
+        return cls(quiz_id, question_ids, tuple(question_texts), option_offsets, option_ids, tuple(option_texts), bytes(correct))
+
+    def selections_from(self, data):
+        """{question_id: selected answer id or None} for every question, read from ``question_<id>`` fields of ``data``."""
+        selections = {}
+        for question_id in self.question_ids:
+            raw = data.get(f'question_{question_id}')
+            selections[question_id] = int(raw) if raw and str(raw).isdigit() else None
+        return selections
+
+    def selections_for(self, answer_ids):
+        """{question_id: answer_id} for the ``answer_ids`` that are still options of this quiz."""
+        selections = {}
+        for answer_id in answer_ids:
+            option = self._option_index.get(answer_id)
+            if option is not None:
+                selections[self.question_ids[bisect_right(self.option_offsets, option) - 1]] = answer_id
+        return selections
+
+    def options(self, question_id):
+        """[(answer id, text, is_correct)] of ``question_id`` in display order; empty if it isn't in the quiz."""
+        idx = self._question_index.get(question_id)
+        if idx is None:
+            return []
+        return [
+            (self.option_ids[i], self.option_texts[i], bool(self.correct[i]))
+            for i in range(self.option_offsets[idx], self.option_offsets[idx + 1])
+        ]
+
+    def is_correct(self, question_id, answer_id):
+        """Whether ``answer_id`` is a correct option of ``question_id``; options of other questions never are."""
+        idx = self._question_index.get(question_id)
+        option = self._option_index.get(answer_id)
+        if idx is None or option is None:
+            return False
+        return self.option_offsets[idx] <= option < self.option_offsets[idx + 1] and bool(self.correct[option])
+
+    def question_results(self, selections):
+        """
+        Per-question dicts for quiz_result.html. ``is_correct`` is None for
+        questions missing from ``selections`` (selection unknown), and False
+        for those answered with None.
+        """
+        results = []
+        for idx, question_id in enumerate(self.question_ids):
+            start, stop = self.option_offsets[idx], self.option_offsets[idx + 1]
+            selected_id = selections.get(question_id)
+            selected = self._option_index.get(selected_id)
+            if selected is not None and not start <= selected < stop:
+                selected = selected_id = None
+            results.append({
+                'question_id': question_id,
+                'question_text': self.question_texts[idx],
+                'selected_id': selected_id,
+                'selected_answer_text': self.option_texts[selected] if selected is not None else None,
+                'is_correct': self.is_correct(question_id, selected_id) if question_id in selections else None,
+                'options': [
+                    {'id': self.option_ids[i], 'text': self.option_texts[i], 'is_correct': bool(self.correct[i])}
+                    for i in range(start, stop)
+                ],
+            })
+        return results
+
+
+class Grade:
+    __slots__ = ('score', 'total', 'percentage')
+
+    def __init__(self, score, total):
+        self.score = score
+        self.total = total
+        self.percentage = (score * 100.0 / total) if total > 0 else 0.0
+
+
+def grade(key, selections):
+    """Grade {question_id: answer_id} ``selections`` against ``key``; no queries."""
+    score = sum(1 for question_id in key.question_ids if key.is_correct(question_id, selections.get(question_id)))
+    return Grade(score, len(key))
+
+
+# --- Cache ---
+
+_lock = threading.Lock()
+_local = OrderedDict()
+
+
+def _key_key(quiz_id, version):
+    return f'quiz_answer_key:{KEY_FORMAT}:{quiz_id}:{version}'
+
+
+def _current_version(quiz):
+    """Quiz.answer_key_version, from the instance if one was passed; the database is the only shared state."""
+    if isinstance(quiz, Quiz):
+        return quiz.answer_key_version
+    return Quiz.objects.filter(pk=quiz).values_list('answer_key_version', flat=True).first()
+
+
+def get_answer_key(quiz):
+    """
+    The AnswerKey for ``quiz`` (instance or pk): from this process, the
+    shared cache, or built. An instance's version is used as loaded, so
+    pass one fetched in the same request; a pk costs one query.
+    """
+    quiz_id = getattr(quiz, 'pk', quiz)
+    version = _current_version(quiz)
+    with _lock:
+        local = _local.get(quiz_id)
+        if local is not None and local[0] == version:
+            _local.move_to_end(quiz_id)
+            return local[1]
+
+    cache_key = _key_key(quiz_id, version)
+    answer_key = cache.get(cache_key)
+    if answer_key is None:
+        answer_key = AnswerKey.for_quiz(quiz_id)
+        cache.set(cache_key, answer_key, timeout=KEY_CACHE_TIMEOUT)
+    with _lock:
+        _local[quiz_id] = (version, answer_key)
+        _local.move_to_end(quiz_id)
+        while len(_local) > LOCAL_KEYS:
+            _local.popitem(last=False)
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """
+    Move the quiz to a new answer key version. The version lives on the Quiz
+    row, so every process sees it and keys cached under older versions are
+    never read again.
+    """
+    Quiz.objects.filter(pk=quiz_id).update(answer_key_version=F('answer_key_version') + 1)
+
+
+def clear_answer_keys():
+    """Drop this process's keys (tests, or to free memory)."""
+    with _lock:
+        _local.clear()
@@ -0,0 +1,76 @@
+"""
+Quiz attempt history.
+
+Every submission appends a QuizAttempt (with its QuizResponse); nothing is
+overwritten. QuizRecord keeps one row per (student, quiz) with a pointer to
+the best attempt and running totals, updated in place by a single UPDATE
+per submission, so pass checks read one row per quiz instead of scanning
+attempts.
+
+compact_attempts() (``manage.py compact_quiz_attempts``, run nightly) bounds
+the history: for each (student, quiz) it keeps the most recent attempts and
+the best one, and deletes the rest once they are older than the retention
+period. Their scores are already in the record's totals.
+"""
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Exists, F, OuterRef, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import QuizAttempt, QuizRecord, QuizResponse
+
+# Attempts kept per (student, quiz) however old they are, besides the best
+ATTEMPTS_KEPT = getattr(settings, 'QUIZ_ATTEMPTS_KEPT', 5)
+RETENTION_DAYS = getattr(settings, 'QUIZ_ATTEMPT_RETENTION_DAYS', 90)
+COMPACT_BATCH_SIZE = 1000
+
+
+def record_attempt(student, quiz, score, answer_ids=()):
+    """
+    Append an attempt with the selected ``answer_ids`` and fold it into the
+    learner's QuizRecord. Call inside the submission's transaction.
+    """
+    score = float(score or 0)
+    attempt = QuizAttempt.objects.create(student=student, quiz=quiz, score=score, completed=True)
+    QuizResponse.objects.bulk_create([QuizResponse(attempt=attempt, selected=QuizResponse.pack(answer_ids))])
+
+    QuizRecord.objects.bulk_create(
+        [QuizRecord(student=student, quiz=quiz, first_taken=attempt.date_taken)], ignore_conflicts=True,
+    )
+    # Every SET expression sees the row as it was, so the row lock is the only coordination needed
+    better = Q(best_attempt__isnull=True) | Q(best_score__lt=score)
+    QuizRecord.objects.filter(student=student, quiz=quiz).update(
+        best_attempt=Case(When(better, then=Value(attempt.pk)), default=F('best_attempt'), output_field=BigIntegerField()),
+        best_score=Case(When(better, then=Value(score)), default=F('best_score')),
+        attempts=F('attempts') + 1,
+        score_total=F('score_total') + score,
+        last_taken=attempt.date_taken,
+    )
+    return attempt
+
+
+def compactable_attempts(keep=ATTEMPTS_KEPT, older_than=RETENTION_DAYS):
+    """Attempts beyond the ``keep`` most recent of their (student, quiz), older than ``older_than`` days and not the best."""
+    ranked = QuizAttempt.objects.annotate(
+        newer=Window(
+            RowNumber(), partition_by=[F('student_id'), F('quiz_id')], order_by=[F('date_taken').desc(), F('pk').desc()],
+        ),
+    ).filter(newer__gt=keep).values('pk')
+    return QuizAttempt.objects.filter(
+        pk__in=ranked, date_taken__lt=timezone.now() - timedelta(days=older_than),
+    ).exclude(Exists(QuizRecord.objects.filter(best_attempt=OuterRef('pk'))))
+
+
+def compact_attempts(keep=ATTEMPTS_KEPT, older_than=RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE):
+    """Delete compactable attempts and their responses, ``batch_size`` per transaction; returns how many."""
+    ids = array('q', compactable_attempts(keep, older_than).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size].tolist()
+        with transaction.atomic():
+            QuizResponse.objects.filter(attempt_id__in=batch).delete()
+            QuizAttempt.objects.filter(pk__in=batch).delete()
+    return len(ids)
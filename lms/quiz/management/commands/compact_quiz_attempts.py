@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from quiz.history import ATTEMPTS_KEPT, COMPACT_BATCH_SIZE, RETENTION_DAYS, compact_attempts
+
+
+class Command(BaseCommand):
+    help = "Delete old quiz attempts beyond the most recent and best ones of each learner; their totals stay in QuizRecord."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=ATTEMPTS_KEPT, help="Most recent attempts kept per learner and quiz.")
+        parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="Only delete attempts older than this.")
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE, help="Attempts deleted per transaction.")
+
+    def handle(self, *args, **options):
+        removed = compact_attempts(max(0, options['keep']), max(0, options['days']), max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f"Compacted {removed} quiz attempt(s)."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from quiz.analysis import CHUNK_SIZE, analyse_items
+
+
+class Command(BaseCommand):
+    help = "Update per-question difficulty, discrimination and distractor counts from quiz attempts since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quizzes', help="Only analyse this quiz ID (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Attempts read and graded per chunk.")
+        parser.add_argument('--rebuild', action='store_true', help="Discard the existing analysis and start over.")
+
+    def handle(self, *args, **options):
+        analysed = analyse_items(options['quizzes'], max(1, options['chunk_size']), options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {sum(analysed.values())} attempt(s) across {len(analysed)} quiz(zes)."
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_alter_answer_options_alter_question_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('selected', models.BinaryField(default=b'')),
+                ('answered_at', models.DateTimeField(auto_now=True)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='response', to='quiz.quizattempt')),
+            ],
+        ),
+    ]
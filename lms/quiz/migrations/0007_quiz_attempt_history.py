@@ -0,0 +1,54 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0006_quizresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('best_score', models.FloatField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('score_total', models.FloatField(default=0)),
+                ('first_taken', models.DateTimeField(blank=True, null=True)),
+                ('last_taken', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['student', 'quiz', '-date_taken'], name='quiz_attempt_history'),
+        ),
+        migrations.AddField(
+            model_name='quizrecord',
+            name='best_attempt',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='quiz.quizattempt'),
+        ),
+        migrations.AddField(
+            model_name='quizrecord',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='quiz.quiz'),
+        ),
+        migrations.AddField(
+            model_name='quizrecord',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_records', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='quizrecord',
+            index=models.Index(fields=['student', '-last_taken'], name='quiz_quizre_student_93dd2f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizrecord',
+            unique_together={('student', 'quiz')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def seed_records(apps, schema_editor):
+    """One QuizRecord per existing (student, quiz), summarizing its attempts with the best one as the pointer."""
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+    QuizRecord = apps.get_model('quiz', 'QuizRecord')
+
+    records = {}
+    rows = QuizAttempt.objects.order_by('date_taken', 'pk').values_list('pk', 'student_id', 'quiz_id', 'score', 'date_taken')
+    for pk, student_id, quiz_id, score, date_taken in rows.iterator():
+        score = score or 0.0
+        record = records.get((student_id, quiz_id))
+        if record is None:
+            record = records[(student_id, quiz_id)] = QuizRecord(
+                student_id=student_id, quiz_id=quiz_id, best_attempt_id=pk, best_score=score,
+                first_taken=date_taken,
+            )
+        elif score > record.best_score:
+            record.best_attempt_id, record.best_score = pk, score
+        record.attempts += 1
+        record.score_total += score
+        record.last_taken = date_taken
+    QuizRecord.objects.bulk_create(records.values(), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_quiz_attempt_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_records, migrations.RunPython.noop),
+    ]
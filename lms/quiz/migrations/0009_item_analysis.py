@@ -0,0 +1,39 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_seed_quiz_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_attempt_id', models.BigIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='quiz.quiz')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('unanswered', models.PositiveIntegerField(default=0)),
+                ('total_sum', models.FloatField(default=0)),
+                ('total_sq_sum', models.FloatField(default=0)),
+                ('correct_total_sum', models.FloatField(default=0)),
+                ('option_counts', models.JSONField(default=dict)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='quiz.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_analyses', to='quiz.quiz')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_item_analysis'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['date_taken'], name='quiz_attempt_recent'),
+        ),
+    ]
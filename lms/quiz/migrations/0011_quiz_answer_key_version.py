@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_quizattempt_quiz_attempt_recent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='answer_key_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models 
+import struct
+
+from django.db import models
 from courses.models import Module  # Updated to use Module instead of Lesson
 from users.models import User
 
@@ -6,10 +8,21 @@ class Quiz(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='quizzes')  # Now linked to a module
     title = models.CharField(max_length=200)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'instructor'})  # Created by tutor
+    # Moved by quiz.grading.invalidate_answer_key(); cached answer keys are keyed on it
+    answer_key_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Quiz: {self.title} for Module: {self.module.title}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # A copy loaded before the questions changed must not write its old version back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'answer_key_version'
+            ]
+        super().save(*args, **kwargs)
+
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
     question_text = models.TextField()  # The actual question text
@@ -34,11 +47,130 @@ class Answer(models.Model):
         ordering = ['created_at']
 
 class QuizAttempt(models.Model):
+    """One submission of a quiz. Attempts are only appended (see quiz.history); QuizRecord summarizes them."""
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
     date_taken = models.DateTimeField(auto_now_add=True)
     score = models.FloatField(null=True, blank=True)  # Percentage score of the student
     completed = models.BooleanField(default=False)  # Indicates whether the quiz was completed
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'quiz', '-date_taken'], name='quiz_attempt_history'),
+            models.Index(fields=['date_taken'], name='quiz_attempt_recent'),
+        ]
+
     def __str__(self):
         return f"{self.student.email} attempted {self.quiz.title} on {self.date_taken}"
+
+
+class QuizRecord(models.Model):
+    """
+    A learner's standing in a quiz across all their attempts: a pointer to
+    the best attempt, and running totals that survive compaction of old
+    attempts. Pass checks read ``best_score`` here, one row per quiz.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_records')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='records')
+    best_attempt = models.ForeignKey(QuizAttempt, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    best_score = models.FloatField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    score_total = models.FloatField(default=0)  # Sum of every attempt's score, for averages
+    first_taken = models.DateTimeField(null=True, blank=True)
+    last_taken = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('student', 'quiz')
+        indexes = [
+            models.Index(fields=['student', '-last_taken']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.email} - {self.quiz.title}: best {self.best_score:.0f}% in {self.attempts} attempt(s)"
+
+    @property
+    def average_score(self):
+        return self.score_total / self.attempts if self.attempts else 0.0
+
+
+class QuizResponse(models.Model):
+    """The answers selected in an attempt, as packed answer ids (questions are looked up in the answer key)."""
+    attempt = models.OneToOneField(QuizAttempt, on_delete=models.CASCADE, related_name='response')
+    selected = models.BinaryField(default=b'')  # Little-endian int64 answer ids
+    answered_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def pack(answer_ids):
+        answer_ids = [answer_id for answer_id in answer_ids if answer_id is not None]
+        return struct.pack(f'<{len(answer_ids)}q', *answer_ids)
+
+    @property
+    def selected_ids(self):
+        data = bytes(self.selected)
+        return struct.unpack(f'<{len(data) // 8}q', data)
+
+    def __str__(self):
+        return f"Responses for {self.attempt_id}"
+
+
+class QuizAnalysis(models.Model):
+    """How far item analysis (quiz.analysis) has read a quiz's attempts."""
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name='analysis')
+    last_attempt_id = models.BigIntegerField(default=0)  # Attempts up to this id are in the question stats
+    attempts = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analysis of {self.quiz_id}: {self.attempts} attempt(s)"
+
+
+class QuestionAnalysis(models.Model):
+    """
+    Running item statistics for one question, over every analysed attempt of
+    its quiz. ``total`` is an attempt's number of correct answers; the sums
+    are enough to work out difficulty and discrimination without the
+    attempts themselves.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='analysis')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='question_analyses')
+    responses = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    unanswered = models.PositiveIntegerField(default=0)
+    total_sum = models.FloatField(default=0)
+    total_sq_sum = models.FloatField(default=0)
+    correct_total_sum = models.FloatField(default=0)  # Sum of ``total`` over attempts answering correctly
+    option_counts = models.JSONField(default=dict)  # {answer id: times selected}
+
+    def __str__(self):
+        return f"Analysis of question {self.question_id}"
+
+    @property
+    def difficulty(self):
+        """Share of responses that were correct (the item's p-value; lower is harder)."""
+        return self.correct / self.responses if self.responses else None
+
+    @property
+    def discrimination(self):
+        """
+        Point-biserial correlation between answering this question correctly
+        and the score on the rest of the quiz; near zero or negative means
+        the question doesn't separate stronger learners from weaker ones.
+        """
+        n, k = self.responses, self.correct
+        if not n or k in (0, n):
+            return None
+        # Rest-of-quiz score: total minus this question's own point
+        rest_sum = self.total_sum - k
+        rest_sq_sum = self.total_sq_sum - 2 * self.correct_total_sum + k
+        rest_correct_sum = self.correct_total_sum - k
+        variance = rest_sq_sum / n - (rest_sum / n) ** 2
+        if variance <= 1e-12:
+            return None
+        mean_correct = rest_correct_sum / k
+        mean_wrong = (rest_sum - rest_correct_sum) / (n - k)
+        p = k / n
+        return (mean_correct - mean_wrong) / variance ** 0.5 * (p * (1 - p)) ** 0.5
+
+    def option_share(self, answer_id):
+        """Share of responses that selected ``answer_id``."""
+        return self.option_counts.get(str(answer_id), 0) / self.responses if self.responses else 0.0
@@ -0,0 +1,45 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .grading import invalidate_answer_key
+from .models import Question, Answer
+
+
+def _invalidate(*quiz_ids):
+    # In the same transaction as the change, so the new version commits with it
+    for quiz_id in {q for q in quiz_ids if q}:
+        invalidate_answer_key(quiz_id)
+
+
+def _quiz_id_for_question(question_id):
+    return Question.objects.filter(pk=question_id).values_list('quiz_id', flat=True).first()
+
+
+# Questions and answers can be moved to another quiz or question from the
+# admin; remember the old quiz so its answer key is invalidated as well.
+@receiver(pre_save, sender=Question)
+def remember_question_quiz(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._answer_key_previous_quiz_id = _quiz_id_for_question(instance.pk)
+
+
+@receiver(pre_save, sender=Answer)
+def remember_answer_quiz(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._answer_key_previous_quiz_id = Answer.objects.filter(pk=instance.pk).values_list(
+            'question__quiz_id', flat=True,
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    _invalidate(instance.quiz_id, getattr(instance, '_answer_key_previous_quiz_id', None))
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    _invalidate(
+        _quiz_id_for_question(instance.question_id),
+        getattr(instance, '_answer_key_previous_quiz_id', None),
+    )
+
@@ -1,3 +1,231 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Module, Lesson, Enrollment
+from instructor.views import InstructorView
+from quiz.analysis import analyse_items
+from quiz.grading import clear_answer_keys, get_answer_key, grade
+from quiz.history import compact_attempts, record_attempt
+from quiz.models import Quiz, Question, Answer, QuizAnalysis, QuizAttempt, QuizRecord, QuizResponse, QuestionAnalysis
+from users.models import User, Profile
+
+
+class AnswerKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+        cls.course = Course.objects.create(title="Course", created_by=cls.instructor)
+        cls.module = Module.objects.create(course=cls.course, title="Module")
+        cls.lesson = Lesson.objects.create(module=cls.module, title="Lesson")
+        cls.quiz = Quiz.objects.create(module=cls.module, title="Quiz", created_by=cls.instructor)
+        cls.questions = [Question.objects.create(quiz=cls.quiz, question_text=f"Q{i}") for i in range(4)]
+        cls.right = [Answer.objects.create(question=q, answer_text="right", is_correct=True) for q in cls.questions]
+        cls.wrong = [Answer.objects.create(question=q, answer_text="wrong") for q in cls.questions]
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        # Creating the questions and answers moved the version on the row
+        self.quiz.refresh_from_db()
+
+    def test_grading_only_accepts_each_questions_own_options(self):
+        key = get_answer_key(self.quiz)
+        q0, q1, q2, q3 = (q.pk for q in self.questions)
+        result = grade(key, {q0: self.right[0].pk, q1: self.wrong[1].pk, q2: self.right[3].pk, q3: None})
+        self.assertEqual((result.score, result.total, result.percentage), (1, 4, 25.0))
+
+        results = key.question_results({q0: self.right[0].pk, q2: self.right[3].pk})
+        self.assertEqual([r['is_correct'] for r in results], [True, None, False, None])
+        self.assertEqual(results[2]['selected_id'], None)
+        self.assertEqual([o['text'] for o in results[0]['options']], ["right", "wrong"])
+
+    def test_key_is_reused_until_a_question_or_answer_changes(self):
+        get_answer_key(self.quiz)
+        # The version comes with the loaded quiz; by pk it costs one query
+        with self.assertNumQueries(0):
+            get_answer_key(self.quiz)
+        with self.assertNumQueries(1):
+            get_answer_key(self.quiz.pk)
+        clear_answer_keys()
+        with self.assertNumQueries(0):
+            get_answer_key(self.quiz)
+
+        self.wrong[0].is_correct = True
+        self.wrong[0].save()
+        self.assertTrue(get_answer_key(self.quiz.pk).is_correct(self.questions[0].pk, self.wrong[0].pk))
+
+        self.questions[3].delete()
+        self.assertEqual(len(get_answer_key(self.quiz.pk)), 3)
+
+    def test_version_is_shared_through_the_database(self):
+        # Another worker's cache still holds the key; the version on the row moves past it
+        stale = get_answer_key(self.quiz)
+        with mock.patch('quiz.grading.cache', LocMemCache('other-worker', {})):
+            self.wrong[0].is_correct = True
+            self.wrong[0].save()
+        self.assertIsNot(get_answer_key(self.quiz.pk), stale)
+        self.assertTrue(get_answer_key(self.quiz.pk).is_correct(self.questions[0].pk, self.wrong[0].pk))
+
+        # Saving a copy loaded before the change doesn't take the version back
+        self.quiz.title = "Renamed"
+        self.quiz.save()
+        self.quiz.refresh_from_db()
+        self.assertTrue(get_answer_key(self.quiz).is_correct(self.questions[0].pk, self.wrong[0].pk))
+
+    def test_submission_reads_no_questions_or_answers(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.student.read_lessons.add(self.lesson)
+        self.client.force_login(self.student)
+        get_answer_key(self.quiz)
+        data = {f'question_{q.pk}': a.pk for q, a in zip(self.questions, self.right[:3] + self.wrong[3:])}
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('submit_quiz', args=[self.quiz.pk]), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['score'], 3)
+        self.assertEqual(QuizAttempt.objects.get(student=self.student, quiz=self.quiz).score, 75.0)
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"quiz_question"', tables)
+        self.assertNotIn('"quiz_answer"', tables)
+
+        self.assertNotIn('quiz_responses', self.client.session)
+
+    def test_review_reads_selections_from_the_latest_attempt(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.student.read_lessons.add(self.lesson)
+        self.client.force_login(self.student)
+        url = reverse('submit_quiz', args=[self.quiz.pk])
+        self.client.post(url, {f'question_{q.pk}': a.pk for q, a in zip(self.questions, self.wrong)})
+        self.client.post(url, {f'question_{q.pk}': a.pk for q, a in zip(self.questions[:3], self.right)})
+        first, latest = QuizAttempt.objects.filter(student=self.student, quiz=self.quiz).order_by('pk')
+        self.assertEqual(first.response.selected_ids, tuple(a.pk for a in self.wrong))
+        self.assertEqual(latest.response.selected_ids, tuple(a.pk for a in self.right[:3]))
+
+        # A new session still sees the attempt's selections
+        self.client.logout()
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('quiz_review', args=[self.quiz.pk]))
+        # The attempt and its response in one query; nothing else from the quiz tables
+        quiz_queries = [q['sql'] for q in ctx.captured_queries if '"quiz_quiz"' not in q['sql'] and '"quiz_' in q['sql']]
+        self.assertEqual(len(quiz_queries), 1)
+        self.assertIn('"quiz_quizresponse"', quiz_queries[0])
+        results = response.context['question_results']
+        self.assertEqual([r['is_correct'] for r in results], [True, True, True, None])
+        self.assertEqual(results[0]['selected_answer_text'], "right")
+
+
+class AttemptHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        course = Course.objects.create(title="Course", created_by=cls.instructor)
+        module = Module.objects.create(course=course, title="Module")
+        cls.quiz = Quiz.objects.create(module=module, title="Quiz", created_by=cls.instructor)
+
+    def test_record_points_at_the_best_attempt(self):
+        scores = [50, 80, 60]
+        attempts = [record_attempt(self.student, self.quiz, score) for score in scores]
+        record = QuizRecord.objects.get(student=self.student, quiz=self.quiz)
+        self.assertEqual(record.best_attempt, attempts[1])
+        self.assertEqual((record.best_score, record.attempts, record.average_score), (80, 3, sum(scores) / 3))
+        self.assertEqual(record.last_taken, attempts[2].date_taken)
+        self.assertEqual(QuizAttempt.objects.filter(student=self.student).count(), 3)
+
+    def test_compaction_keeps_recent_and_best_attempts(self):
+        attempts = [record_attempt(self.student, self.quiz, score) for score in (90, 10, 20, 30, 40)]
+        QuizAttempt.objects.filter(pk__in=[a.pk for a in attempts[:4]]).update(
+            date_taken=timezone.now() - timedelta(days=100),
+        )
+        self.assertEqual(compact_attempts(keep=2, older_than=90), 2)
+        # The best (90) and the two most recent remain; the record still counts all five
+        self.assertEqual(
+            list(QuizAttempt.objects.order_by('pk').values_list('score', flat=True)), [90, 30, 40],
+        )
+        self.assertEqual(QuizResponse.objects.count(), 3)
+        record = QuizRecord.objects.get()
+        self.assertEqual((record.best_attempt_id, record.attempts, record.score_total), (attempts[0].pk, 5, 190))
+        self.assertEqual(compact_attempts(keep=2, older_than=90), 0)
+
+
+class ItemAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        course = Course.objects.create(title="Course", created_by=cls.instructor)
+        module = Module.objects.create(course=course, title="Module")
+        cls.quiz = Quiz.objects.create(module=module, title="Quiz", created_by=cls.instructor)
+        cls.questions = [Question.objects.create(quiz=cls.quiz, question_text=f"Q{i}") for i in range(3)]
+        # Options per question: right, then two distractors
+        cls.options = [
+            [Answer.objects.create(question=q, answer_text=text, is_correct=(text == "right")) for text in ("right", "a", "b")]
+            for q in cls.questions
+        ]
+        cls.learners = [User.objects.create_user(email=f"l{i}@example.com", password="pw") for i in range(6)]
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+
+    def submit(self, learner, picks):
+        """``picks``: option index per question (0 is right), None to leave it unanswered."""
+        answer_ids = [self.options[q][pick].pk for q, pick in enumerate(picks) if pick is not None]
+        record_attempt(learner, self.quiz, 0, answer_ids)
+
+    def test_statistics_and_incremental_runs(self):
+        picks = [(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 2, None), (1, 1, 0), (2, 0, 1)]
+        for learner, row in zip(self.learners, picks):
+            self.submit(learner, row)
+        self.assertEqual(analyse_items(chunk_size=4), {self.quiz.pk: 6})
+
+        first, second, third = (QuestionAnalysis.objects.get(question=q) for q in self.questions)
+        self.assertEqual((first.responses, first.correct, first.difficulty), (6, 4, 4 / 6))
+        self.assertEqual(third.unanswered, 1)
+        self.assertEqual(second.option_counts, {str(self.options[1][0].pk): 3, str(self.options[1][1].pk): 2,
+                                                str(self.options[1][2].pk): 1})
+        self.assertAlmostEqual(second.option_share(self.options[1][1].pk), 2 / 6)
+
+        # Discrimination matches the correlation with the rest of the quiz computed directly
+        right = np.array([[pick == 0 for pick in row] for row in picks], dtype=float)
+        for idx, analysis in enumerate((first, second, third)):
+            rest = right.sum(axis=1) - right[:, idx]
+            self.assertAlmostEqual(analysis.discrimination, np.corrcoef(right[:, idx], rest)[0, 1])
+
+        # Only attempts since the last run are read
+        self.assertEqual(analyse_items(), {})
+        self.submit(self.learners[0], (1, 1, 1))
+        self.assertEqual(analyse_items(), {self.quiz.pk: 1})
+        self.assertEqual(QuestionAnalysis.objects.get(question=self.questions[0]).responses, 7)
+        self.assertEqual(QuizAnalysis.objects.get(quiz=self.quiz).attempts, 7)
+
+        self.assertEqual(analyse_items(rebuild=True), {self.quiz.pk: 7})
+        self.assertEqual(QuestionAnalysis.objects.get(question=self.questions[0]).correct, 4)
+
+    def test_dashboard_lists_hardest_questions(self):
+        for learner, row in zip(self.learners, [(0, 1, 0), (0, 1, 2), (1, 0, 0)]):
+            self.submit(learner, row)
+        analyse_items()
+        Profile.objects.create(user=self.learners[0], first_name="Lea", last_name="Rner", image=None)
+        request = RequestFactory().get(reverse('instructor_dashboard'))
+        request.user = self.instructor
+        view = InstructorView()
+        view.setup(request)
+        rows = view.get_context_data()['item_analysis']
+        self.assertEqual(rows[0]['analysis'].question, self.questions[1])
+        self.assertEqual((rows[0]['distractor'], round(rows[0]['distractor_percent'])), ("a", 67))
+
+        self.client.force_login(self.learners[0])
+        self.assertEqual(self.client.get(reverse('instructor_dashboard')).status_code, 403)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import SearchDocument
+
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'kind', 'object_id', 'course_id', 'published', 'updated_at')
+    list_filter = ('kind', 'published')
+    search_fields = ('title',)
+    readonly_fields = ('kind', 'object_id', 'course_id', 'published', 'title', 'body', 'updated_at')
@@ -0,0 +1,294 @@
+"""
+Full-text search index over courses, lessons, ebooks and quizzes.
+
+Each searchable object is flattened into a SearchDocument (HTML stripped).
+Matching and ranking then run against an index instead of LIKE scans over
+raw HTML:
+
+- PostgreSQL: weighted ``search_vector`` tsvector column with a GIN index,
+  ranked with ts_rank.
+- SQLite: FTS5 virtual table mirroring title/body, ranked with bm25.
+- Anything else (or SQLite built without FTS5): icontains over the stripped
+  text, so search keeps working, just without an index.
+"""
+import html
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import SearchDocument
+
+FTS_TABLE = 'search_searchdocument_fts'
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'english')
+
+# Title matches count for more than body matches
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+_WHITESPACE = re.compile(r'\s+')
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def html_to_text(value):
+    """Plain text of a TinyMCE/CKEditor HTML fragment."""
+    if not value:
+        return ''
+    # Keep words in adjacent block elements apart once the tags are gone
+    text = strip_tags(re.sub(r'<(br|/p|/div|/li|/h[1-6]|/td)\b[^>]*>', ' ', value, flags=re.I))
+    return _WHITESPACE.sub(' ', html.unescape(text)).strip()
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def document_fields(instance):
+    """(kind, field values) for a Course, Lesson, Ebook or Quiz; None for other models."""
+    from courses.models import Course, Lesson, Ebook  # Avoid circular import
+    from quiz.models import Quiz
+
+    if isinstance(instance, Course):
+        return SearchDocument.KIND_COURSE, {
+            'course_id': instance.pk,
+            'published': True,
+            'title': instance.title[:255],
+            'body': _join(instance.get_category_display(), instance.category, html_to_text(instance.description)),
+        }
+    if isinstance(instance, Lesson):
+        return SearchDocument.KIND_LESSON, {
+            'course_id': instance.module.course_id,
+            'published': True,
+            'title': instance.title[:255],
+            'body': _join(html_to_text(instance.description), html_to_text(instance.content)),
+        }
+    if isinstance(instance, Ebook):
+        return SearchDocument.KIND_EBOOK, {
+            'course_id': None,
+            'published': instance.published,
+            'title': instance.title[:255],
+            'body': _join(instance.category.name if instance.category_id else '', html_to_text(instance.description)),
+        }
+    if isinstance(instance, Quiz):
+        return SearchDocument.KIND_QUIZ, {
+            'course_id': instance.module.course_id,
+            'published': True,
+            'title': instance.title[:255],
+            'body': instance.module.title,
+        }
+    return None
+
+
+def index_instance(instance):
+    """Create or refresh the search document for ``instance``."""
+    fields = document_fields(instance)
+    if fields is None:
+        return None
+    kind, defaults = fields
+    document, _ = SearchDocument.objects.update_or_create(kind=kind, object_id=instance.pk, defaults=defaults)
+    sync_backend([document])
+    return document
+
+
+def remove_instance(kind, object_id):
+    _delete_documents(SearchDocument.objects.filter(kind=kind, object_id=object_id))
+
+
+def _delete_documents(queryset):
+    ids = list(queryset.values_list('pk', flat=True))
+    if ids:
+        _fts_delete(ids)
+        SearchDocument.objects.filter(pk__in=ids).delete()
+
+
+# --- Backend-specific index maintenance ---
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def sync_backend(documents):
+    """Push the documents' current text into the vendor index."""
+    if not documents:
+        return
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchVector
+
+        SearchDocument.objects.filter(pk__in=[d.pk for d in documents]).update(
+            search_vector=(
+                SearchVector('title', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+            )
+        )
+    elif fts5_available():
+        _fts_delete([d.pk for d in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [(d.pk, d.title, d.body) for d in documents],
+            )
+
+
+def _fts_delete(ids):
+    if not ids or not fts5_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", list(ids)
+        )
+
+
+def rebuild_index(batch_size=200, stdout=None):
+    """Re-index every course, lesson, ebook and quiz; returns the number of documents written."""
+    from courses.models import Course, Lesson, Ebook  # Avoid circular import
+    from quiz.models import Quiz
+
+    sources = [
+        (SearchDocument.KIND_COURSE, Course.objects.all()),
+        (SearchDocument.KIND_LESSON, Lesson.objects.select_related('module')),
+        (SearchDocument.KIND_EBOOK, Ebook.objects.select_related('category')),
+        (SearchDocument.KIND_QUIZ, Quiz.objects.select_related('module')),
+    ]
+    written = 0
+    for kind, queryset in sources:
+        batch = []
+        for instance in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            _, fields = document_fields(instance)
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, **fields))
+            if len(batch) >= batch_size:
+                written += _write_batch(batch)
+                batch = []
+        written += _write_batch(batch)
+
+        # Drop documents whose objects no longer exist
+        _delete_documents(
+            SearchDocument.objects.filter(kind=kind).exclude(object_id__in=queryset.model.objects.values('pk'))
+        )
+        if stdout:
+            stdout.write(f"Indexed {kind} documents.")
+    return written
+
+
+def _write_batch(batch):
+    if not batch:
+        return 0
+    SearchDocument.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['course_id', 'published', 'title', 'body', 'updated_at'],
+    )
+    # bulk_create does not return ids for updated rows on every backend; look them up
+    written = SearchDocument.objects.filter(
+        kind=batch[0].kind, object_id__in=[document.object_id for document in batch]
+    ).only('pk', 'title', 'body')
+    sync_backend(list(written))
+    return len(batch)
+
+
+# --- Querying ---
+
+def fts5_match_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match,
+    and the last one may be a prefix (so results update while typing).
+    """
+    terms = _TERM.findall(query)
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def visible_documents(user):
+    """Documents ``user`` may see: lessons only for enrolled courses, published ebooks only."""
+    from courses.models import Enrollment  # Avoid circular import
+
+    documents = SearchDocument.objects.filter(published=True)
+    if user is not None and user.is_authenticated:
+        enrolled = Enrollment.objects.filter(user=user).values('course_id')
+        return documents.filter(~Q(kind=SearchDocument.KIND_LESSON) | Q(course_id__in=enrolled))
+    return documents.exclude(kind=SearchDocument.KIND_LESSON)
+
+
+def search(query, user=None, ranked=True):
+    """
+    Queryset of SearchDocuments matching ``query`` that ``user`` may see.
+    When ``ranked``, each document carries a ``rank`` annotation and the best
+    match comes first; pass ranked=False for counts and other aggregates.
+    """
+    documents = visible_documents(user)
+    query = (query or '').strip()
+    if not query:
+        return documents.none()
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from django.db.models import F
+
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        documents = documents.filter(search_vector=search_query)
+        if not ranked:
+            return documents
+        return documents.annotate(rank=SearchRank(F('search_vector'), search_query)).order_by('-rank', 'pk')
+
+    if fts5_available():
+        match = fts5_match_expression(query)
+        if not match:
+            return documents.none()
+        table = SearchDocument._meta.db_table
+        documents = documents.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+        if not ranked:
+            return documents
+        return (
+            documents.annotate(rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                [match],
+            ))
+            .order_by('-rank', 'pk')
+        )
+
+    from django.db.models import Case, FloatField, Value, When
+
+    documents = documents.filter(Q(title__icontains=query) | Q(body__icontains=query))
+    if not ranked:
+        return documents
+    return (
+        documents.annotate(rank=Case(When(title__icontains=query, then=Value(TITLE_WEIGHT)), default=Value(BODY_WEIGHT), output_field=FloatField()))
+        .order_by('-rank', 'pk')
+    )
+
+
+def load_results(documents):
+    """
+    Fetch the objects behind a page of documents, grouped by kind and in rank
+    order: {'courses': [...], 'lessons': [...], 'ebooks': [...], 'quizzes': [...]}.
+    """
+    from courses.models import Course, Lesson, Ebook  # Avoid circular import
+    from quiz.models import Quiz
+
+    querysets = {
+        SearchDocument.KIND_COURSE: ('courses', Course.objects.all()),
+        SearchDocument.KIND_LESSON: ('lessons', Lesson.objects.select_related('module__course').prefetch_related('videos')),
+        SearchDocument.KIND_EBOOK: ('ebooks', Ebook.objects.select_related('category')),
+        SearchDocument.KIND_QUIZ: ('quizzes', Quiz.objects.select_related('module__course')),
+    }
+    ids_by_kind = {}
+    for document in documents:
+        ids_by_kind.setdefault(document.kind, []).append(document.object_id)
+
+    results = {key: [] for key, _ in querysets.values()}
+    for kind, ids in ids_by_kind.items():
+        key, queryset = querysets[kind]
+        objects = queryset.in_bulk(ids)
+        results[key] = [objects[pk] for pk in ids if pk in objects]
+    return results
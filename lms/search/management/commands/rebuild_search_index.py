@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from search.index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the search index for all courses, lessons, ebooks and quizzes. "
+        "Run once after installing the search app; signals keep it current afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Documents written per batch.")
+
+    def handle(self, *args, **options):
+        written = rebuild_index(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} document(s)."))
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.19 on 2026-10-17 00:48
+
+import logging
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX search_document_vector_gin ON search_searchdocument USING gin (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE search_searchdocument_fts USING fts5("
+                "title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+            )
+        except Exception as e:
+            # SQLite built without FTS5: search falls back to icontains
+            logger.warning("FTS5 unavailable, search will not be indexed: %s", e)
+
+
+def drop_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS search_document_vector_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS search_searchdocument_fts")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('lesson', 'Lesson'), ('ebook', 'Ebook'), ('quiz', 'Quiz')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('course_id', models.PositiveBigIntegerField(blank=True, db_index=True, null=True)),
+                ('published', models.BooleanField(default=True)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
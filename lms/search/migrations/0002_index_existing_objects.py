@@ -0,0 +1,101 @@
+import html
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# A frozen copy of search.index.rebuild_index() as it was when this migration
+# was written, against the historical models, so later changes to the app
+# code can't break replaying the history.
+BATCH_SIZE = 200
+FTS_TABLE = 'search_searchdocument_fts'
+SEARCH_CONFIG = 'english'
+
+
+def _text(value):
+    if not value:
+        return ''
+    text = strip_tags(re.sub(r'<(br|/p|/div|/li|/h[1-6]|/td)\b[^>]*>', ' ', value, flags=re.I))
+    return re.sub(r'\s+', ' ', html.unescape(text)).strip()
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def _documents(apps):
+    """(kind, object_id, field values) of every course, lesson, ebook and quiz."""
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Ebook = apps.get_model('courses', 'Ebook')
+    Quiz = apps.get_model('quiz', 'Quiz')
+
+    for course in Course.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        yield 'course', course.pk, {
+            'course_id': course.pk, 'published': True, 'title': course.title[:255],
+            'body': _join(course.get_category_display(), course.category, _text(course.description)),
+        }
+    for lesson in Lesson.objects.select_related('module').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        yield 'lesson', lesson.pk, {
+            'course_id': lesson.module.course_id, 'published': True, 'title': lesson.title[:255],
+            'body': _join(_text(lesson.description), _text(lesson.content)),
+        }
+    for ebook in Ebook.objects.select_related('category').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        yield 'ebook', ebook.pk, {
+            'course_id': None, 'published': ebook.published, 'title': ebook.title[:255],
+            'body': _join(ebook.category.name if ebook.category_id else '', _text(ebook.description)),
+        }
+    for quiz in Quiz.objects.select_related('module').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        yield 'quiz', quiz.pk, {
+            'course_id': quiz.module.course_id, 'published': True, 'title': quiz.title[:255],
+            'body': quiz.module.title,
+        }
+
+
+def _fts_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def index_existing(apps, schema_editor):
+    """Index the courses, lessons, ebooks and quizzes that existed before search did; signals keep it up after."""
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    connection = schema_editor.connection
+    fts = connection.vendor == 'sqlite' and _fts_available(connection)
+
+    SearchDocument.objects.all().delete()
+    if fts:
+        schema_editor.execute(f"DELETE FROM {FTS_TABLE}")
+    documents = SearchDocument.objects.bulk_create(
+        [SearchDocument(kind=kind, object_id=pk, **fields) for kind, pk, fields in _documents(apps)],
+        batch_size=BATCH_SIZE,
+    )
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchVector
+
+        SearchDocument.objects.update(search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+        ))
+    elif fts:
+        # bulk_create sets primary keys on SQLite
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [(d.pk, d.title, d.body) for d in documents],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('courses', '0023_course_outline_version'),
+        ('quiz', '0010_quizattempt_quiz_attempt_recent'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.19 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_index_existing_objects'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    One searchable item (course, lesson, ebook or quiz) with its HTML already
+    stripped. Kept in sync by search.signals.
+
+    On PostgreSQL ``search_vector`` holds the weighted tsvector (GIN indexed);
+    on SQLite the text is mirrored into an FTS5 table instead and the column
+    stays empty. Both are created by migration 0001.
+    """
+    KIND_COURSE = 'course'
+    KIND_LESSON = 'lesson'
+    KIND_EBOOK = 'ebook'
+    KIND_QUIZ = 'quiz'
+    KIND_CHOICES = [
+        (KIND_COURSE, 'Course'),
+        (KIND_LESSON, 'Lesson'),
+        (KIND_EBOOK, 'Ebook'),
+        (KIND_QUIZ, 'Quiz'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # Course the item belongs to; lessons are only shown to enrolled learners
+    course_id = models.PositiveBigIntegerField(null=True, blank=True, db_index=True)
+    published = models.BooleanField(default=True)
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+class SuggestVersion(models.Model):
+    """
+    A single row (pk 1) whose ``version`` moves on whenever a suggestable
+    title changes (search.signals). Each process compares it, read by
+    primary key, with the version its suggest index was built from.
+    """
+    version = models.PositiveBigIntegerField(default=0)
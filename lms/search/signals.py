@@ -0,0 +1,65 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from courses.models import Course, Module, Lesson, Ebook, EbookCategory
+from quiz.models import Quiz
+from .index import index_instance, remove_instance
+from .models import SearchDocument
+from .suggest import invalidate_suggest_index
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Ebook)
+@receiver(post_save, sender=Quiz)
+def index_saved_object(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_instance(instance)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Ebook)
+@receiver(post_delete, sender=Quiz)
+def unindex_deleted_object(sender, instance, **kwargs):
+    kind = {
+        Course: SearchDocument.KIND_COURSE,
+        Lesson: SearchDocument.KIND_LESSON,
+        Ebook: SearchDocument.KIND_EBOOK,
+        Quiz: SearchDocument.KIND_QUIZ,
+    }[sender]
+    remove_instance(kind, instance.pk)
+
+
+# Quizzes are found by their module's title, and lessons/quizzes carry their
+# course for visibility checks, so a module edit re-indexes its children.
+@receiver(post_save, sender=Module)
+def reindex_module_children(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    for lesson in Lesson.objects.filter(module=instance):
+        lesson.module = instance
+        index_instance(lesson)
+    for quiz in Quiz.objects.filter(module=instance):
+        quiz.module = instance
+        index_instance(quiz)
+
+
+@receiver(post_save, sender=EbookCategory)
+def reindex_category_ebooks(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    for ebook in Ebook.objects.filter(category=instance):
+        ebook.category = instance
+        index_instance(ebook)
+
+
+# Titles, ebook publishing and lesson/quiz course membership feed the suggest index
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Ebook)
+@receiver([post_save, post_delete], sender=Quiz)
+def suggestions_changed(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_suggest_index()
@@ -0,0 +1,165 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+Every course, lesson, published ebook and quiz title is stored once per word
+(so "Maternal Health" is found by "mat" and by "hea") in one sorted list;
+a lookup is a bisect to the first key >= the typed prefix followed by a short
+forward scan, so it costs microseconds and no queries.
+
+Each process builds its index when it starts serving (lms.wsgi calls
+warm_suggest_index()) or else on first use. Saving or deleting any of the
+indexed models moves the version in the single SuggestVersion row
+(search.signals), in the same transaction; every process reads that row by
+primary key on each lookup and rebuilds once it sees a new version.
+"""
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left
+
+from django.db import DatabaseError
+from django.db.models import F
+from django.urls import reverse
+
+from .models import SuggestVersion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Candidates examined per lookup; bounds the cost of one-letter prefixes
+SCAN_LIMIT = 500
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall((text or '').lower()))
+
+
+class Suggestion:
+    __slots__ = ('kind', 'title', 'url', 'course_id')
+
+    def __init__(self, kind, title, url, course_id=None):
+        self.kind = kind
+        self.title = title
+        self.url = url
+        self.course_id = course_id
+
+    def as_dict(self):
+        return {'type': self.kind, 'title': self.title, 'url': self.url}
+
+
+class SuggestIndex:
+    """Sorted (key, word position, suggestion) entries searched with bisect."""
+    __slots__ = ('keys', 'entries')
+
+    def __init__(self, suggestions):
+        entries = []
+        for suggestion in suggestions:
+            words = normalize(suggestion.title).split(' ')
+            for position in range(len(words)):
+                if words[position]:
+                    entries.append((' '.join(words[position:]), position, suggestion))
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prefix, enrolled_course_ids=frozenset(), limit=DEFAULT_LIMIT):
+        """
+        Best ``limit`` suggestions whose title has a word starting with
+        ``prefix``. Lessons are only returned for ``enrolled_course_ids``.
+        Titles matching from their first word rank first, then shorter titles.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        candidates = {}
+        start = bisect_left(self.keys, prefix)
+        for key, position, suggestion in self.entries[start:start + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            if suggestion.kind == 'lesson' and suggestion.course_id not in enrolled_course_ids:
+                continue
+            score = (position > 0, len(suggestion.title), suggestion.title)
+            best = candidates.get(id(suggestion))
+            if best is None or score < best[0]:
+                candidates[id(suggestion)] = (score, suggestion)
+        return [suggestion for _, suggestion in heapq.nsmallest(limit, candidates.values(), key=lambda c: c[0])]
+
+
+def load_suggestions():
+    """Everything that can be suggested, in four queries."""
+    from courses.models import Course, Lesson, Ebook  # Avoid circular import
+    from quiz.models import Quiz
+
+    suggestions = [
+        Suggestion('course', title, reverse('course_detail', args=[pk]), pk)
+        for pk, title in Course.objects.values_list('pk', 'title')
+    ]
+    suggestions += [
+        Suggestion('lesson', title, reverse('lesson_detail', args=[pk]), course_id)
+        for pk, title, course_id in Lesson.objects.values_list('pk', 'title', 'module__course_id')
+    ]
+    suggestions += [
+        Suggestion('ebook', title, reverse('ebook_detail', args=[slug]))
+        for slug, title in Ebook.objects.filter(published=True).values_list('slug', 'title')
+    ]
+    suggestions += [
+        Suggestion('quiz', title, reverse('quiz_detail', args=[pk]), course_id)
+        for pk, title, course_id in Quiz.objects.values_list('pk', 'title', 'module__course_id')
+    ]
+    return suggestions
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def _current_version():
+    return SuggestVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def get_suggest_index():
+    """This process's index, rebuilt if any indexed model changed since it was built."""
+    global _index, _index_version
+    version = _current_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = SuggestIndex(load_suggestions())
+            _index_version = version
+    return _index
+
+
+def invalidate_suggest_index():
+    """Move every process's index to a new version; they rebuild on their next lookup."""
+    if not SuggestVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        SuggestVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def warm_suggest_index():
+    """Build this process's index ahead of its first lookup; a database that isn't ready is only logged."""
+    try:
+        get_suggest_index()
+    except DatabaseError as e:
+        logger.warning("Suggest index not built at startup: %s", e)
+
+
+def clear_suggest_index():
+    """Drop this process's index (tests, or to free memory); the next lookup rebuilds it."""
+    global _index, _index_version
+    with _lock:
+        _index = _index_version = None
+
+
+def suggest(prefix, enrolled_course_ids=frozenset(), limit=DEFAULT_LIMIT):
+    return get_suggest_index().lookup(prefix, enrolled_course_ids, limit)
@@ -0,0 +1,151 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from courses.models import Course, Module, Lesson, Enrollment, Ebook
+from quiz.models import Quiz
+from users.models import User, Profile
+from .index import html_to_text, fts5_available, fts5_match_expression, rebuild_index, search
+from .models import SearchDocument
+from .suggest import (
+    MAX_LIMIT, SuggestIndex, clear_suggest_index, get_suggest_index, load_suggestions, warm_suggest_index,
+)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(
+            title="Maternal Health", description="<p>Caring for <strong>mothers</strong></p>", created_by=self.instructor,
+        )
+        self.module = Module.objects.create(course=self.course, title="Antenatal care")
+        self.lesson = Lesson.objects.create(
+            module=self.module, title="Nutrition", content="<div class='strong'>Iron &amp; folate supplements</div>",
+        )
+        self.quiz = Quiz.objects.create(module=self.module, title="Check-up quiz", created_by=self.instructor)
+
+    def titles(self, query, user=None):
+        return [document.title for document in search(query, user)]
+
+    def test_html_is_stripped_before_indexing(self):
+        self.assertEqual(html_to_text("<p>One</p><p>Two &amp; three</p>"), "One Two & three")
+        document = SearchDocument.objects.get(kind=SearchDocument.KIND_LESSON, object_id=self.lesson.pk)
+        self.assertEqual(document.body, "Iron & folate supplements")
+        # Words inside tags and attributes do not match
+        self.assertEqual(self.titles("strong", self.student), [])
+
+    def test_signals_keep_index_current(self):
+        self.assertEqual(self.titles("mothers"), ["Maternal Health"])
+        self.course.description = "<p>Newborn care</p>"
+        self.course.save()
+        self.assertEqual(self.titles("mothers"), [])
+        self.assertEqual(self.titles("newborn"), ["Maternal Health"])
+
+        # Quizzes are found by their module title
+        self.module.title = "Postnatal care"
+        self.module.save()
+        self.assertIn("Check-up quiz", self.titles("postnatal"))
+
+        self.course.delete()
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_visibility(self):
+        self.assertEqual(self.titles("folate"), [])
+        self.assertEqual(self.titles("folate", self.student), [])
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertEqual(self.titles("folate", self.student), ["Nutrition"])
+
+        Ebook.objects.create(title="Draft guide", slug="draft-guide", file="ebooks/g.pdf", published=False)
+        self.assertEqual(self.titles("draft guide"), [])
+
+    def test_ranking_prefers_title_matches_and_prefixes_match(self):
+        if connection.vendor == 'sqlite':
+            self.assertTrue(fts5_available())
+        Course.objects.create(title="Nutrition basics", created_by=self.instructor)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Course.objects.create(title="Cooking", description="<p>Some nutrition tips</p>", created_by=self.instructor)
+        titles = self.titles("nutri", self.student)
+        self.assertEqual(set(titles), {"Nutrition basics", "Nutrition", "Cooking"})
+        self.assertEqual(titles[-1], "Cooking")
+        self.assertEqual(fts5_match_expression('iron "OR" x*'), '"iron" "OR" "x"*')
+
+    def test_rebuild_index(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(self.titles("mothers"), ["Maternal Health"])
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(SearchDocument.objects.count(), 3)
+
+    def test_search_view_is_paginated(self):
+        for i in range(25):
+            Course.objects.create(title=f"Hygiene {i}", created_by=self.instructor)
+        response = self.client.get(reverse('search'), {'q': 'hygiene'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], 25)
+        self.assertEqual(response.context['counts']['courses'], 25)
+        self.assertEqual(len(response.context['results']['courses']), 20)
+        response = self.client.get(reverse('search'), {'q': 'hygiene', 'page': 2})
+        self.assertEqual(len(response.context['results']['courses']), 5)
+
+
+class SuggestIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.student = User.objects.create_user(email="student@example.com", password="pw")
+        Profile.objects.create(user=cls.student, first_name="Stu", last_name="Dent", image=None)
+
+    def setUp(self):
+        cache.clear()
+        clear_suggest_index()
+        self.course = Course.objects.create(title="Maternal Health", created_by=self.instructor)
+        self.other = Course.objects.create(title="Health Systems", created_by=self.instructor)
+        module = Module.objects.create(course=self.course, title="Module")
+        Lesson.objects.create(module=module, title="Healthy pregnancy")
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('search_suggest'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item['type'], item['title']) for item in response.json()['results']]
+
+    def test_prefix_matches_any_word_and_ranks_leading_matches_first(self):
+        index = SuggestIndex(load_suggestions())
+        titles = [s.title for s in index.lookup("heal", enrolled_course_ids={self.course.pk})]
+        self.assertEqual(titles, ["Health Systems", "Healthy pregnancy", "Maternal Health"])
+        self.assertEqual([s.title for s in index.lookup("MAT")], ["Maternal Health"])
+        self.assertEqual(index.lookup("zzz"), [])
+
+    def test_lessons_require_enrollment(self):
+        self.assertNotIn(('lesson', 'Healthy pregnancy'), self.suggest("heal"))
+        self.client.force_login(self.student)
+        self.assertNotIn(('lesson', 'Healthy pregnancy'), self.suggest("heal"))
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertIn(('lesson', 'Healthy pregnancy'), self.suggest("heal"))
+
+    def test_limit_is_capped(self):
+        for i in range(30):
+            Course.objects.create(title=f"Health {i}", created_by=self.instructor)
+        self.assertEqual(len(self.suggest("health", limit=3)), 3)
+        self.assertEqual(len(self.suggest("health", limit=1000)), MAX_LIMIT)
+
+    def test_saves_rebuild_the_index(self):
+        self.assertEqual(self.suggest("mat"), [('course', 'Maternal Health')])
+        self.course.title = "Newborn Care"
+        self.course.save()
+        self.assertEqual(self.suggest("mat"), [])
+        self.assertEqual(self.suggest("newb"), [('course', 'Newborn Care')])
+        self.other.delete()
+        self.assertEqual(self.suggest("sys"), [])
+
+        # Built at startup, a lookup only reads the version row by primary key
+        clear_suggest_index()
+        warm_suggest_index()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(get_suggest_index().lookup("newb")), 1)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User, Profile, SubscribedUser
+from .models import User, Profile, SubscribedUser, PointsEvent
 
 # Inline: Profile on User page
 class ProfileInline(admin.StackedInline):
@@ -55,10 +55,21 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    actions = ['reset_course_progress']
+
     def points(self, obj):
         return getattr(getattr(obj, 'profile', None), 'points', 0)
     points.short_description = 'Points'
 
+    @admin.action(description='Reset progress in all their courses')
+    def reset_course_progress(self, request, queryset):
+        from courses.admin import reset_summary  # Avoid circular import
+        from courses.models import Enrollment
+        from courses.progress import reset_progress
+
+        deleted = reset_progress(Enrollment.objects.filter(user__in=queryset.values('pk')))
+        self.message_user(request, reset_summary(deleted))
+
     def subscribed(self, obj):
         return getattr(getattr(obj, 'subscription', None), 'subscribed', False)
     subscribed.boolean = True
@@ -102,9 +113,24 @@ class SubscribedUserAdmin(admin.ModelAdmin):
     def user_email(self, obj):
         return obj.user.email
 
+class PointsEventAdmin(admin.ModelAdmin):
+    # The ledger is append-only; correct totals with an adjustment event or `manage.py reconcile_points`
+    list_display = ['user', 'points', 'source', 'object_id', 'seq', 'folded', 'created_at']
+    list_filter = ['source', 'folded']
+    search_fields = ['user__email']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Register the custom User model and others
 admin.site.register(User, UserAdmin)
 admin.site.register(SubscribedUser, SubscribedUserAdmin)
+admin.site.register(PointsEvent, PointsEventAdmin)
 
 # Optional: Branding
 admin.site.site_header = "Kuza Ndoto Admin"
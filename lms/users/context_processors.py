@@ -1,11 +1,9 @@
-from .models import SubscribedUser
+from .learner import get_learner
 
 def subscription_context(request):
     is_subscribed = False
     if request.user.is_authenticated:
-        subscription = SubscribedUser.objects.filter(user=request.user).first()
-        if subscription and subscription.subscribed:
-            is_subscribed = True
+        is_subscribed = get_learner(request).is_subscribed
     return {
         'is_subscribed': is_subscribed,
-    }
\ No newline at end of file
+    }
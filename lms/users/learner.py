@@ -0,0 +1,117 @@
+"""
+Request-scoped view of the signed-in learner (``request.learner``).
+
+Nothing is loaded until first use. Then the user's profile, newsletter
+subscription and points not yet folded into the profile (users.points) come
+from one joined query, and the enrolled course ids and
+earned badge ids from one more. The profile and subscription are also
+attached to ``request.user``, so ``user.profile`` in templates doesn't
+query again.
+"""
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import IntegerField, Value
+from django.utils.functional import cached_property
+
+_ENROLLED = 0
+_BADGE = 1
+
+
+class Learner:
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def is_authenticated(self):
+        return self.user.is_authenticated
+
+    @cached_property
+    def _related(self):
+        """(profile, subscription), either of which may be None."""
+        from .models import User  # Avoid circular import
+        from .points import pending_points
+
+        if not self.is_authenticated:
+            self._pending_points = 0
+            return None, None
+        row = User.objects.select_related('profile', 'subscription').annotate(
+            pending_points=pending_points(),
+        ).filter(pk=self.user.pk).first()
+        self._pending_points = row.pending_points if row is not None else 0
+        related = []
+        for name in ('profile', 'subscription'):
+            try:
+                obj = getattr(row, name) if row is not None else None
+            except ObjectDoesNotExist:
+                obj = None
+            if obj is not None:
+                setattr(self.user, name, obj)
+            related.append(obj)
+        return tuple(related)
+
+    @property
+    def profile(self):
+        """The user's Profile, or None if it hasn't been created yet."""
+        return self._related[0]
+
+    def get_or_create_profile(self):
+        profile = self.profile
+        if profile is None:
+            from .models import Profile  # Avoid circular import
+
+            profile, _ = Profile.objects.get_or_create(user=self.user)
+            self.user.profile = profile
+            self._related = (profile, self._related[1])
+        return profile
+
+    @property
+    def points(self):
+        """Profile.points plus the user's events that haven't been folded into it yet."""
+        profile = self.profile
+        return max(0, (profile.points if profile is not None else 0) + self._pending_points)
+
+    @property
+    def subscription(self):
+        return self._related[1]
+
+    @property
+    def is_subscribed(self):
+        subscription = self.subscription
+        return bool(subscription and subscription.subscribed)
+
+    @cached_property
+    def _course_ids(self):
+        from courses.models import Enrollment  # Avoid circular import
+        from .models import Profile
+
+        enrolled, badges = set(), set()
+        if self.is_authenticated:
+            rows = Enrollment.objects.filter(user_id=self.user.pk).annotate(
+                kind=Value(_ENROLLED, output_field=IntegerField())
+            ).values_list('course_id', 'kind').union(
+                Profile.earned_badges.through.objects.filter(profile__user_id=self.user.pk).annotate(
+                    kind=Value(_BADGE, output_field=IntegerField())
+                ).values_list('course_id', 'kind'),
+                all=True,
+            )
+            for course_id, kind in rows:
+                (badges if kind == _BADGE else enrolled).add(course_id)
+        return enrolled, badges
+
+    @property
+    def enrolled_course_ids(self):
+        """Set of course ids the learner is enrolled in; views that enroll or unenroll keep it current."""
+        return self._course_ids[0]
+
+    @property
+    def earned_badge_ids(self):
+        """Set of course ids the learner has completed (earned the badge for)."""
+        return self._course_ids[1]
+
+
+def get_learner(request):
+    """``request.learner``, attaching one if the request didn't go through users.middleware.LearnerMiddleware."""
+    learner = getattr(request, 'learner', None)
+    if learner is None:
+        learner = request.learner = Learner(request.user)
+    return learner
+
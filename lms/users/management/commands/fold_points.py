@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from users.points import FOLD_BATCH_SIZE, fold_points
+
+
+class Command(BaseCommand):
+    help = "Add points ledger events that haven't been folded yet into Profile.points. Run it periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=FOLD_BATCH_SIZE, help="Events folded per transaction.")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running, folding every this many seconds (default: fold once and exit).")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        try:
+            while True:
+                folded = fold_points(batch_size)
+                if folded or not options['interval']:
+                    self.stdout.write(self.style.SUCCESS(f"Folded {folded} points events."))
+                if not options['interval']:
+                    break
+                connections.close_all()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.points import reconcile_points
+
+
+class Command(BaseCommand):
+    help = "Recompute every learner's Profile.points from the points ledger."
+
+    def handle(self, *args, **options):
+        corrected = reconcile_points()
+        self.stdout.write(self.style.SUCCESS(f"Points reconciled; {corrected} profile(s) corrected."))
@@ -1,23 +1,93 @@
+import time
+
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from django.contrib import messages  # <- add
 
+from .learner import Learner, get_learner
+
+ALLOWED_VIEW_NAMES = frozenset({
+    "profile", "users:profile",
+    "profile_create", "users:profile_create",
+    "login", "logout", "register",
+    "password_change", "password_reset",
+    "password_reset_done", "password_reset_confirm", "password_reset_complete",
+    "account_login", "account_logout", "account_signup",
+})
+ALLOWED_APP_NAMES = frozenset({"admin", "account", "socialaccount"})
+PROFILE_VIEW_NAMES = frozenset({"profile", "users:profile", "profile_create", "users:profile_create"})
+
+# The session remembers that the profile was complete, together with the
+# user's profile generation at the time. Saving or deleting the profile moves
+# the generation on (users.signals), so the next request checks the profile
+# again; the common path is one cache read and no queries. The generation
+# lives in the default cache, which workers must share.
+SESSION_KEY = '_profile_complete'
+GENERATION_KEY = 'profile_completion:{user_id}'
+_MISSING = object()
+
+
+def profile_generation(user_id):
+    key = GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Never restart at a previously used number if the key was evicted
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_profile_completion(user_id):
+    key = GENERATION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def _reverse_or(name, default):
+    try:
+        return reverse(name)
+    except Exception:
+        return default
+
+
+class LearnerMiddleware:
+    """Adds a lazy ``request.learner`` (users.learner.Learner); must come after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.learner = SimpleLazyObject(lambda: Learner(request.user))
+        return self.get_response(request)
+
+
 class ProfileCompletionMiddleware(MiddlewareMixin):
     """
     Redirect authenticated users with incomplete profiles to the profile page.
     """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Allow static, media, admin and dev reload endpoint
+        self.allowed_prefixes = tuple(
+            prefix for prefix in (settings.STATIC_URL, getattr(settings, "MEDIA_URL", None), "/__reload__/", "/admin/")
+            if prefix
+        )
+        # Resolve profile URLs to also allow by path
+        self.profile_url = _reverse_or("profile", "/profile/")
+        self.profile_create_url = _reverse_or("profile_create", "/profile/create/")
+
     def process_view(self, request, view_func, view_args, view_kwargs):
         if not request.user.is_authenticated:
             return None
 
         path = request.path or "/"
-
-        # Allow static, media and dev reload endpoint
-        if (settings.STATIC_URL and path.startswith(settings.STATIC_URL)) \
-           or (getattr(settings, "MEDIA_URL", None) and path.startswith(settings.MEDIA_URL)) \
-           or path.startswith("/__reload__/"):
+        if path.startswith(self.allowed_prefixes):
             return None
 
         match = getattr(request, "resolver_match", None)
@@ -25,39 +95,21 @@ class ProfileCompletionMiddleware(MiddlewareMixin):
         url_name = getattr(match, "url_name", None)
         app_name = getattr(match, "app_name", None)
 
-        allowed_view_names = {
-            "profile", "users:profile",
-            "profile_create", "users:profile_create",
-            "login", "logout", "register",
-            "password_change", "password_reset",
-            "password_reset_done", "password_reset_confirm", "password_reset_complete",
-            "account_login", "account_logout", "account_signup",
-        }
+        if (url_name in ALLOWED_VIEW_NAMES) or (view_name in ALLOWED_VIEW_NAMES) \
+           or (app_name in ALLOWED_APP_NAMES) \
+           or path in (self.profile_url, self.profile_create_url):
+            return None
 
-        # Resolve profile URLs to also allow by path
-        try:
-            profile_url = reverse("profile")
-        except Exception:
-            profile_url = "/profile/"
-        try:
-            profile_create_url = reverse("profile_create")
-        except Exception:
-            profile_create_url = "/profile/create/"
-
-        if (url_name in allowed_view_names) or (view_name in allowed_view_names) \
-           or (app_name in {"admin", "account", "socialaccount"}) \
-           or path.startswith("/admin/") \
-           or path in {profile_url, profile_create_url}:
+        # Known complete and unchanged since: no profile query
+        user = request.user
+        generation = profile_generation(user.pk)
+        if request.session.get(SESSION_KEY, _MISSING) == generation:
             return None
 
         # Safe completeness check
-        user = request.user
         first = (getattr(user, "first_name", "") or "").strip()
         last  = (getattr(user, "last_name", "") or "").strip()
-        try:
-            profile = user.profile
-        except Exception:
-            profile = None
+        profile = get_learner(request).profile
 
         complete = False
         if profile is not None:
@@ -71,21 +123,26 @@ class ProfileCompletionMiddleware(MiddlewareMixin):
         else:
             complete = bool(first and last)
 
-        if not complete:
-            # Allow staying on the profile/profile_create pages
-            if view_name in {"profile", "users:profile", "profile_create", "users:profile_create"}:
-                return None
+        if complete:
+            # Without a profile there is nothing whose save would invalidate the decision
+            if profile is not None:
+                request.session[SESSION_KEY] = generation
+            return None
+
+        request.session.pop(SESSION_KEY, None)
 
-            target = profile_create_url if profile is None else profile_url
-            if path == target:
-                return None
+        # Allow staying on the profile/profile_create pages
+        if view_name in PROFILE_VIEW_NAMES:
+            return None
 
-            # Notify user
-            messages.info(request, "Please complete your profile to continue. Redirecting to setup...")
+        target = self.profile_create_url if profile is None else self.profile_url
+        if path == target:
+            return None
 
-            next_url = request.get_full_path()
-            if next_url == target:
-                return redirect(target)
-            return redirect(f"{target}?next={next_url}")
+        # Notify user
+        messages.info(request, "Please complete your profile to continue. Redirecting to setup...")
 
-        return None
\ No newline at end of file
+        next_url = request.get_full_path()
+        if next_url == target:
+            return redirect(target)
+        return redirect(f"{target}?next={next_url}")
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_profile_has_seen_tour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('lesson', 'Lesson read'), ('quiz', 'Quiz passed'), ('course', 'Course completed'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('object_id', models.PositiveIntegerField(default=0)),
+                ('seq', models.PositiveIntegerField()),
+                ('points', models.IntegerField()),
+                ('folded', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['folded', 'user'], name='users_points_pending')],
+                'unique_together': {('user', 'source', 'object_id', 'seq')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+# Values of home.views.POINTS_PER_* when the ledger was introduced
+POINTS_PER_LESSON = 10
+POINTS_PER_QUIZ = 50
+POINTS_PER_COURSE = 100
+BATCH_SIZE = 2000
+
+
+def seed_ledger(apps, schema_editor):
+    """
+    Record the awards behind existing points as folded events, plus an
+    adjustment for whatever Profile.points holds beyond them, so totals are
+    unchanged and later revocations find the award to revoke.
+    """
+    PointsEvent = apps.get_model('users', 'PointsEvent')
+    Profile = apps.get_model('users', 'Profile')
+    Lesson = apps.get_model('courses', 'Lesson')
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+
+    totals = defaultdict(int)
+    batch = []
+
+    def add(user_id, source, object_id, points):
+        totals[user_id] += points
+        batch.append(PointsEvent(user_id=user_id, source=source, object_id=object_id, seq=1, points=points, folded=True))
+        if len(batch) >= BATCH_SIZE:
+            PointsEvent.objects.bulk_create(batch)
+            batch.clear()
+
+    for user_id, lesson_id in Lesson.read_by_users.through.objects.values_list('user_id', 'lesson_id').iterator():
+        add(user_id, 'lesson', lesson_id, POINTS_PER_LESSON)
+    passed = QuizAttempt.objects.filter(score__gte=75).values_list('student_id', 'quiz_id').distinct()
+    for user_id, quiz_id in passed.iterator():
+        add(user_id, 'quiz', quiz_id, POINTS_PER_QUIZ)
+    badges = Profile.earned_badges.through.objects.filter(profile__user__isnull=False)
+    for user_id, course_id in badges.values_list('profile__user_id', 'course_id').iterator():
+        add(user_id, 'course', course_id, POINTS_PER_COURSE)
+
+    for user_id, points in Profile.objects.filter(user__isnull=False).values_list('user_id', 'points').iterator():
+        if points != totals.get(user_id, 0):
+            add(user_id, 'adjustment', 0, points - totals.get(user_id, 0))
+    if batch:
+        PointsEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_pointsevent'),
+        ('courses', '0019_certificatejob'),
+        ('quiz', '0005_alter_answer_options_alter_question_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_ledger, migrations.RunPython.noop),
+    ]
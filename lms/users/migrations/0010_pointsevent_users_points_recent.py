@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_seed_points_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pointsevent',
+            index=models.Index(fields=['source', 'created_at'], name='users_points_recent'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from PIL import Image
 from io import BytesIO
@@ -121,3 +122,48 @@ class SubscribedUser(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - Subscribed: {self.subscribed}"
+
+
+# -------------------------
+# Points ledger
+# -------------------------
+class PointsEvent(models.Model):
+    """
+    Append-only record of points awarded and revoked (see users.points).
+    Profile.points is the sum of the user's folded events.
+
+    An award for an object (a lesson read, a quiz passed, a course completed)
+    takes the next odd ``seq`` and revoking it the next even one, so
+    (user, source, object_id, seq) is the idempotency key: a repeated award
+    or revocation inserts nothing.
+    """
+    SOURCE_LESSON = 'lesson'
+    SOURCE_QUIZ = 'quiz'
+    SOURCE_COURSE = 'course'
+    SOURCE_ADJUSTMENT = 'adjustment'
+    SOURCE_CHOICES = [
+        (SOURCE_LESSON, 'Lesson read'),
+        (SOURCE_QUIZ, 'Quiz passed'),
+        (SOURCE_COURSE, 'Course completed'),
+        (SOURCE_ADJUSTMENT, 'Adjustment'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_events')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    object_id = models.PositiveIntegerField(default=0)
+    seq = models.PositiveIntegerField()
+    points = models.IntegerField()
+    # Added into Profile.points yet
+    folded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('user', 'source', 'object_id', 'seq')
+        indexes = [
+            models.Index(fields=['folded', 'user'], name='users_points_pending'),
+            # Activity since the last analytics run (analytics.rollups)
+            models.Index(fields=['source', 'created_at'], name='users_points_recent'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email}: {self.points:+d} ({self.source} {self.object_id})"
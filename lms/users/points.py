@@ -0,0 +1,169 @@
+"""
+Points ledger.
+
+Points are awarded and revoked by appending PointsEvent rows, never by
+updating Profile.points in the request, so there is no per-user row lock to
+contend on and every change can be audited. Awards and revocations take
+(user_id, source, object_id) keys and are written with one read and one
+bulk insert however many keys are passed (one insert per key only when a
+concurrent request wrote some of them first); awarding something already
+awarded, or revoking something that isn't, does nothing.
+
+Profile.points is a cache of the ledger: fold_points() (``manage.py
+fold_points``, run periodically) adds the unfolded events into it in bulk,
+and Learner.points adds the user's pending events on top, so learners see
+their points straight away. reconcile_points() recomputes every total from
+the ledger.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import PointsEvent, Profile
+
+FOLD_BATCH_SIZE = getattr(settings, 'POINTS_FOLD_BATCH_SIZE', 500)
+
+
+def _latest(events):
+    """(user_id, source, object_id, seq, points) of the events in ``events`` that are the latest for their key."""
+    later = PointsEvent.objects.filter(
+        user_id=OuterRef('user_id'), source=OuterRef('source'),
+        object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'),
+    )
+    return events.filter(~Exists(later)).values_list('user_id', 'source', 'object_id', 'seq', 'points')
+
+
+def _latest_events(keys):
+    """{(user_id, source, object_id): (seq, points)} of the latest event for each key that has one."""
+    rows = _latest(PointsEvent.objects.filter(
+        user_id__in={user_id for user_id, _, _ in keys},
+        source__in={source for _, source, _ in keys},
+        object_id__in={object_id for _, _, object_id in keys},
+    ))
+    return {
+        (user_id, source, object_id): (seq, points)
+        for user_id, source, object_id, seq, points in rows
+        if (user_id, source, object_id) in keys
+    }
+
+
+def _insert(event):
+    """Write one event; False if a concurrent request already wrote its (user, source, object_id, seq)."""
+    try:
+        with transaction.atomic():
+            event.save(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _append(events):
+    """Write ``events``; returns the points of those actually written."""
+    if not events:
+        return 0
+    try:
+        with transaction.atomic():
+            PointsEvent.objects.bulk_create(events)
+    except IntegrityError:
+        # A concurrent request that got there first wins; only the rest of ours are written
+        return sum(event.points for event in events if _insert(event))
+    return sum(event.points for event in events)
+
+
+def award_points(keys, points):
+    """
+    Award ``points`` for each (user_id, source, object_id) in ``keys`` that
+    isn't currently awarded; returns the points added.
+    """
+    keys = set(keys)
+    if not keys or points <= 0:
+        return 0
+    latest = _latest_events(keys)
+    events = []
+    for user_id, source, object_id in keys:
+        seq = latest.get((user_id, source, object_id), (0, 0))[0]
+        if seq % 2 == 0:
+            events.append(PointsEvent(user_id=user_id, source=source, object_id=object_id, seq=seq + 1, points=points))
+    return _append(events)
+
+
+def revoke_points(keys):
+    """Revoke the current award for each (user_id, source, object_id) in ``keys``; returns the points removed."""
+    keys = set(keys)
+    if not keys:
+        return 0
+    events = []
+    for (user_id, source, object_id), (seq, points) in _latest_events(keys).items():
+        if seq % 2 == 1:
+            events.append(PointsEvent(user_id=user_id, source=source, object_id=object_id, seq=seq + 1, points=-points))
+    return -_append(events)
+
+
+def revoke_matching(events):
+    """
+    Revoke every current award among ``events``, a PointsEvent queryset
+    (typically filtered with subqueries); returns the points removed.
+    """
+    revocations = [
+        PointsEvent(user_id=user_id, source=source, object_id=object_id, seq=seq + 1, points=-points)
+        for user_id, source, object_id, seq, points in _latest(events)
+        if seq % 2 == 1
+    ]
+    return -_append(revocations)
+
+
+def pending_points(user_ref='pk'):
+    """Expression: sum of the unfolded events of the user at ``user_ref`` (0 if none)."""
+    total = PointsEvent.objects.filter(user_id=OuterRef(user_ref), folded=False).order_by().values(
+        'user_id',
+    ).annotate(total=Sum('points')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def _add_to_profiles(totals):
+    by_delta = defaultdict(list)
+    for user_id, delta in totals.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    # Deltas are sums of a few fixed amounts, so one UPDATE per distinct delta
+    for delta, user_ids in by_delta.items():
+        Profile.objects.filter(user_id__in=user_ids).update(
+            points=Greatest(Value(0), F('points') + Value(delta)),
+        )
+
+
+def fold_points(batch_size=FOLD_BATCH_SIZE):
+    """Add unfolded events into Profile.points; returns the number of events folded."""
+    folded = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                PointsEvent.objects.filter(folded=False).order_by('pk').values_list('pk', 'user_id', 'points')[:batch_size]
+            )
+            if not rows:
+                return folded
+            ids = [pk for pk, _, _ in rows]
+            if PointsEvent.objects.filter(pk__in=ids, folded=False).update(folded=True) != len(ids):
+                # A concurrent fold claimed some of them first; retry with what's left
+                transaction.set_rollback(True)
+                continue
+            totals = defaultdict(int)
+            for _, user_id, points in rows:
+                totals[user_id] += points
+            _add_to_profiles(totals)
+        folded += len(rows)
+
+
+@transaction.atomic
+def reconcile_points():
+    """Set every Profile.points to the sum of the user's whole ledger; returns the number of profiles corrected."""
+    PointsEvent.objects.filter(folded=False).update(folded=True)
+    # Only folded events: anything appended meanwhile is left for the next fold
+    total = PointsEvent.objects.filter(user_id=OuterRef('user_id'), folded=True).order_by().values(
+        'user_id',
+    ).annotate(total=Sum('points')).values('total')
+    expected = Greatest(Value(0), Coalesce(Subquery(total, output_field=IntegerField()), Value(0)))
+    return Profile.objects.exclude(points=expected).update(points=expected)
@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from .middleware import invalidate_profile_completion
 from .models import Profile
 
 @receiver(post_save, sender=User)
@@ -11,3 +13,9 @@ def create_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+@receiver([post_save, post_delete], sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    # Sessions re-check profile completeness on their next request
+    if instance.user_id:
+        transaction.on_commit(lambda: invalidate_profile_completion(instance.user_id))
@@ -1,3 +1,205 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.completion import run_due_checks
+from courses.models import Course, Enrollment, Module, Lesson
+from .learner import Learner
+from .middleware import SESSION_KEY
+from .models import User, Profile, SubscribedUser, PointsEvent
+from .points import award_points, fold_points, reconcile_points, revoke_points
+
+
+class ProfileCompletionMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="learner@example.com", password="pw")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def profile_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if '"users_profile"' in q['sql']]
+
+    def test_incomplete_profile_is_redirected(self):
+        response = self.client.get(reverse('ebook_list'))
+        self.assertRedirects(response, f"{reverse('profile_create')}?next={reverse('ebook_list')}", fetch_redirect_response=False)
+
+        Profile.objects.create(user=self.user, first_name="Ada", last_name="", image=None)
+        response = self.client.get(reverse('ebook_list'))
+        self.assertRedirects(response, f"{reverse('profile')}?next={reverse('ebook_list')}", fetch_redirect_response=False)
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+    def test_complete_profile_is_remembered_in_the_session(self):
+        Profile.objects.create(user=self.user, first_name="Ada", last_name="Lovelace", image=None)
+        # A view that doesn't read the profile itself
+        url = reverse('search_suggest')
+        response, queries = self.profile_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertIn(SESSION_KEY, self.client.session)
+
+        response, queries = self.profile_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_saving_the_profile_invalidates_the_session_decision(self):
+        profile = Profile.objects.create(user=self.user, first_name="Ada", last_name="Lovelace", image=None)
+        self.assertEqual(self.client.get(reverse('ebook_list')).status_code, 200)
+
+        profile.last_name = ""
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        response = self.client.get(reverse('ebook_list'))
+        self.assertRedirects(response, f"{reverse('profile')}?next={reverse('ebook_list')}", fetch_redirect_response=False)
+
+
+class LearnerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="learner@example.com", password="pw")
+        instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        cls.profile = Profile.objects.create(user=cls.user, first_name="Ada", last_name="Lovelace", image=None)
+        cls.courses = [Course.objects.create(title=f"Course {i}", created_by=instructor) for i in range(3)]
+        Enrollment.objects.create(user=cls.user, course=cls.courses[0])
+        Enrollment.objects.create(user=cls.user, course=cls.courses[1])
+        cls.profile.earned_badges.add(cls.courses[1])
+
+    def test_loads_everything_in_two_queries(self):
+        SubscribedUser.objects.create(user=self.user, subscribed=True)
+        user = User.objects.get(pk=self.user.pk)
+        learner = Learner(user)
+        with self.assertNumQueries(2):
+            self.assertEqual(learner.profile, self.profile)
+            self.assertTrue(learner.is_subscribed)
+            self.assertEqual(learner.enrolled_course_ids, {self.courses[0].pk, self.courses[1].pk})
+            self.assertEqual(learner.earned_badge_ids, {self.courses[1].pk})
+            # Attached to the user for templates
+            self.assertEqual(user.profile.first_name, "Ada")
+
+    def test_missing_profile_is_created_on_demand(self):
+        user = User.objects.create_user(email="new@example.com", password="pw")
+        learner = Learner(user)
+        self.assertIsNone(learner.profile)
+        self.assertFalse(learner.is_subscribed)
+        profile = learner.get_or_create_profile()
+        self.assertEqual(profile.user, user)
+        self.assertIs(learner.profile, profile)
+
+
+class PointsLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="learner@example.com", password="pw")
+        cls.other = User.objects.create_user(email="other@example.com", password="pw")
+        cls.profile = Profile.objects.create(user=cls.user, first_name="Ada", last_name="Lovelace", image=None)
+        Profile.objects.create(user=cls.other, first_name="Bo", last_name="Other", image=None)
+
+    def setUp(self):
+        cache.clear()
+
+    def lesson_key(self, lesson_id, user=None):
+        return ((user or self.user).pk, PointsEvent.SOURCE_LESSON, lesson_id)
+
+    def test_awards_and_revocations_are_idempotent(self):
+        self.assertEqual(award_points([self.lesson_key(1), self.lesson_key(2)], 10), 20)
+        self.assertEqual(award_points([self.lesson_key(1)], 10), 0)
+        self.assertEqual(revoke_points([self.lesson_key(1), self.lesson_key(3)]), 10)
+        self.assertEqual(revoke_points([self.lesson_key(1)]), 0)
+        # Revoked awards can be earned again
+        self.assertEqual(award_points([self.lesson_key(1)], 10), 10)
+        self.assertEqual(
+            list(PointsEvent.objects.filter(object_id=1).order_by('seq').values_list('seq', 'points')),
+            [(1, 10), (2, -10), (3, 10)],
+        )
+
+    def statements(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+
+    def test_batched_award_and_revoke_cost_two_queries(self):
+        keys = [self.lesson_key(n) for n in range(50)] + [self.lesson_key(n, self.other) for n in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(award_points(keys, 10), 1000)
+        self.assertEqual(len(self.statements(ctx)), 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(revoke_points(keys), 1000)
+        self.assertEqual(len(self.statements(ctx)), 2)
+
+    def test_events_written_concurrently_are_not_counted(self):
+        award_points([self.lesson_key(1)], 10)
+        # Another request awarded lesson 1 again between our read and our insert
+        with mock.patch('users.points._latest_events', return_value={}):
+            self.assertEqual(award_points([self.lesson_key(1), self.lesson_key(2)], 10), 10)
+            self.assertEqual(award_points([self.lesson_key(1)], 10), 0)
+        self.assertEqual(PointsEvent.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Learner(User.objects.get(pk=self.user.pk)).points, 20)
+
+    def test_pending_points_then_fold(self):
+        award_points([self.lesson_key(1), self.lesson_key(2), self.lesson_key(1, self.other)], 10)
+        revoke_points([self.lesson_key(2)])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.points, 0)
+        self.assertEqual(Learner(User.objects.get(pk=self.user.pk)).points, 10)
+
+        self.assertEqual(fold_points(batch_size=2), 4)
+        self.assertFalse(PointsEvent.objects.filter(folded=False).exists())
+        self.assertEqual(
+            dict(Profile.objects.values_list('user__email', 'points')),
+            {"learner@example.com": 10, "other@example.com": 10},
+        )
+        self.assertEqual(Learner(User.objects.get(pk=self.user.pk)).points, 10)
+        self.assertEqual(fold_points(), 0)
+
+    def test_reconcile_recomputes_totals(self):
+        award_points([self.lesson_key(1), self.lesson_key(2)], 10)
+        fold_points()
+        Profile.objects.filter(user=self.user).update(points=999)
+        award_points([self.lesson_key(3)], 10)
+        self.assertEqual(reconcile_points(), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.points, 30)
+        self.assertEqual(reconcile_points(), 0)
+
+    def test_unenroll_revokes_everything_earned_in_the_course(self):
+        instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        course = Course.objects.create(title="Course", created_by=instructor)
+        module = Module.objects.create(course=course, title="Module")
+        lessons = [Lesson.objects.create(module=module, title=f"Lesson {i}") for i in range(2)]
+        self.client.force_login(self.user)
+        self.client.post(reverse('course_detail', args=[course.pk]), {'action': 'enroll'})
+        for lesson in lessons:
+            self.client.post(reverse('lesson_detail', args=[lesson.pk]), {'mark_read': '1'})
+        run_due_checks(due_by=timezone.now() + timedelta(minutes=1))
+        # Two lessons, and the course is complete without a quiz
+        self.assertEqual(Learner(self.user).points, 120)
+
+        self.client.post(reverse('course_detail', args=[course.pk]), {'action': 'unenroll'})
+        self.assertEqual(Learner(self.user).points, 0)
+        self.assertEqual(PointsEvent.objects.filter(user=self.user).count(), 6)
+
+    def test_lesson_messages_report_the_points_moved(self):
+        instructor = User.objects.create_user(email="teacher@example.com", password="pw", role="instructor")
+        course = Course.objects.create(title="Course", created_by=instructor)
+        lesson = Lesson.objects.create(module=Module.objects.create(course=course, title="Module"), title="Lesson")
+        Enrollment.objects.create(user=self.user, course=course)
+        self.client.force_login(self.user)
+
+        def post(action):
+            response = self.client.post(reverse('lesson_detail', args=[lesson.pk]), {action: '1'}, follow=True)
+            return [str(message) for message in response.context['messages']][0]
+
+        self.assertEqual(post('mark_read'), "Lesson complete! +10 points.")
+        self.assertEqual(post('unmark_read'), "Lesson marked incomplete. -10 points.")
+        # Read before the ledger existed: nothing to revoke
+        lesson.read_by_users.add(self.user)
+        self.assertEqual(post('unmark_read'), "Lesson marked incomplete.")
 
-# Create your tests here.
@@ -211,7 +211,7 @@ def newsletter(request):
         return redirect('home')
 
     form = NewsLetterForm()
-    form.fields['receivers'].initial = ','.join([active.user.email for active in SubscribedUser.objects.all()])
+    form.fields['receivers'].initial = ','.join(SubscribedUser.objects.values_list('user__email', flat=True))
     return render(request=request, template_name='users/newsletter.html', context={'form': form})
         
 